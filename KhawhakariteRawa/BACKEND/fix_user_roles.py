@@ -39,6 +39,8 @@ def fix_roles():
                     )
                     print(f"Updated {user[1]}: {old_role} -> {new_role}")
         
+        # The users table version trigger tells running servers to drop
+        # their cached users, so the new roles apply without a restart
         conn.commit()
         print("Role fixes completed!")
 
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Stock Movement Archival Script
+Moves cold stock movements into month-partitioned archive tables so the
+hot stock_movements table and its indexes stay small
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.insert(0, str(parent_dir))
+
+from server.services.archive_service import (  # noqa: E402
+    archive_stock_movements, get_movement_partitions
+)
+
+
+def main():
+    """Archive stock movements older than the configured horizon"""
+    parser = argparse.ArgumentParser(description="Archive old stock movements")
+    parser.add_argument(
+        "--days", type=int, default=None,
+        help="Keep this many days in the hot table (default: HOT_MOVEMENT_DAYS)"
+    )
+    args = parser.parse_args()
+
+    print("🗄️  STOCK MOVEMENT ARCHIVAL")
+    print("=" * 50)
+
+    result = archive_stock_movements(args.days)
+
+    print(f"   Cutoff: {result['cutoff']}")
+    for partition in result['partitions']:
+        print(f"   ✅ {partition['period']}: {partition['rows_moved']} rows "
+              f"→ {partition['table_name']}")
+
+    status = get_movement_partitions()
+    print(f"\n📊 Hot table: {status['hot_rows']} rows")
+    print(f"📦 Archived: {status['archived_rows']} rows in "
+          f"{len(status['partitions'])} partitions")
+    print(f"\n🎉 Moved {result['rows_moved']} movements")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+bcrypt Cost Factor Benchmark
+Times password hashing at each bcrypt cost factor on this machine and
+suggests the highest one that stays within a target latency
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+# Add parent directory to path
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.insert(0, str(parent_dir))
+
+from server.config import settings  # noqa: E402
+from server.password_pool import make_crypt_context  # noqa: E402
+
+
+def time_rounds(rounds: int, samples: int) -> float:
+    """Median milliseconds to hash one password at a cost factor"""
+    context = make_crypt_context(rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("benchmark-password")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    """Benchmark bcrypt cost factors and print the recommended setting"""
+    parser = argparse.ArgumentParser(description="Pick a bcrypt cost factor")
+    parser.add_argument(
+        "--target-ms", type=float, default=250,
+        help="Longest acceptable time for one hash (default: 250)"
+    )
+    parser.add_argument("--min-rounds", type=int, default=10, help="Lowest cost factor to try")
+    parser.add_argument("--max-rounds", type=int, default=15, help="Highest cost factor to try")
+    parser.add_argument("--samples", type=int, default=5, help="Hashes timed per cost factor")
+    args = parser.parse_args()
+
+    print("🔐 BCRYPT COST FACTOR BENCHMARK")
+    print("=" * 50)
+    print(f"Target: {args.target_ms:.0f} ms per hash "
+          f"(currently PASSWORD_BCRYPT_ROUNDS={settings.password_hashing.BCRYPT_ROUNDS})")
+
+    chosen = None
+    for rounds in range(args.min_rounds, args.max_rounds + 1):
+        median_ms = time_rounds(rounds, args.samples)
+        within = median_ms <= args.target_ms
+        print(f"   {'✅' if within else '❌'} rounds={rounds}: {median_ms:.1f} ms")
+        if not within:
+            # Each extra round doubles the cost, so higher ones are slower still
+            break
+        chosen = rounds
+
+    if chosen is None:
+        print(f"\n⚠️  Even rounds={args.min_rounds} exceeds the target; "
+              "raise --target-ms or add hashing workers")
+        sys.exit(1)
+
+    print(f"\n🎉 Recommended: PASSWORD_BCRYPT_ROUNDS={chosen}")
+    print(f"   Size PASSWORD_HASH_WORKERS ({settings.password_hashing.WORKERS} now) "
+          "for peak sign-ins per second x hash time")
+
+
+if __name__ == "__main__":
+    main()
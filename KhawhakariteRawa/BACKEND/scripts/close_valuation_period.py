@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Valuation Period Close Script
+Freezes month-end inventory valuations so financial reports for closed
+periods are served from snapshots instead of re-walking movement history
+"""
+
+import sys
+import argparse
+from datetime import date, timedelta
+from pathlib import Path
+
+# Add parent directory to path
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.insert(0, str(parent_dir))
+
+from server.services.valuation_service import close_valuation_period  # noqa: E402
+
+
+def main():
+    """Close a valuation period for every method"""
+    last_month = (date.today().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+    parser = argparse.ArgumentParser(description="Freeze month-end inventory valuations")
+    parser.add_argument(
+        "--period", default=last_month,
+        help=f"Month to close as YYYY-MM (default: {last_month})"
+    )
+    parser.add_argument(
+        "--replace", action="store_true",
+        help="Recompute periods that were already closed"
+    )
+    args = parser.parse_args()
+
+    print("📅 VALUATION PERIOD CLOSE")
+    print("=" * 50)
+
+    for method in ("FIFO", "LIFO", "AVERAGE"):
+        result = close_valuation_period(args.period, method, replace=args.replace)
+        if "error" in result:
+            print(f"   ❌ {method}: {result['error']}")
+            sys.exit(1)
+        print(f"   ✅ {method:<8} ${result['total_valuation']:,.2f} "
+              f"({result['items_processed']} items, closed {result['closed_at']})")
+
+    print(f"\n🎉 Period {args.period} closed")
+
+
+if __name__ == "__main__":
+    main()
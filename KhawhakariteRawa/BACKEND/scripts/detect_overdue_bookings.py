@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Overdue Booking Detection Script
+Marks active loans past their end date as Overdue and raises alerts, for
+deployments that run the job from cron instead of the API worker
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.insert(0, str(parent_dir))
+
+from server.services.booking_service import (  # noqa: E402
+    detect_overdue_bookings, get_overdue_bookings
+)
+
+
+def main():
+    """Run one overdue detection pass"""
+    parser = argparse.ArgumentParser(description="Detect overdue bookings")
+    parser.add_argument(
+        "--full", action="store_true",
+        help="Re-check every open loan instead of only those that ended since the last run"
+    )
+    args = parser.parse_args()
+
+    print("⏰ OVERDUE BOOKING DETECTION")
+    print("=" * 50)
+
+    result = detect_overdue_bookings(args.full)
+    print(f"   Window: {result['since'] or 'all'} → {result['cutoff']}")
+    print(f"   ✅ Marked overdue: {result['marked_overdue']}")
+    print(f"   🔔 Alerts raised: {result['alerts_created']}")
+
+    queue = get_overdue_bookings(limit=1)
+    print(f"\n🎉 Overdue queue: {queue['total']} bookings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Cost Layer Rebuild Script
+Replays stock movement history to rebuild the FIFO/LIFO cost layers,
+e.g. after importing historical data or restoring a backup
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.insert(0, str(parent_dir))
+
+from server.services.cost_layer_service import (  # noqa: E402
+    rebuild_cost_layers, get_cost_layer_valuation
+)
+
+
+def main():
+    """Rebuild cost layers and print the resulting valuations"""
+    print("🧮 COST LAYER REBUILD")
+    print("=" * 50)
+
+    result = rebuild_cost_layers()
+
+    print(f"   Movements replayed: {result['movements_replayed']}")
+    print(f"   Items with layers:  {result['items']}")
+    print(f"   Layers written:     {result['layers']}")
+
+    print("\n📊 Current valuation:")
+    for method in ("FIFO", "LIFO", "AVERAGE"):
+        valuation = get_cost_layer_valuation(method)
+        print(f"   {method:<8} ${valuation['total_valuation']:,.2f} "
+              f"({valuation['items_processed']} items)")
+
+    print("\n🎉 Cost layers rebuilt")
+
+
+if __name__ == "__main__":
+    main()
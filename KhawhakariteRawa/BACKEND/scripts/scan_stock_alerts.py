@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Stock Alert Scan Script
+Evaluates LOW_STOCK, OUT_OF_STOCK, OVERSTOCK and EXPIRY_WARNING for every
+item, for deployments that run the scan from cron instead of the API worker
+"""
+
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.insert(0, str(parent_dir))
+
+from server.services.alert_service import scan_stock_alerts  # noqa: E402
+
+
+def main():
+    """Run one full stock alert scan"""
+    print("🔔 STOCK ALERT SCAN")
+    print("=" * 50)
+
+    result = scan_stock_alerts()
+
+    for alert_type, count in sorted(result['by_type'].items()):
+        print(f"   ✅ {alert_type}: {count} new")
+
+    print(f"\n🎉 Raised {result['alerts_created']} alerts in {result['elapsed_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Metric Counter Verification Script
+Recounts the trigger-maintained dashboard counters from their source tables
+and optionally rebuilds them when they have drifted
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.insert(0, str(parent_dir))
+
+from server.services.counter_service import (  # noqa: E402
+    verify_counters, rebuild_counters
+)
+
+
+def main():
+    """Verify metric counters and rebuild them on request"""
+    parser = argparse.ArgumentParser(description="Verify metric counters")
+    parser.add_argument(
+        "--rebuild", action="store_true",
+        help="Reinstall the counter triggers and recompute every counter"
+    )
+    args = parser.parse_args()
+
+    print("🔢 METRIC COUNTER VERIFICATION")
+    print("=" * 50)
+
+    result = verify_counters()
+    for counter in result['counters']:
+        marker = "✅" if counter['in_sync'] else "❌"
+        print(f"   {marker} {counter['name']}: counter={counter['counter']} "
+              f"actual={counter['actual']}")
+
+    if result['in_sync']:
+        print(f"\n🎉 All {result['checked']} counters are in sync")
+        return
+
+    print(f"\n⚠️  {result['drifted']} of {result['checked']} counters have drifted")
+
+    if not args.rebuild:
+        print("   Run with --rebuild to recompute them")
+        sys.exit(1)
+
+    result = rebuild_counters()
+    if result['in_sync']:
+        print(f"🎉 Rebuilt {result['checked']} counters")
+    else:
+        print(f"❌ {result['drifted']} counters still drifted after rebuild")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
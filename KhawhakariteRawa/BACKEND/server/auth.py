@@ -3,24 +3,29 @@
 Authentication utilities and dependencies for Kaiwhakarite Rawa
 """
 
+import secrets
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from .config import settings
 from .models import UserResponse
 from .database import db
+from .user_cache import user_cache
+from .password_pool import password_hasher, make_crypt_context, PasswordHashBusy
 
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = make_crypt_context()
 
 # Security
 security = HTTPBearer()
 
+ACCESS_TOKEN_TYPE = "access"
+REFRESH_TOKEN_TYPE = "refresh"
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -32,15 +37,39 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def _password_pool_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many sign-ins in progress, please try again shortly",
+        headers={"Retry-After": str(password_hasher.retry_after())}
+    )
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password in the hashing pool, off the event loop"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHashBusy:
+        raise _password_pool_busy()
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing pool, off the event loop"""
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHashBusy:
+        raise _password_pool_busy()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS)
+        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "type": ACCESS_TOKEN_TYPE})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -50,13 +79,145 @@ def verify_token(token: str, credentials_exception):
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        # Refresh tokens only buy new access tokens
+        if email is None or payload.get("type") == REFRESH_TOKEN_TYPE:
             raise credentials_exception
         return email
     except JWTError:
         raise credentials_exception
 
 
+def _sqlite_timestamp(value: datetime) -> str:
+    """UTC datetime in the format CURRENT_TIMESTAMP compares against"""
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_refresh_token(user: dict, family_id: Optional[str] = None) -> str:
+    """Create a refresh token, starting a new session unless family_id continues one
+
+    Only the newest token of a session is recorded, so a session costs one
+    row however often it is refreshed.
+    """
+    jti = secrets.token_urlsafe(16)
+    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    
+    if family_id is None:
+        family_id = secrets.token_urlsafe(16)
+        with db.get_connection() as conn:
+            # Sessions long past expiry are no longer worth keeping
+            conn.execute(
+                "DELETE FROM refresh_tokens WHERE expires_at < datetime('now', '-1 day')"
+            )
+            conn.execute("""
+                INSERT INTO refresh_tokens (family_id, user_id, current_jti, expires_at)
+                VALUES (?, ?, ?, ?)
+            """, (family_id, user['id'], jti, _sqlite_timestamp(expire)))
+            conn.commit()
+    
+    return jwt.encode({
+        "sub": user['email'],
+        "type": REFRESH_TOKEN_TYPE,
+        "jti": jti,
+        "fam": family_id,
+        "exp": expire
+    }, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+def _decode_refresh_token(token: str, credentials_exception) -> dict:
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    
+    if payload.get("type") != REFRESH_TOKEN_TYPE or not payload.get("jti") or not payload.get("fam"):
+        raise credentials_exception
+    return payload
+
+
+def rotate_refresh_token(token: str):
+    """Exchange a refresh token for a new one; returns (user, new refresh token)
+
+    Presenting a token that has already been rotated means it was copied,
+    so the whole session is revoked.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    payload = _decode_refresh_token(token, credentials_exception)
+    new_jti = secrets.token_urlsafe(16)
+    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE refresh_tokens
+            SET current_jti = ?, expires_at = ?, rotated_at = CURRENT_TIMESTAMP
+            WHERE family_id = ? AND current_jti = ?
+            AND revoked_at IS NULL AND expires_at > CURRENT_TIMESTAMP
+            RETURNING user_id
+        """, (new_jti, _sqlite_timestamp(expire), payload['fam'], payload['jti']))
+        rotated = cursor.fetchone()
+        
+        if rotated is None:
+            cursor.execute("""
+                UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+                WHERE family_id = ? AND revoked_at IS NULL
+            """, (payload['fam'],))
+            conn.commit()
+            raise credentials_exception
+        
+        cursor.execute("SELECT * FROM users WHERE id = ?", (rotated['user_id'],))
+        user = cursor.fetchone()
+        if user is None or user['status'] != 'Active' or user['email'] != payload['sub']:
+            conn.rollback()
+            raise credentials_exception
+        
+        conn.commit()
+    
+    user = dict(user)
+    new_token = jwt.encode({
+        "sub": user['email'],
+        "type": REFRESH_TOKEN_TYPE,
+        "jti": new_jti,
+        "fam": payload['fam'],
+        "exp": expire
+    }, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return user, new_token
+
+
+def revoke_refresh_token(token: str) -> bool:
+    """Revoke the session a refresh token belongs to (logout)"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token"
+    )
+    payload = _decode_refresh_token(token, credentials_exception)
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+            WHERE family_id = ? AND revoked_at IS NULL
+        """, (payload['fam'],))
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def revoke_user_refresh_tokens(user_id: int) -> int:
+    """Revoke every session of a user, e.g. after a password change"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+            WHERE user_id = ? AND revoked_at IS NULL
+        """, (user_id,))
+        conn.commit()
+        return cursor.rowcount
+
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserResponse:
     """Get the current authenticated user"""
     credentials_exception = HTTPException(
@@ -67,6 +228,10 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     
     email = verify_token(credentials.credentials, credentials_exception)
     
+    cached_user = user_cache.get(email)
+    if cached_user is not None:
+        return cached_user
+    
     user = db.execute_query(
         "SELECT * FROM users WHERE email = ?",
         (email,),
@@ -76,7 +241,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     if user is None:
         raise credentials_exception
     
-    return UserResponse(**user)
+    current_user = UserResponse(**user)
+    user_cache.put(email, current_user)
+    return current_user
 
 
 async def get_current_active_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
@@ -96,7 +263,7 @@ def require_staff(current_user: UserResponse = Depends(get_current_active_user))
     return current_user
 
 
-def authenticate_user(email: str, password: str):
+async def authenticate_user(email: str, password: str):
     """Authenticate a user with email and password"""
     user = db.execute_query(
         "SELECT * FROM users WHERE email = ?",
@@ -107,16 +274,16 @@ def authenticate_user(email: str, password: str):
     if not user:
         return False
     
-    if not verify_password(password, user['password_hash']):
+    if not await verify_password_async(password, user['password_hash']):
         return False
     
     return user
 
 
-def create_user(user_data: dict) -> int:
+def create_user(user_data: dict, hashed_password: Optional[str] = None) -> int:
     """Create a new user in the database"""
-    # Hash the password
-    hashed_password = get_password_hash(user_data['password'])
+    # Hash the password unless the caller already has
+    hashed_password = hashed_password or get_password_hash(user_data['password'])
     
     # Insert user into database
     user_id = db.execute_query(
@@ -128,4 +295,5 @@ def create_user(user_data: dict) -> int:
         user_data.get('marae'), user_data.get('language_preference', 'en'))
     )
     
+    user_cache.invalidate(user_data['email'])
     return user_id 
\ No newline at end of file
@@ -54,6 +54,13 @@ class SecurityConfig:
         default=24, 
         cast=int
     )
+    # Overrides ACCESS_TOKEN_EXPIRE_HOURS; keep it short now that clients
+    # renew through /auth/refresh instead of logging in again
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = config(
+        'ACCESS_TOKEN_EXPIRE_MINUTES',
+        default=ACCESS_TOKEN_EXPIRE_HOURS * 60,
+        cast=int
+    )
     REFRESH_TOKEN_EXPIRE_DAYS: int = config(
         'REFRESH_TOKEN_EXPIRE_DAYS',
         default=30,
@@ -61,6 +68,53 @@ class SecurityConfig:
     )
 
 
+class ArchiveConfig:
+    """Stock movement archival configuration section"""
+    # Movements older than this are moved out of the hot stock_movements table
+    HOT_MOVEMENT_DAYS: int = config(
+        'HOT_MOVEMENT_DAYS',
+        default=365,
+        cast=int
+    )
+    PARTITION_PREFIX: str = "stock_movements_archive_"
+    HISTORY_VIEW: str = "stock_movements_history"
+
+
+class IdempotencyConfig:
+    """Idempotency-Key replay store configuration section"""
+    TTL_SECONDS: int = config('IDEMPOTENCY_TTL_SECONDS', default=86400, cast=int)
+    MAX_KEYS: int = config('IDEMPOTENCY_MAX_KEYS', default=10000, cast=int)
+
+
+class PasswordHashingConfig:
+    """Password hashing pool configuration section"""
+    # bcrypt cost factor for new hashes; pick it with scripts/benchmark_bcrypt.py
+    BCRYPT_ROUNDS: int = config('PASSWORD_BCRYPT_ROUNDS', default=12, cast=int)
+    # Worker processes per server process, and hashes allowed to wait for one
+    WORKERS: int = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+    MAX_QUEUE: int = config('PASSWORD_HASH_MAX_QUEUE', default=32, cast=int)
+
+
+class UserCacheConfig:
+    """Authenticated user cache configuration section"""
+    # How long a user stays cached; 0 disables the cache
+    TTL_SECONDS: int = config('AUTH_USER_CACHE_TTL_SECONDS', default=300, cast=int)
+    MAX_USERS: int = config('AUTH_USER_CACHE_MAX_USERS', default=1024, cast=int)
+    # How often the users table version is checked for changes made elsewhere
+    VERSION_CHECK_SECONDS: int = config('AUTH_USER_CACHE_VERSION_CHECK_SECONDS', default=5, cast=int)
+
+
+class ValuationConfig:
+    """Background valuation job configuration section"""
+    # Worker processes for valuation jobs (0 = one per CPU core)
+    JOB_WORKERS: int = config('VALUATION_JOB_WORKERS', default=0, cast=int)
+    # Items valued per partition handed to a worker
+    PARTITION_SIZE: int = config('VALUATION_PARTITION_SIZE', default=2000, cast=int)
+    RESULT_CACHE_SIZE: int = config('VALUATION_RESULT_CACHE_SIZE', default=32, cast=int)
+    # Finished jobs are kept this long for the progress endpoint
+    JOB_RETENTION_SECONDS: int = config('VALUATION_JOB_RETENTION_SECONDS', default=3600, cast=int)
+
+
 class FileConfig:
     """File upload configuration section"""
     UPLOAD_DIR: str = config('UPLOAD_DIR', default='./uploads')
@@ -108,6 +162,71 @@ class EmailConfig:
     USE_TLS: bool = config('EMAIL_USE_TLS', default=True, cast=bool)
 
 
+class AlertConfig:
+    """Stock alert scanner configuration section"""
+    # Full alert scan interval; 0 disables the background scanner
+    SCAN_INTERVAL_SECONDS: int = config('ALERT_SCAN_INTERVAL_SECONDS', default=900, cast=int)
+    EXPIRY_WARNING_DAYS: int = config('ALERT_EXPIRY_WARNING_DAYS', default=30, cast=int)
+    # Days before next_maintenance_date that MAINTENANCE_DUE is raised
+    MAINTENANCE_WARNING_DAYS: int = config('ALERT_MAINTENANCE_WARNING_DAYS', default=7, cast=int)
+
+
+class BookingConfig:
+    """Booking background job configuration section"""
+    # Overdue detection interval; 0 disables the background job
+    OVERDUE_CHECK_INTERVAL_SECONDS: int = config(
+        'BOOKING_OVERDUE_CHECK_INTERVAL_SECONDS', default=3600, cast=int
+    )
+
+
+class ReservationConfig:
+    """Stock reservation ledger configuration section"""
+    # How long a stock hold lasts unless it is released or consumed first
+    HOLD_TTL_SECONDS: int = config('RESERVATION_HOLD_TTL_SECONDS', default=900, cast=int)
+    # Write-behind interval for held totals into reserved_quantity
+    FLUSH_SECONDS: int = config('RESERVATION_FLUSH_SECONDS', default=5, cast=int)
+    # Open holds per worker process; further holds are refused
+    MAX_HOLDS: int = config('RESERVATION_MAX_HOLDS', default=100000, cast=int)
+
+
+class SequenceConfig:
+    """Document number sequence configuration section"""
+    # Numbers each worker process reserves at a time; unused ones are skipped
+    BLOCK_SIZE: int = config('SEQUENCE_BLOCK_SIZE', default=20, cast=int)
+
+
+class RateLimitConfig:
+    """Rate limiting and admission control configuration section
+
+    Each route class has a token bucket per user (or per client address
+    when unauthenticated) refilled at PER_SECOND up to BURST, and a cap on
+    requests in flight per worker process. 0 turns a limit off.
+    """
+    ENABLED: bool = config('RATE_LIMIT_ENABLED', default=True, cast=bool)
+    # Buckets kept per worker process; the least recently used are dropped
+    MAX_KEYS: int = config('RATE_LIMIT_MAX_KEYS', default=10000, cast=int)
+    DEFAULT_PER_SECOND: float = config('RATE_LIMIT_DEFAULT_PER_SECOND', default=20.0, cast=float)
+    DEFAULT_BURST: int = config('RATE_LIMIT_DEFAULT_BURST', default=60, cast=int)
+    DEFAULT_MAX_CONCURRENT: int = config('RATE_LIMIT_DEFAULT_MAX_CONCURRENT', default=0, cast=int)
+    # Login (per client address and email), registration and password changes
+    AUTH_PER_SECOND: float = config('RATE_LIMIT_AUTH_PER_SECOND', default=0.2, cast=float)
+    AUTH_BURST: int = config('RATE_LIMIT_AUTH_BURST', default=10, cast=int)
+    AUTH_MAX_CONCURRENT: int = config('RATE_LIMIT_AUTH_MAX_CONCURRENT', default=32, cast=int)
+    # Valuations, rebuilds, archival, alert scans and financial reports
+    HEAVY_PER_SECOND: float = config('RATE_LIMIT_HEAVY_PER_SECOND', default=0.1, cast=float)
+    HEAVY_BURST: int = config('RATE_LIMIT_HEAVY_BURST', default=5, cast=int)
+    HEAVY_MAX_CONCURRENT: int = config('RATE_LIMIT_HEAVY_MAX_CONCURRENT', default=4, cast=int)
+
+
+class EventStreamConfig:
+    """Dashboard event stream (Server-Sent Events) configuration section"""
+    # Concurrent stream clients per worker process; further clients get 503
+    MAX_CLIENTS: int = config('EVENT_STREAM_MAX_CLIENTS', default=100, cast=int)
+    # Events buffered per client before it is told to resync
+    QUEUE_SIZE: int = config('EVENT_STREAM_QUEUE_SIZE', default=256, cast=int)
+    HEARTBEAT_SECONDS: int = config('EVENT_STREAM_HEARTBEAT_SECONDS', default=15, cast=int)
+
+
 class AppConfig:
     """Application configuration section"""
     NAME: str = "Kaiwhakarite Rawa"
@@ -135,6 +254,17 @@ class Settings:
         # Initialize configuration sections
         self.database = DatabaseConfig()
         self.security = SecurityConfig()
+        self.archive = ArchiveConfig()
+        self.idempotency = IdempotencyConfig()
+        self.password_hashing = PasswordHashingConfig()
+        self.user_cache = UserCacheConfig()
+        self.valuation = ValuationConfig()
+        self.alerts = AlertConfig()
+        self.bookings = BookingConfig()
+        self.reservations = ReservationConfig()
+        self.sequences = SequenceConfig()
+        self.rate_limit = RateLimitConfig()
+        self.events = EventStreamConfig()
         self.files = FileConfig()
         self.cors = CORSConfig()
         self.email = EmailConfig()
@@ -146,6 +276,11 @@ class Settings:
         self.ALGORITHM = self.security.ALGORITHM
         self.ACCESS_TOKEN_EXPIRE_HOURS = \
             self.security.ACCESS_TOKEN_EXPIRE_HOURS
+        self.ACCESS_TOKEN_EXPIRE_MINUTES = \
+            self.security.ACCESS_TOKEN_EXPIRE_MINUTES
+        self.REFRESH_TOKEN_EXPIRE_DAYS = \
+            self.security.REFRESH_TOKEN_EXPIRE_DAYS
+        self.HOT_MOVEMENT_DAYS = self.archive.HOT_MOVEMENT_DAYS
         self.UPLOAD_DIR = self.files.UPLOAD_DIR
         self.MAX_UPLOAD_SIZE = self.files.MAX_UPLOAD_SIZE
         self.CORS_ORIGINS = self.cors.get_origins()
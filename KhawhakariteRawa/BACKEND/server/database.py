@@ -7,11 +7,43 @@ import sqlite3
 import json
 from pathlib import Path
 from datetime import datetime, date
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from contextlib import contextmanager
 from passlib.context import CryptContext
 
 
+# Trigger-maintained metric counters: name -> (table, condition, value).
+# {row} stands for NEW/OLD in triggers and the table alias when rebuilding.
+METRIC_COUNTERS = {
+    'inventory_items.total': ('inventory_items', '1', '1'),
+    'inventory_items.active': ('inventory_items', '{row}.is_active = 1', '1'),
+    'inventory_items.active_value': (
+        'inventory_items', '{row}.is_active = 1', 'COALESCE({row}.current_value, 0)'
+    ),
+    'inventory_items.quantity_le_5': ('inventory_items', '{row}.quantity <= 5', '1'),
+    'inventory_items.low_stock': (
+        'inventory_items',
+        '{row}.is_active = 1 AND {row}.reorder_level > 0 '
+        'AND {row}.quantity > 0 AND {row}.quantity <= {row}.reorder_level',
+        '1'
+    ),
+    'inventory_items.out_of_stock': (
+        'inventory_items', '{row}.is_active = 1 AND {row}.quantity = 0', '1'
+    ),
+    'bookings.active': ('bookings', "{row}.status = 'Active'", '1'),
+    'bookings.pending': ('bookings', "{row}.status = 'Pending'", '1'),
+    'maintenance_records.pending': ('maintenance_records', "{row}.status = 'Pending'", '1'),
+    'suppliers.total': ('suppliers', '1', '1'),
+    'purchase_orders.total': ('purchase_orders', '1', '1'),
+    'purchase_orders.pending': (
+        'purchase_orders', "{row}.status IN ('DRAFT', 'SENT', 'CONFIRMED')", '1'
+    ),
+    'purchase_orders.value': (
+        'purchase_orders', "{row}.status != 'CANCELLED'", 'COALESCE({row}.total_amount, 0)'
+    ),
+}
+
+
 class Database:
     def __init__(self, db_path: str = None):
         if db_path is None:
@@ -123,6 +155,7 @@ class Database:
                     weight REAL,
                     dimensions TEXT,
                     tags TEXT,
+                    is_active BOOLEAN DEFAULT 1,
                     is_loanable BOOLEAN DEFAULT 1,
                     loan_duration_days INTEGER DEFAULT 7,
                     notes TEXT,
@@ -242,9 +275,11 @@ class Database:
                     completed_at TIMESTAMP,
                     reason TEXT,
                     notes TEXT,
+                    document_id INTEGER,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (item_id) REFERENCES inventory_items (id),
+                    FOREIGN KEY (document_id) REFERENCES transfer_documents (id),
                     FOREIGN KEY (from_location_id) REFERENCES locations (id),
                     FOREIGN KEY (to_location_id) REFERENCES locations (id),
                     FOREIGN KEY (requested_by) REFERENCES users (id),
@@ -287,12 +322,462 @@ class Database:
                     FOREIGN KEY (user_id) REFERENCES users (id)
                 )
             """)
-            
+
+            # Add columns introduced after the original schema
+            self._add_missing_columns(cursor, 'inventory_items', {
+                'is_active': 'BOOLEAN DEFAULT 1'
+            })
+            self._add_missing_columns(cursor, 'stock_transfers', {
+                'document_id': 'INTEGER REFERENCES transfer_documents (id)'
+            })
+
+            # Create stock_movement_partitions table (archived months)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS stock_movement_partitions (
+                    period TEXT PRIMARY KEY,
+                    table_name TEXT UNIQUE NOT NULL,
+                    row_count INTEGER DEFAULT 0,
+                    first_movement_at TIMESTAMP,
+                    last_movement_at TIMESTAMP,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Union of hot and archived movements for historical reports.
+            # Rebuilt by the archive service whenever a partition is added.
+            cursor.execute("""
+                CREATE VIEW IF NOT EXISTS stock_movements_history AS
+                SELECT * FROM stock_movements
+            """)
+
+            # Create indexes for hot-path lookups
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_stock_movements_item_created
+                ON stock_movements(item_id, created_at)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_stock_movements_created
+                ON stock_movements(created_at)
+            """)
+
+            # Booking listings: per-user history, status/date filters and
+            # the newest-first staff listing
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_bookings_user_created
+                ON bookings(user_id, created_at)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_bookings_status_start
+                ON bookings(status, start_date)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_bookings_created
+                ON bookings(created_at)
+            """)
+
+            # Deadline columns read by the due-date scheduler at startup
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_inventory_items_expiry
+                ON inventory_items(expiry_date) WHERE expiry_date IS NOT NULL
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_maintenance_records_item
+                ON maintenance_records(item_id)
+            """)
+
+            # At most one active alert per item and type. Older duplicates
+            # are retired first so the unique index can be built.
+            cursor.execute("""
+                UPDATE stock_alerts SET is_active = 0
+                WHERE is_active = 1 AND id NOT IN (
+                    SELECT MIN(id) FROM stock_alerts
+                    WHERE is_active = 1
+                    GROUP BY item_id, alert_type
+                )
+            """)
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_stock_alerts_active
+                ON stock_alerts(item_id, alert_type) WHERE is_active = 1
+            """)
+
+            # Create transfer_documents table (one document, many stock_transfers lines)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS transfer_documents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_number TEXT UNIQUE NOT NULL,
+                    from_location_id INTEGER NOT NULL,
+                    to_location_id INTEGER NOT NULL,
+                    status TEXT DEFAULT 'PENDING',
+                    transfer_date DATE DEFAULT (date('now')),
+                    requested_by INTEGER NOT NULL,
+                    approved_by INTEGER,
+                    dispatched_by INTEGER,
+                    received_by INTEGER,
+                    approved_at TIMESTAMP,
+                    dispatched_at TIMESTAMP,
+                    completed_at TIMESTAMP,
+                    reason TEXT,
+                    notes TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (from_location_id) REFERENCES locations (id),
+                    FOREIGN KEY (to_location_id) REFERENCES locations (id),
+                    FOREIGN KEY (requested_by) REFERENCES users (id),
+                    FOREIGN KEY (approved_by) REFERENCES users (id),
+                    FOREIGN KEY (dispatched_by) REFERENCES users (id),
+                    FOREIGN KEY (received_by) REFERENCES users (id)
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_stock_transfers_document
+                ON stock_transfers(document_id)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_transfer_documents_status
+                ON transfer_documents(status, created_at)
+            """)
+
+            # Create inventory_valuations table (valuation history per item)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS inventory_valuations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    item_id INTEGER NOT NULL,
+                    valuation_method TEXT NOT NULL,
+                    cost_per_unit REAL NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    total_value REAL NOT NULL,
+                    valuation_date DATE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (item_id) REFERENCES inventory_items (id)
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_inventory_valuations_item_date
+                ON inventory_valuations(item_id, valuation_date)
+            """)
+
+            # Create inventory_cost_layers table (open receipt layers per item).
+            # FIFO/LIFO follow calculate_item_valuation: FIFO values stock on
+            # hand at the earliest receipts, so stock going out draws down the
+            # newest fifo_remaining first; LIFO is the mirror image.
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS inventory_cost_layers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    item_id INTEGER NOT NULL,
+                    movement_id INTEGER NOT NULL,
+                    received_at TIMESTAMP NOT NULL,
+                    unit_cost REAL NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    fifo_remaining INTEGER NOT NULL,
+                    lifo_remaining INTEGER NOT NULL,
+                    FOREIGN KEY (item_id) REFERENCES inventory_items (id)
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_cost_layers_item_received
+                ON inventory_cost_layers(item_id, received_at, movement_id)
+            """)
+
+            # Create inventory_cost_summary table (per-item totals read in O(1))
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS inventory_cost_summary (
+                    item_id INTEGER PRIMARY KEY,
+                    received_quantity INTEGER NOT NULL DEFAULT 0,
+                    received_cost REAL NOT NULL DEFAULT 0,
+                    fifo_quantity INTEGER NOT NULL DEFAULT 0,
+                    fifo_value REAL NOT NULL DEFAULT 0,
+                    lifo_quantity INTEGER NOT NULL DEFAULT 0,
+                    lifo_value REAL NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (item_id) REFERENCES inventory_items (id)
+                )
+            """)
+
+            # Keep cost layers current on every movement. Transfers between
+            # locations and booking loans out and back never change what the
+            # stock cost, so they are skipped.
+            # The trigger names carry a version: when a body changes, bump the
+            # suffix and list the previous names here so they are dropped.
+            for old_trigger in ('trg_cost_layers_receive', 'trg_cost_layers_consume'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {old_trigger}")
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_cost_layers_receive_v2
+                AFTER INSERT ON stock_movements
+                WHEN (NEW.movement_type IN ('IN', 'RETURN')
+                      OR (NEW.movement_type = 'ADJUSTMENT' AND NEW.quantity > 0))
+                AND COALESCE(NEW.reference_type, '') NOT IN ('stock_transfer', 'booking')
+                BEGIN
+                    INSERT OR IGNORE INTO inventory_cost_summary (item_id) VALUES (NEW.item_id);
+
+                    UPDATE inventory_cost_summary
+                    SET received_quantity = received_quantity + NEW.quantity,
+                        received_cost = received_cost + NEW.quantity * NEW.unit_cost
+                    WHERE item_id = NEW.item_id
+                    AND NEW.movement_type = 'IN' AND NEW.unit_cost IS NOT NULL;
+
+                    -- Uncosted returns and count-ups come back at average cost
+                    INSERT INTO inventory_cost_layers (
+                        item_id, movement_id, received_at, unit_cost,
+                        quantity, fifo_remaining, lifo_remaining
+                    )
+                    SELECT NEW.item_id, NEW.id, NEW.created_at,
+                           COALESCE(NEW.unit_cost, s.received_cost / s.received_quantity),
+                           NEW.quantity, NEW.quantity, NEW.quantity
+                    FROM inventory_cost_summary s
+                    WHERE s.item_id = NEW.item_id
+                    AND (NEW.unit_cost IS NOT NULL OR s.received_quantity > 0);
+
+                    UPDATE inventory_cost_summary
+                    SET fifo_quantity = (SELECT COALESCE(SUM(fifo_remaining), 0) FROM inventory_cost_layers WHERE item_id = NEW.item_id),
+                        fifo_value = (SELECT COALESCE(SUM(fifo_remaining * unit_cost), 0) FROM inventory_cost_layers WHERE item_id = NEW.item_id),
+                        lifo_quantity = (SELECT COALESCE(SUM(lifo_remaining), 0) FROM inventory_cost_layers WHERE item_id = NEW.item_id),
+                        lifo_value = (SELECT COALESCE(SUM(lifo_remaining * unit_cost), 0) FROM inventory_cost_layers WHERE item_id = NEW.item_id),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE item_id = NEW.item_id;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_cost_layers_consume_v2
+                AFTER INSERT ON stock_movements
+                WHEN (NEW.movement_type = 'OUT'
+                      OR (NEW.movement_type = 'ADJUSTMENT' AND NEW.quantity < 0))
+                AND COALESCE(NEW.reference_type, '') NOT IN ('stock_transfer', 'booking')
+                BEGIN
+                    UPDATE inventory_cost_layers
+                    SET fifo_remaining = fifo_remaining - d.take
+                    FROM (
+                        SELECT id, MIN(fifo_remaining, MAX(0, ABS(NEW.quantity) - (
+                            SUM(fifo_remaining) OVER (ORDER BY received_at DESC, movement_id DESC) - fifo_remaining
+                        ))) as take
+                        FROM inventory_cost_layers
+                        WHERE item_id = NEW.item_id AND fifo_remaining > 0
+                    ) d
+                    WHERE inventory_cost_layers.id = d.id AND d.take > 0;
+
+                    UPDATE inventory_cost_layers
+                    SET lifo_remaining = lifo_remaining - d.take
+                    FROM (
+                        SELECT id, MIN(lifo_remaining, MAX(0, ABS(NEW.quantity) - (
+                            SUM(lifo_remaining) OVER (ORDER BY received_at, movement_id) - lifo_remaining
+                        ))) as take
+                        FROM inventory_cost_layers
+                        WHERE item_id = NEW.item_id AND lifo_remaining > 0
+                    ) d
+                    WHERE inventory_cost_layers.id = d.id AND d.take > 0;
+
+                    UPDATE inventory_cost_summary
+                    SET fifo_quantity = (SELECT COALESCE(SUM(fifo_remaining), 0) FROM inventory_cost_layers WHERE item_id = NEW.item_id),
+                        fifo_value = (SELECT COALESCE(SUM(fifo_remaining * unit_cost), 0) FROM inventory_cost_layers WHERE item_id = NEW.item_id),
+                        lifo_quantity = (SELECT COALESCE(SUM(lifo_remaining), 0) FROM inventory_cost_layers WHERE item_id = NEW.item_id),
+                        lifo_value = (SELECT COALESCE(SUM(lifo_remaining * unit_cost), 0) FROM inventory_cost_layers WHERE item_id = NEW.item_id),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE item_id = NEW.item_id;
+                END
+            """)
+
+            # Create valuation_periods / valuation_snapshots tables (frozen month-ends)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS valuation_periods (
+                    period TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    period_end DATE NOT NULL,
+                    total_valuation REAL NOT NULL,
+                    items_processed INTEGER NOT NULL,
+                    closed_by INTEGER,
+                    closed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (period, method),
+                    FOREIGN KEY (closed_by) REFERENCES users (id)
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS valuation_snapshots (
+                    period TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    item_name TEXT,
+                    quantity INTEGER NOT NULL,
+                    cost_per_unit REAL NOT NULL,
+                    total_value REAL NOT NULL,
+                    PRIMARY KEY (period, method, item_id),
+                    FOREIGN KEY (item_id) REFERENCES inventory_items (id)
+                )
+            """)
+
+            # Create table_versions table (bumped by triggers so caches can
+            # tell when the data they were built from has changed)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS table_versions (
+                    table_name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._create_version_triggers(cursor, [
+                'inventory_items', 'stock_movements', 'bookings',
+                'maintenance_records', 'suppliers', 'categories', 'users'
+            ])
+
+            # Create metric_counters table (totals kept current by triggers)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS metric_counters (
+                    name TEXT PRIMARY KEY,
+                    value NUMERIC NOT NULL DEFAULT 0
+                )
+            """)
+            self.create_counter_triggers(cursor)
+
+            # Create document_sequences table (named counters for document numbers)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS document_sequences (
+                    name TEXT PRIMARY KEY,
+                    next_value INTEGER NOT NULL DEFAULT 1,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+            # Create job_runs table (watermarks for incremental background jobs)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS job_runs (
+                    name TEXT PRIMARY KEY,
+                    last_cutoff TEXT,
+                    last_run_at TIMESTAMP,
+                    last_result TEXT
+                )
+            """)
+
+            # Create refresh_tokens table (one row per login session; only the
+            # latest token of each session is valid)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS refresh_tokens (
+                    family_id TEXT PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    current_jti TEXT NOT NULL,
+                    expires_at TIMESTAMP NOT NULL,
+                    revoked_at TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    rotated_at TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users (id)
+                )
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user
+                ON refresh_tokens(user_id)
+            """)
+
+            # Open loans by end date, for overdue detection
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_bookings_open_end
+                ON bookings(end_date) WHERE status = 'Active' AND return_date IS NULL
+            """)
+
             conn.commit()
             
             # Insert default data if tables are empty
             self._insert_default_data(cursor, conn)
 
+    def _create_version_triggers(self, cursor, tables: List[str]):
+        """Bump table_versions on every insert, update and delete of the given tables"""
+        for table_name in tables:
+            cursor.execute(
+                "INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)",
+                (table_name,)
+            )
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_version_{table_name}_{event.lower()}
+                    AFTER {event} ON {table_name}
+                    BEGIN
+                        UPDATE table_versions SET version = version + 1
+                        WHERE table_name = '{table_name}';
+                    END
+                """)
+
+    def _counter_term(self, name: str, row: str) -> str:
+        """SQL for one row's contribution to a counter"""
+        _, condition, value = METRIC_COUNTERS[name]
+        return (f"(CASE WHEN {condition.format(row=row)} "
+                f"THEN {value.format(row=row)} ELSE 0 END)")
+
+    def counter_rebuild_sql(self, name: str) -> str:
+        """SQL computing a counter from scratch with a table scan"""
+        table_name = METRIC_COUNTERS[name][0]
+        return f"SELECT COALESCE(SUM({self._counter_term(name, 't')}), 0) FROM {table_name} t"
+
+    def create_counter_triggers(self, cursor, replace: bool = False):
+        """Install metric counter triggers for every counted table that exists"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existing_tables = {row[0] for row in cursor.fetchall()}
+        
+        by_table: Dict[str, List[str]] = {}
+        for name, (table_name, _, _) in METRIC_COUNTERS.items():
+            if table_name in existing_tables:
+                by_table.setdefault(table_name, []).append(name)
+        
+        for table_name, names in by_table.items():
+            # Seed missing counters from the current data before the
+            # triggers start applying deltas
+            cursor.execute(
+                f"SELECT name FROM metric_counters WHERE name IN ({', '.join('?' for _ in names)})",
+                names
+            )
+            seeded = {row[0] for row in cursor.fetchall()}
+            for name in names:
+                if name not in seeded:
+                    cursor.execute(
+                        f"INSERT INTO metric_counters (name, value) VALUES (?, ({self.counter_rebuild_sql(name)}))",
+                        (name,)
+                    )
+            
+            deltas = {
+                'INSERT': lambda name: self._counter_term(name, 'NEW'),
+                'DELETE': lambda name: f"-{self._counter_term(name, 'OLD')}",
+                'UPDATE': lambda name: (f"{self._counter_term(name, 'NEW')} - "
+                                        f"{self._counter_term(name, 'OLD')}"),
+            }
+            quoted = ", ".join(f"'{name}'" for name in names)
+            
+            for event, delta in deltas.items():
+                trigger_name = f"trg_counters_{table_name}_{event.lower()}"
+                if replace:
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_name}")
+                cases = " ".join(f"WHEN '{name}' THEN {delta(name)}" for name in names)
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {trigger_name}
+                    AFTER {event} ON {table_name}
+                    BEGIN
+                        UPDATE metric_counters SET value = value + (CASE name {cases} END)
+                        WHERE name IN ({quoted});
+                    END
+                """)
+
+    def get_counters(self, *names: str) -> Dict[str, Any]:
+        """Read metric counters by primary key; missing counters read as 0"""
+        rows = self.execute_query(
+            f"SELECT name, value FROM metric_counters WHERE name IN ({', '.join('?' for _ in names)})",
+            names, fetch_all=True
+        )
+        values = {row['name']: row['value'] for row in rows}
+        return {name: values.get(name, 0) for name in names}
+
+    def get_table_versions(self, *tables: str) -> Dict[str, int]:
+        """Get the change counters for the given tables"""
+        placeholders = ", ".join("?" for _ in tables)
+        rows = self.execute_query(
+            f"SELECT table_name, version FROM table_versions WHERE table_name IN ({placeholders})",
+            tables, fetch_all=True
+        )
+        return {row['table_name']: row['version'] for row in rows}
+
+    def _add_missing_columns(self, cursor, table_name: str, columns: Dict[str, str]):
+        """Add columns to an existing table if an older database lacks them"""
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        existing = {row[1] for row in cursor.fetchall()}
+        
+        for column, definition in columns.items():
+            if column not in existing:
+                cursor.execute(
+                    f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}"
+                )
+
     def _insert_default_data(self, cursor, conn):
         """Insert default data into the database"""
         # Check if users table is empty
@@ -405,8 +890,8 @@ class Database:
                 new_values: Optional[Dict[str, Any]] = None, ip_address: Optional[str] = None,
                 user_agent: Optional[str] = None):
         """Log an audit entry"""
-        old_values_json = json.dumps(old_values) if old_values else None
-        new_values_json = json.dumps(new_values) if new_values else None
+        old_values_json = json.dumps(old_values, default=str) if old_values else None
+        new_values_json = json.dumps(new_values, default=str) if new_values else None
         
         self.execute_query(
             """INSERT INTO audit_log 
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+In-process event bus for Kaiwhakarite Rawa
+Write paths publish change events; the dashboard event stream fans them out
+to connected clients over Server-Sent Events
+"""
+
+import json
+import asyncio
+import itertools
+import threading
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Event types published by the write path
+EVENT_TYPES = ("stock", "booking", "alert")
+
+
+class EventStreamFull(Exception):
+    """Raised when this worker already serves the maximum number of clients"""
+
+
+class Subscription:
+    """One connected client: a bounded queue owned by the client's event loop"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, topics: frozenset, queue_size: int):
+        self.loop = loop
+        self.topics = topics
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=queue_size)
+
+    def _offer(self, event: Dict[str, Any]):
+        """Queue an event without ever blocking the publisher (runs on self.loop)"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client that fell behind gets one resync instead of an
+            # unbounded backlog; it refetches state and carries on from here
+            dropped = 1
+            while not self.queue.empty():
+                queued = self.queue.get_nowait()
+                # Fold an earlier resync into this one
+                dropped += queued["data"]["dropped"] if queued["type"] == "resync" else 1
+            self.queue.put_nowait({
+                "id": event["id"],
+                "type": "resync",
+                "data": {"dropped": dropped},
+                "timestamp": event["timestamp"]
+            })
+
+
+class EventBus:
+    """Fan-out of change events to a bounded number of subscribers"""
+
+    def __init__(self, max_clients: int, queue_size: int):
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._published = 0
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None) -> Subscription:
+        """Register a client on the running event loop"""
+        subscription = Subscription(
+            asyncio.get_running_loop(),
+            frozenset(topics or EVENT_TYPES),
+            self.queue_size
+        )
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                raise EventStreamFull(
+                    f"Event stream is limited to {self.max_clients} clients per worker"
+                )
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove a client"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        """Publish an event to every interested subscriber; safe from any thread"""
+        event = {
+            "id": next(self._sequence),
+            "type": event_type,
+            "data": data,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        with self._lock:
+            self._published += 1
+            subscribers = [s for s in self._subscribers if event_type in s.topics]
+
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                # The client's loop has closed; it will unsubscribe itself
+                pass
+
+    def stats(self) -> dict:
+        """Get bus size for monitoring"""
+        with self._lock:
+            return {
+                "clients": len(self._subscribers),
+                "max_clients": self.max_clients,
+                "queue_size": self.queue_size,
+                "published": self._published
+            }
+
+
+def publish_event(event_type: str, **data):
+    """Publish a change event from the write path; never fails the write"""
+    try:
+        event_bus.publish(event_type, data)
+    except Exception as e:
+        logger.warning(f"Could not publish {event_type} event: {e}")
+
+
+def format_sse(event_type: str, data: Any, event_id: Optional[int] = None) -> str:
+    """Encode one Server-Sent Events frame"""
+    frame = f"event: {event_type}\n"
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {json.dumps(data, default=str)}\n\n"
+
+
+# Global event bus instance
+event_bus = EventBus(
+    max_clients=settings.events.MAX_CLIENTS,
+    queue_size=settings.events.QUEUE_SIZE
+)
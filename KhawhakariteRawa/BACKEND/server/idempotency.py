@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Idempotency key support for Kaiwhakarite Rawa
+Lets clients safely retry writes by sending an Idempotency-Key header
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+
+from .config import settings
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+class _Entry:
+    """A stored key: request fingerprint plus the cached response once done"""
+    __slots__ = ("fingerprint", "expires_at", "response", "completed")
+
+    def __init__(self, fingerprint: bytes, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.response = None
+        self.completed = False
+
+
+class IdempotencyStore:
+    """Bounded in-memory key store with TTL eviction"""
+
+    def __init__(self, ttl_seconds: int, max_keys: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(payload: Any) -> bytes:
+        """Hash a request payload so key reuse with a different body is caught"""
+        encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, default=str)
+        return hashlib.blake2b(encoded.encode(), digest_size=16).digest()
+
+    def _evict(self, now: float):
+        """Drop expired keys, then the oldest keys until there is room"""
+        # Entries are kept in insertion order and share one TTL, so expired
+        # keys are always at the front
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.expires_at > now and len(self._entries) < self.max_keys:
+                break
+            self._entries.popitem(last=False)
+
+    def begin(self, key: str, fingerprint: bytes):
+        """Claim a key. Returns (True, response) for a replay, (False, None) to execute"""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self._entries[key] = _Entry(fingerprint, now + self.ttl_seconds)
+                return False, None
+
+            if entry.fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"{IDEMPOTENCY_HEADER} was already used with a different request"
+                )
+
+            if not entry.completed:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"A request with this {IDEMPOTENCY_HEADER} is still being processed"
+                )
+
+            return True, entry.response
+
+    def complete(self, key: str, response: Any):
+        """Cache the response for a key claimed with begin()"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.response = response
+                entry.completed = True
+
+    def release(self, key: str):
+        """Forget a key whose request failed so the client can retry it"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """Get store size for monitoring"""
+        with self._lock:
+            return {
+                "keys": len(self._entries),
+                "max_keys": self.max_keys,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+
+def run_idempotent(idempotency_key: Optional[str], user_id: int, scope: str,
+                   payload: Any, operation: Callable[[], Any],
+                   response: Optional[Response] = None):
+    """Run a write once per (user, scope, key) and replay its result on retries"""
+    if not idempotency_key:
+        return operation()
+
+    if len(idempotency_key) > 255:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{IDEMPOTENCY_HEADER} must be at most 255 characters"
+        )
+
+    store_key = f"{user_id}:{scope}:{idempotency_key}"
+    replayed, cached = idempotency_store.begin(
+        store_key, IdempotencyStore.fingerprint(payload)
+    )
+
+    if replayed:
+        if response is not None:
+            response.headers[REPLAY_HEADER] = "true"
+        return cached
+
+    try:
+        result = jsonable_encoder(operation())
+    except BaseException:
+        idempotency_store.release(store_key)
+        raise
+
+    idempotency_store.complete(store_key, result)
+    return result
+
+
+# Global idempotency store instance
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.idempotency.TTL_SECONDS,
+    max_keys=settings.idempotency.MAX_KEYS
+)
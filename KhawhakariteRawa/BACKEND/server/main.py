@@ -5,6 +5,7 @@ Clean and modular architecture with separated concerns.
 """
 
 import sys
+import asyncio
 import logging
 from pathlib import Path
 from contextlib import asynccontextmanager
@@ -34,8 +35,17 @@ try:
     from .config import settings
     from .routes import (
         auth_router, dashboard_router, inventory_router, 
-        booking_router, purchase_order_router, enhanced_inventory_router
+        booking_router, purchase_order_router, enhanced_inventory_router,
+        transfer_router
     )
+    from .services.valuation_jobs import valuation_jobs
+    from .services.alert_service import run_alert_scanner
+    from .services.due_date_scheduler import due_date_scheduler
+    from .services.availability_service import availability_engine
+    from .services.booking_service import run_overdue_detector
+    from .services.reservation_service import reservation_ledger
+    from .password_pool import password_hasher
+    from .rate_limit import RateLimitMiddleware, rate_limiter
 except ImportError:
     # Fall back to absolute imports (when run directly)
     from server.config import settings
@@ -49,6 +59,15 @@ except ImportError:
     from server.routes.enhanced_inventory_routes import (
         router as enhanced_inventory_router
     )
+    from server.routes.transfer_routes import router as transfer_router
+    from server.services.valuation_jobs import valuation_jobs
+    from server.services.alert_service import run_alert_scanner
+    from server.services.due_date_scheduler import due_date_scheduler
+    from server.services.availability_service import availability_engine
+    from server.services.booking_service import run_overdue_detector
+    from server.services.reservation_service import reservation_ledger
+    from server.password_pool import password_hasher
+    from server.rate_limit import RateLimitMiddleware, rate_limiter
 
 
 @asynccontextmanager
@@ -56,6 +75,8 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     
+    background_tasks = []
+    
     # Startup
     try:
         # Initialize database
@@ -64,6 +85,26 @@ async def lifespan(app: FastAPI):
         # Create upload directory if it doesn't exist
         Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
         
+        # Start the bcrypt workers before the first login
+        password_hasher.start()
+        
+        # Build the booking availability index
+        availability_engine.load()
+        
+        # Periodic full stock alert scan
+        if settings.alerts.SCAN_INTERVAL_SECONDS > 0:
+            background_tasks.append(asyncio.create_task(run_alert_scanner()))
+        
+        # Mark loans past their end date as overdue
+        if settings.bookings.OVERDUE_CHECK_INTERVAL_SECONDS > 0:
+            background_tasks.append(asyncio.create_task(run_overdue_detector()))
+        
+        # Expiry and maintenance deadlines fire from an in-memory heap
+        background_tasks.append(asyncio.create_task(due_date_scheduler.run()))
+        
+        # Stock holds are written behind to reserved_quantity
+        background_tasks.append(asyncio.create_task(reservation_ledger.run()))
+        
         logger.info("Application startup complete")
         yield
         
@@ -72,6 +113,14 @@ async def lifespan(app: FastAPI):
         raise
     finally:
         # Shutdown
+        for task in background_tasks:
+            task.cancel()
+        valuation_jobs.shutdown()
+        password_hasher.shutdown()
+        try:
+            reservation_ledger.release_all()
+        except Exception as e:
+            logger.error(f"Releasing stock holds failed: {e}")
         logger.info("Application shutdown")
 
 
@@ -89,6 +138,9 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
     
+    # Rate limiting sits inside CORS so rejections still carry CORS headers
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+    
     # Add security middleware
     if not settings.DEBUG:
         app.add_middleware(
@@ -165,7 +217,8 @@ def create_app() -> FastAPI:
         (inventory_router, "Inventory"),
         (booking_router, "Bookings"),
         (purchase_order_router, "Purchase Orders"),
-        (enhanced_inventory_router, "Enhanced Inventory")
+        (enhanced_inventory_router, "Enhanced Inventory"),
+        (transfer_router, "Stock Transfers")
     ]
     
     for router, name in routers:
@@ -67,6 +67,14 @@ class PurchaseOrderStatus(str, Enum):
     CANCELLED = "CANCELLED"
 
 
+class TransferStatus(str, Enum):
+    PENDING = "PENDING"
+    APPROVED = "APPROVED"
+    IN_TRANSIT = "IN_TRANSIT"
+    RECEIVED = "RECEIVED"
+    CANCELLED = "CANCELLED"
+
+
 class SalesOrderStatus(str, Enum):
     PENDING = "PENDING"
     CONFIRMED = "CONFIRMED"
@@ -281,6 +289,30 @@ class StockMovementResponse(StockMovementBase):
     created_at: datetime
 
 
+class StockMovementBatchCreate(BaseModel):
+    movements: List[StockMovementCreate] = Field(..., min_length=1, max_length=1000)
+    all_or_nothing: bool = False
+
+
+# ============================================================================
+# STOCK TRANSFER MODELS
+# ============================================================================
+
+class StockTransferLineCreate(BaseModel):
+    item_id: int
+    quantity: int = Field(..., gt=0)
+    notes: Optional[str] = None
+
+
+class StockTransferCreate(BaseModel):
+    from_location_id: int
+    to_location_id: int
+    transfer_date: Optional[date] = None
+    reason: Optional[str] = None
+    notes: Optional[str] = None
+    items: List[StockTransferLineCreate] = Field(..., min_length=1, max_length=1000)
+
+
 # ============================================================================
 # PRODUCT VARIANT MODELS
 # ============================================================================
@@ -570,6 +602,12 @@ class BookingUpdate(BaseModel):
     damage_fee: Optional[float] = Field(None, ge=0)
 
 
+class BookingBulkAction(BaseModel):
+    booking_ids: List[int] = Field(..., min_length=1, max_length=1000)
+    return_condition: Optional[str] = None
+    notes: Optional[str] = None
+
+
 class BookingResponse(BookingBase):
     id: int
     user_id: int
@@ -821,6 +859,10 @@ class Token(BaseModel):
     token_type: str
 
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+
 class TokenData(BaseModel):
     email: Optional[str] = None
 
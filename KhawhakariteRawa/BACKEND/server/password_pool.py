@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Password hashing pool for Kaiwhakarite Rawa
+Runs bcrypt in a small process pool so a login never blocks the event loop
+"""
+
+import time
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from passlib.context import CryptContext
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def make_crypt_context(rounds: Optional[int] = None) -> CryptContext:
+    """bcrypt context at the configured cost factor (older hashes still verify)"""
+    return CryptContext(
+        schemes=["bcrypt"], deprecated="auto",
+        bcrypt__rounds=rounds or settings.password_hashing.BCRYPT_ROUNDS
+    )
+
+
+# Built once per worker process
+_worker_context: Optional[CryptContext] = None
+
+
+def _context() -> CryptContext:
+    global _worker_context
+    if _worker_context is None:
+        _worker_context = make_crypt_context()
+    return _worker_context
+
+
+def _hash_in_worker(password: str):
+    """Hash a password in a worker process; returns (hash, started_at)"""
+    started_at = time.time()
+    return _context().hash(password), started_at
+
+
+def _verify_in_worker(password: str, hashed_password: str):
+    """Verify a password in a worker process; returns (valid, started_at)"""
+    started_at = time.time()
+    return _context().verify(password, hashed_password), started_at
+
+
+class PasswordHashBusy(Exception):
+    """Raised when too many password hashes are already waiting"""
+
+
+class PasswordHasher:
+    """Bounded process pool for bcrypt with queue-time metrics"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(workers, 1)
+        self.max_queue = max_queue
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use"""
+        with self._lock:
+            if self._pool is None:
+                # Spawned workers do not inherit the server's threads or locks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def start(self):
+        """Start the workers now so the first login doesn't pay for it"""
+        pool = self._get_pool()
+        for _ in range(self.workers):
+            pool.submit(_context)
+
+    async def _run(self, fn, *args):
+        # Hashes beyond the workers plus the allowed queue are refused
+        # rather than left to pile up behind a burst of logins
+        with self._lock:
+            if self._in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHashBusy()
+            self._in_flight += 1
+
+        submitted_at = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            result, started_at = await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        finished_at = time.time()
+        queued = max(started_at - submitted_at, 0.0)
+        with self._lock:
+            self.completed += 1
+            self.queue_seconds_total += queued
+            self.queue_seconds_max = max(self.queue_seconds_max, queued)
+            self.run_seconds_total += max(finished_at - started_at, 0.0)
+        return result
+
+    async def hash(self, password: str) -> str:
+        """Hash a password off the event loop"""
+        return await self._run(_hash_in_worker, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verify a password against its hash off the event loop"""
+        return await self._run(_verify_in_worker, password, hashed_password)
+
+    def retry_after(self) -> int:
+        """Seconds a refused client should wait, from the average hash time"""
+        with self._lock:
+            average = self.run_seconds_total / self.completed if self.completed else 0.25
+            return max(int(average * (self._in_flight / self.workers + 1)) + 1, 1)
+
+    def stats(self) -> dict:
+        """Get pool load and queue times for monitoring"""
+        with self._lock:
+            completed = self.completed
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "completed": completed,
+                "rejected": self.rejected,
+                "bcrypt_rounds": settings.password_hashing.BCRYPT_ROUNDS,
+                "avg_queue_ms": round(self.queue_seconds_total / completed * 1000, 2) if completed else None,
+                "max_queue_ms": round(self.queue_seconds_max * 1000, 2),
+                "avg_hash_ms": round(self.run_seconds_total / completed * 1000, 2) if completed else None
+            }
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+# Global password hasher instance
+password_hasher = PasswordHasher(
+    workers=settings.password_hashing.WORKERS,
+    max_queue=settings.password_hashing.MAX_QUEUE
+)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Rate limiting and admission control for Kaiwhakarite Rawa
+Token buckets per user and route class, plus concurrency caps that shed load
+on expensive endpoints before they saturate a worker
+"""
+
+import re
+import json
+import math
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Pattern, Tuple
+from jose import JWTError, jwt
+
+from .config import settings
+
+
+# Route class -> (method, path pattern) pairs; the first match wins and
+# anything unmatched is "default"
+ROUTE_CLASSES: List[Tuple[str, Optional[str], Pattern]] = [
+    # bcrypt on every call; refresh only checks a signature and stays default
+    ("auth", "POST", re.compile(r"^/auth/(login|register)$")),
+    ("auth", "PUT", re.compile(r"^/auth/change-password$")),
+    # Full-inventory valuations, rebuilds and reports
+    ("heavy", None, re.compile(
+        r"^/api/inventory/(valuation|valuation/layers|valuation/jobs|valuation/periods/[^/]+/close"
+        r"|cost-layers/rebuild|movements/archive|alerts/scan|summary/enhanced)$"
+    )),
+    ("heavy", "GET", re.compile(
+        r"^/api/purchase-orders/(summary/statistics|suppliers/performance/report)$"
+    )),
+]
+
+# Long-lived or trivial requests that are never limited; the event stream
+# has its own client cap
+EXEMPT_PATHS = re.compile(r"^/(health|docs|redoc|openapi\.json|dashboard/stream)?$")
+
+# Sign-ins are limited per client address and account, so many handsets
+# behind one site's NAT don't share a single bucket
+EMAIL_KEYED_PATHS = {"/auth/login"}
+
+# Largest request body read to find the email a sign-in is for
+MAX_KEY_BODY_BYTES = 4096
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """Route class of a request, or None if it is exempt"""
+    if method == "OPTIONS" or EXEMPT_PATHS.match(path):
+        return None
+    for route_class, route_method, pattern in ROUTE_CLASSES:
+        if (route_method is None or route_method == method) and pattern.match(path):
+            return route_class
+    return "default"
+
+
+class RouteClassLimits:
+    """Refill rate, burst size and concurrency cap for one route class"""
+    __slots__ = ("rate", "burst", "max_concurrent")
+
+    def __init__(self, rate: float, burst: int, max_concurrent: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+
+
+class RateLimiter:
+    """Lazily refilled token buckets in a bounded LRU, with per-class in-flight counts"""
+
+    def __init__(self, limits: Dict[str, RouteClassLimits], max_keys: int):
+        self.limits = limits
+        self.max_keys = max_keys
+        # (route_class, identity) -> [tokens, last_refill]
+        self._buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._in_flight: Dict[str, int] = {name: 0 for name in limits}
+        self._counts: Dict[str, Dict[str, int]] = {
+            name: {"allowed": 0, "rate_limited": 0, "shed": 0} for name in limits
+        }
+        self._lock = threading.Lock()
+
+    def take(self, route_class: str, identity: str) -> float:
+        """Take a token; returns 0 if allowed, else seconds until one is available"""
+        limits = self.limits[route_class]
+        if limits.rate <= 0:
+            return 0.0
+
+        key = (route_class, identity)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(limits.burst), now]
+                self._buckets[key] = bucket
+                # An evicted bucket comes back full, so keep max_keys well
+                # above the number of clients active at once
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limits.burst, bucket[0] + (now - bucket[1]) * limits.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+
+            self._counts[route_class]["rate_limited"] += 1
+            return (1 - bucket[0]) / limits.rate
+
+    def acquire(self, route_class: str) -> bool:
+        """Claim a concurrency slot for the class; False if it is at its cap"""
+        cap = self.limits[route_class].max_concurrent
+        with self._lock:
+            if cap and self._in_flight[route_class] >= cap:
+                self._counts[route_class]["shed"] += 1
+                return False
+            self._in_flight[route_class] += 1
+            self._counts[route_class]["allowed"] += 1
+            return True
+
+    def release(self, route_class: str):
+        with self._lock:
+            self._in_flight[route_class] -= 1
+
+    def stats(self) -> dict:
+        """Get per-class admission counts for monitoring"""
+        with self._lock:
+            return {
+                "enabled": settings.rate_limit.ENABLED,
+                "tracked_keys": len(self._buckets),
+                "classes": {
+                    name: {
+                        "rate_per_second": limits.rate,
+                        "burst": limits.burst,
+                        "max_concurrent": limits.max_concurrent,
+                        "in_flight": self._in_flight[name],
+                        **self._counts[name]
+                    }
+                    for name, limits in self.limits.items()
+                }
+            }
+
+
+def _identity(scope) -> str:
+    """The token subject for authenticated requests, otherwise the client address"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+                    if payload.get("sub"):
+                        return f"user:{payload['sub']}"
+                except JWTError:
+                    pass
+            break
+
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+def _with_email(identity: str, body: bytes) -> str:
+    """Add the email submitted in a JSON body to a request's identity"""
+    try:
+        email = json.loads(body).get("email")
+    except (ValueError, AttributeError):
+        return identity
+    if not isinstance(email, str) or not email.strip():
+        return identity
+    return f"{identity}|email:{email.strip().lower()}"
+
+
+async def _buffer_body(receive):
+    """Read up to MAX_KEY_BODY_BYTES of the body; returns (body, receive replaying it)"""
+    messages = []
+    body = b""
+    while len(body) <= MAX_KEY_BODY_BYTES:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            break
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return body, replay
+
+
+async def _reject(send, status_code: int, retry_after: float, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(math.ceil(retry_after), 1)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying the rate limiter before a request reaches its route"""
+
+    def __init__(self, app, limiter: "RateLimiter"):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limit.ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        identity = _identity(scope)
+        if scope["method"] == "POST" and scope["path"] in EMAIL_KEYED_PATHS:
+            body, receive = await _buffer_body(receive)
+            identity = _with_email(identity, body)
+
+        wait = self.limiter.take(route_class, identity)
+        if wait:
+            await _reject(send, 429, wait, "Too many requests, please slow down")
+            return
+
+        if not self.limiter.acquire(route_class):
+            await _reject(send, 503, 1, "Server is busy, please try again shortly")
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(route_class)
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter({
+    "default": RouteClassLimits(
+        settings.rate_limit.DEFAULT_PER_SECOND, settings.rate_limit.DEFAULT_BURST,
+        settings.rate_limit.DEFAULT_MAX_CONCURRENT
+    ),
+    "auth": RouteClassLimits(
+        settings.rate_limit.AUTH_PER_SECOND, settings.rate_limit.AUTH_BURST,
+        settings.rate_limit.AUTH_MAX_CONCURRENT
+    ),
+    "heavy": RouteClassLimits(
+        settings.rate_limit.HEAVY_PER_SECOND, settings.rate_limit.HEAVY_BURST,
+        settings.rate_limit.HEAVY_MAX_CONCURRENT
+    ),
+}, max_keys=settings.rate_limit.MAX_KEYS)
@@ -9,6 +9,7 @@ from .inventory_routes import router as inventory_router
 from .booking_routes import router as booking_router
 from .purchase_order_routes import router as purchase_order_router
 from .enhanced_inventory_routes import router as enhanced_inventory_router
+from .transfer_routes import router as transfer_router
 
 __all__ = [
     "auth_router",
@@ -16,5 +17,6 @@ __all__ = [
     "inventory_router",
     "booking_router",
     "purchase_order_router",
-    "enhanced_inventory_router"
+    "enhanced_inventory_router",
+    "transfer_router"
 ] 
\ No newline at end of file
@@ -5,12 +5,19 @@ Authentication routes for Kaiwhakarite Rawa
 
 from datetime import timedelta
 from fastapi import APIRouter, HTTPException, status, Depends
-from ..models import UserCreate, UserLogin, UserResponse, PasswordChange, Token
+from ..models import (
+    UserCreate, UserLogin, UserResponse, PasswordChange, Token, RefreshTokenRequest
+)
 from ..auth import (
     authenticate_user, create_user, create_access_token, 
-    get_current_active_user, get_password_hash, verify_password
+    get_current_active_user, get_password_hash_async, verify_password_async,
+    create_refresh_token, rotate_refresh_token, revoke_refresh_token,
+    revoke_user_refresh_tokens
 )
 from ..database import db
+from ..user_cache import user_cache
+from ..password_pool import password_hasher
+from ..rate_limit import rate_limiter
 from ..config import settings
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
@@ -34,7 +41,8 @@ async def register(user: UserCreate):
     
     # Create user
     user_data = user.dict()
-    user_id = create_user(user_data)
+    hashed_password = await get_password_hash_async(user.password)
+    user_id = create_user(user_data, hashed_password)
     
     # Log audit
     db.log_audit(user_id, "CREATE", "users", user_id, {}, user_data)
@@ -55,7 +63,7 @@ async def register(user: UserCreate):
 @router.post("/login")
 async def login(user_credentials: UserLogin):
     """Login user and return access token"""
-    user = authenticate_user(user_credentials.email, user_credentials.password)
+    user = await authenticate_user(user_credentials.email, user_credentials.password)
     
     if not user:
         raise HTTPException(
@@ -71,20 +79,49 @@ async def login(user_credentials: UserLogin):
             (user_credentials.language_preference, user['id'])
         )
         user['language_preference'] = user_credentials.language_preference
+        user_cache.invalidate(user['email'])
     
-    # Create access token
-    access_token_expires = timedelta(hours=settings.ACCESS_TOKEN_EXPIRE_HOURS)
+    # Create access token, and a refresh token starting a new session
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user['email']}, expires_delta=access_token_expires
     )
+    refresh_token = create_refresh_token(user)
     
     return {
         "access_token": access_token,
+        "refresh_token": refresh_token,
         "token_type": "bearer",
+        "expires_in": int(access_token_expires.total_seconds()),
         "user": UserResponse(**user)
     }
 
 
+@router.post("/refresh")
+async def refresh(request: RefreshTokenRequest):
+    """Exchange a refresh token for a new access token and refresh token"""
+    user, refresh_token = rotate_refresh_token(request.refresh_token)
+    
+    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user['email']}, expires_delta=access_token_expires
+    )
+    
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": int(access_token_expires.total_seconds())
+    }
+
+
+@router.post("/logout")
+async def logout(request: RefreshTokenRequest):
+    """Revoke the session a refresh token belongs to"""
+    revoke_refresh_token(request.refresh_token)
+    return {"message": "Logged out successfully"}
+
+
 @router.get("/profile")
 async def get_profile(current_user: UserResponse = Depends(get_current_active_user)):
     """Get current user profile"""
@@ -105,20 +142,24 @@ async def change_password(
     )
     
     # Verify current password
-    if not verify_password(password_change.current_password, user_with_password['password_hash']):
+    if not await verify_password_async(password_change.current_password, user_with_password['password_hash']):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect current password"
         )
     
     # Hash new password
-    new_password_hash = get_password_hash(password_change.new_password)
+    new_password_hash = await get_password_hash_async(password_change.new_password)
     
     # Update password
     db.execute_query(
         "UPDATE users SET password_hash = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
         (new_password_hash, current_user.id)
     )
+    user_cache.invalidate(current_user.email)
+    
+    # Sign out every other session
+    revoke_user_refresh_tokens(current_user.id)
     
     # Log audit
     db.log_audit(
@@ -126,4 +167,40 @@ async def change_password(
         {"password": "***"}, {"password": "***"}
     )
     
-    return {"message": "Password changed successfully"} 
\ No newline at end of file
+    return {"message": "Password changed successfully"}
+
+
+@router.get("/user-cache/stats")
+async def get_user_cache_stats(current_user: UserResponse = Depends(get_current_active_user)):
+    """Get authenticated user cache hit rates (Admin only)"""
+    if current_user.role != 'Admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only Admin can view cache statistics"
+        )
+    
+    return user_cache.stats()
+
+
+@router.get("/password-hashing/stats")
+async def get_password_hashing_stats(current_user: UserResponse = Depends(get_current_active_user)):
+    """Get password hashing pool load and queue times (Admin only)"""
+    if current_user.role != 'Admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only Admin can view hashing statistics"
+        )
+    
+    return password_hasher.stats()
+
+
+@router.get("/rate-limit/stats")
+async def get_rate_limit_stats(current_user: UserResponse = Depends(get_current_active_user)):
+    """Get rate limiting and load shedding counts per route class (Admin only)"""
+    if current_user.role != 'Admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only Admin can view rate limit statistics"
+        )
+    
+    return rate_limiter.stats()
@@ -3,32 +3,137 @@
 Booking routes for Kaiwhakarite Rawa
 """
 
-from fastapi import APIRouter, Depends
-from ..models import UserResponse, BookingCreate
-from ..auth import get_current_active_user
-from ..services.booking_service import get_user_bookings, create_booking
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from ..models import UserResponse, BookingCreate, BookingStatus, BookingBulkAction
+from ..auth import get_current_active_user, require_staff
+from ..idempotency import run_idempotent, IDEMPOTENCY_HEADER
+from ..services.booking_service import (
+    get_user_bookings, create_booking, bulk_booking_action,
+    detect_overdue_bookings, get_overdue_bookings
+)
+from ..services.availability_service import search_available_items
 
 router = APIRouter(prefix="/bookings", tags=["bookings"])
 
 
 @router.get("")
 async def get_bookings(
+    status: Optional[BookingStatus] = Query(None),
+    item_id: Optional[int] = Query(None),
+    whanau_group: Optional[str] = Query(None),
+    from_date: Optional[date] = Query(None, description="Bookings ending on or after this date"),
+    to_date: Optional[date] = Query(None, description="Bookings starting on or before this date"),
+    active_now: bool = Query(False, description="Only approved, active and overdue bookings that have started"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
-    """Get bookings based on user role"""
-    bookings = get_user_bookings(current_user)
-    return {"bookings": bookings}
+    """Get a page of bookings based on user role, newest first"""
+    try:
+        return get_user_bookings(
+            current_user, status.value if status else None, item_id, whanau_group,
+            from_date, to_date, active_now, cursor, limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/availability")
+async def search_availability(
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    category_id: Optional[int] = Query(None),
+    location_id: Optional[int] = Query(None),
+    min_quantity: int = Query(1, ge=1),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Find loanable items with units free on every day between the dates"""
+    result = search_available_items(start_date, end_date, category_id, location_id,
+                                    min_quantity, skip, limit)
+    if "error" in result:
+        raise HTTPException(status_code=400, detail=result["error"])
+    return result
+
+
+@router.get("/overdue")
+async def get_overdue_queue(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Get overdue bookings, longest overdue first"""
+    return get_overdue_bookings(skip, limit)
+
+
+@router.post("/overdue/detect")
+async def detect_overdue(
+    full: bool = Query(False, description="Re-check every open loan instead of only new ones"),
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Run overdue booking detection now"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Only Admin or Manager can run overdue detection")
+    return detect_overdue_bookings(full)
 
 
 @router.post("")
 async def create_new_booking(
     booking: BookingCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
-    """Create a new booking"""
-    created_booking = create_booking(booking, current_user)
+    """Create a new booking (retry-safe with an Idempotency-Key header)"""
+    def _create():
+        created_booking = create_booking(booking, current_user)
+        
+        return {
+            "message": "Booking created successfully",
+            "booking": created_booking
+        }
     
-    return {
-        "message": "Booking created successfully",
-        "booking": created_booking
-    } 
\ No newline at end of file
+    return run_idempotent(
+        idempotency_key, current_user.id, "create-booking", booking.dict(),
+        _create, response
+    ) 
+
+def _run_bulk_action(action: str, request: BookingBulkAction, current_user: UserResponse):
+    """Run a bulk booking action and map service errors to HTTP errors"""
+    result = bulk_booking_action(
+        action, request.booking_ids, current_user.id,
+        request.return_condition, request.notes
+    )
+    if "error" in result:
+        raise HTTPException(status_code=409, detail=result["error"])
+    return result
+
+
+@router.post("/bulk/approve")
+async def bulk_approve_bookings(
+    request: BookingBulkAction,
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Approve many pending bookings, checking availability for all of them"""
+    return _run_bulk_action('approve', request, current_user)
+
+
+@router.post("/bulk/check-out")
+async def bulk_check_out_bookings(
+    request: BookingBulkAction,
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Hand out many approved bookings, moving their units off the shelf"""
+    return _run_bulk_action('check_out', request, current_user)
+
+
+@router.post("/bulk/check-in")
+async def bulk_check_in_bookings(
+    request: BookingBulkAction,
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Return many active or overdue bookings to stock"""
+    return _run_bulk_action('check_in', request, current_user)
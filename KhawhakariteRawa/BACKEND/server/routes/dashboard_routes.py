@@ -3,10 +3,15 @@
 Dashboard routes for Kaiwhakarite Rawa
 """
 
-from fastapi import APIRouter, Depends
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from ..models import UserResponse
 from ..auth import get_current_active_user
-from ..services.dashboard_service import get_dashboard_statistics
+from ..config import settings
+from ..events import EVENT_TYPES, EventStreamFull, event_bus, format_sse
+from ..services.dashboard_service import get_dashboard_statistics, get_dashboard_counts
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
@@ -16,4 +21,69 @@ async def get_dashboard_stats(
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """Get dashboard statistics"""
-    return get_dashboard_statistics() 
\ No newline at end of file
+    return get_dashboard_statistics()
+
+
+async def _event_stream(request: Request, subscription):
+    """Yield the initial dashboard, then change events as they are published"""
+    try:
+        yield format_sse("dashboard", get_dashboard_statistics())
+        
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=settings.events.HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Comment frame keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            
+            # Drain whatever else is queued so counters are sent once per batch
+            batch = [event]
+            while not subscription.queue.empty():
+                batch.append(subscription.queue.get_nowait())
+            
+            for event in batch:
+                yield format_sse(event['type'], event['data'], event['id'])
+            
+            if any(event['type'] in ('stock', 'booking', 'resync') for event in batch):
+                yield format_sse("counters", get_dashboard_counts())
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+@router.get("/stream")
+async def stream_dashboard_events(
+    request: Request,
+    topics: Optional[str] = Query(None, description="Comma-separated: stock, booking, alert"),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Push dashboard, stock, booking and alert changes as Server-Sent Events"""
+    selected = [topic.strip() for topic in topics.split(',')] if topics else list(EVENT_TYPES)
+    unknown = [topic for topic in selected if topic not in EVENT_TYPES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown topics: {', '.join(unknown)}")
+    
+    try:
+        subscription = event_bus.subscribe(selected)
+    except EventStreamFull as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(settings.events.HEARTBEAT_SECONDS)}
+        )
+    
+    return StreamingResponse(
+        _event_stream(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stream/stats")
+async def get_event_stream_stats(
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Get event stream client counts for this worker"""
+    return event_bus.stats()
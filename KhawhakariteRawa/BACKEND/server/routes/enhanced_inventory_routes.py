@@ -4,20 +4,45 @@ Enhanced inventory routes for Kaiwhakarite Rawa
 Supports comprehensive inventory management features
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+import logging
+from fastapi import APIRouter, HTTPException, Depends, Query, Path, Header, Response
 from typing import Optional, List
 from datetime import date
-from ..auth import get_current_user
+from ..auth import get_current_user, get_current_active_user, require_staff
 from ..models import (
-    InventoryItemCreate, InventoryItemUpdate, InventoryItemResponse,
-    StockMovementCreate, StockMovementResponse, ProductVariantCreate,
+    UserResponse, InventoryItemCreate, InventoryItemUpdate, InventoryItemResponse,
+    StockMovementCreate, StockMovementResponse, StockMovementBatchCreate, ProductVariantCreate,
     ProductVariantResponse, MovementType, ConditionStatus
 )
 from ..services.enhanced_inventory_service import (
     get_inventory_items_enhanced, create_stock_movement_enhanced,
-    get_inventory_summary_enhanced
+    create_stock_movements_batch, get_inventory_summary_enhanced
 )
+from ..services.archive_service import (
+    get_movement_source, archive_stock_movements, get_movement_partitions
+)
+from ..services.inventory_service import (
+    bulk_stock_adjustment as bulk_stock_adjustment_service, publish_stock_levels
+)
+from ..services.valuation_service import (
+    get_inventory_valuation as get_inventory_valuation_service,
+    close_valuation_period, get_valuation_periods
+)
+from ..services.valuation_jobs import valuation_jobs
+from ..services.alert_service import scan_stock_alerts
+from ..services.due_date_scheduler import due_date_scheduler
+from ..services.reservation_service import (
+    reservation_ledger, reconcile_reserved_quantities, is_booking_hold
+)
+from ..services.cost_layer_service import (
+    get_item_cost, get_item_cost_layers, get_cost_layer_valuation, rebuild_cost_layers
+)
+from ..idempotency import run_idempotent, IDEMPOTENCY_HEADER
+from ..events import publish_event
 from ..database import db
+from ..config import settings
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/inventory", tags=["Enhanced Inventory"])
 
@@ -154,20 +179,36 @@ async def create_stock_movement(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/movements/batch")
+async def create_stock_movement_batch(
+    batch: StockMovementBatchCreate,
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Apply many stock movements in one transaction with per-line results"""
+    try:
+        return create_stock_movements_batch(
+            batch.movements, current_user.id, batch.all_or_nothing
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/movements")
 async def get_stock_movements(
     item_id: Optional[int] = Query(None),
     movement_type: Optional[str] = Query(None),
-    days_back: int = Query(90, ge=1, le=365),
+    days_back: int = Query(90, ge=1, le=3650),
     limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(get_current_user)
 ):
     """Get stock movement history with filtering"""
     try:
-        query = """
+        query = f"""
             SELECT sm.*, i.name_en as item_name, u.first_name || ' ' || u.last_name as user_name,
                    fl.name_en as from_location, tl.name_en as to_location
-            FROM stock_movements sm
+            FROM {get_movement_source(days_back)} sm
             JOIN inventory_items i ON sm.item_id = i.id
             JOIN users u ON sm.user_id = u.id
             LEFT JOIN locations fl ON sm.from_location_id = fl.id
@@ -194,6 +235,32 @@ async def get_stock_movements(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/movements/archive")
+async def archive_movements(
+    horizon_days: Optional[int] = Query(None, ge=30, le=3650),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Move stock movements older than the hot horizon into archive partitions"""
+    if current_user.role != 'Admin':
+        raise HTTPException(status_code=403, detail="Only administrators can archive stock movements")
+    
+    try:
+        return archive_stock_movements(horizon_days, current_user.id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/movements/partitions")
+async def get_movements_partitions(
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Get hot table size and archived movement partitions"""
+    try:
+        return get_movement_partitions()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/variants", response_model=ProductVariantResponse)
 async def create_product_variant(
     variant: ProductVariantCreate,
@@ -292,12 +359,150 @@ async def acknowledge_stock_alert(
             SET is_active = 0, acknowledged_by = ?, acknowledged_at = CURRENT_TIMESTAMP
             WHERE id = ?
         """, (current_user['id'], alert_id))
+        publish_event("alert", action="acknowledged", alert_id=alert_id)
         
         return {"message": "Alert acknowledged successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/alerts/scan")
+async def scan_stock_alerts_route(
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Evaluate every stock alert rule across the whole inventory now"""
+    try:
+        if current_user.role not in ['Admin', 'Manager']:
+            raise HTTPException(status_code=403, detail="Only Admin or Manager can run an alert scan")
+        
+        return scan_stock_alerts()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error scanning stock alerts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/due-dates")
+async def get_upcoming_due_dates(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Get the next expiry and maintenance deadlines the scheduler will fire"""
+    return {
+        "due_dates": due_date_scheduler.upcoming(limit),
+        "stats": due_date_scheduler.stats()
+    }
+
+
+@router.get("/items/{item_id}/available-to-promise")
+async def get_available_to_promise(
+    item_id: int,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Get the units of an item free to promise now (quantity less reservations and holds)"""
+    item = db.execute_query(
+        "SELECT id, quantity, reserved_quantity FROM inventory_items WHERE id = ?",
+        (item_id,), fetch_one=True
+    )
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    
+    return {
+        "item_id": item_id,
+        "quantity": item['quantity'],
+        "reserved_quantity": item['reserved_quantity'] or 0,
+        "units_held": reservation_ledger.units_held(item_id),
+        "available_to_promise": reservation_ledger.available_to_promise(item)
+    }
+
+
+@router.post("/items/{item_id}/holds")
+async def create_stock_hold(
+    item_id: int,
+    hold_data: dict,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Hold stock for a pending stock-out; pass the hold_id to stock-out to consume it"""
+    try:
+        quantity = int(hold_data.get('quantity', 0))
+        ttl_seconds = hold_data.get('ttl_seconds')
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail="quantity must be positive")
+        if ttl_seconds is not None and not 0 < int(ttl_seconds) <= settings.reservations.HOLD_TTL_SECONDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"ttl_seconds must be between 1 and {settings.reservations.HOLD_TTL_SECONDS}"
+            )
+        
+        item = db.execute_query(
+            "SELECT id, quantity, reserved_quantity FROM inventory_items WHERE id = ? AND is_active = 1",
+            (item_id,), fetch_one=True
+        )
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        
+        hold = reservation_ledger.try_hold(item, quantity, ttl_seconds=ttl_seconds and int(ttl_seconds),
+                                           user_id=current_user.id)
+        if "error" in hold:
+            raise HTTPException(status_code=409, detail=hold['error'])
+        
+        return hold
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating stock hold: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.delete("/holds/{hold_id}")
+async def release_stock_hold(
+    hold_id: str,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Release a stock hold before it expires"""
+    hold = reservation_ledger.get_hold(hold_id)
+    if not hold:
+        raise HTTPException(status_code=404, detail="Hold not found or already expired")
+    
+    # Booking holds end when the booking is approved or fails to save
+    if is_booking_hold(hold_id):
+        raise HTTPException(status_code=403, detail="Booking holds cannot be released directly")
+    if hold['user_id'] != current_user.id and current_user.role != 'Admin':
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    released = reservation_ledger.release(hold_id)
+    if not released:
+        raise HTTPException(status_code=404, detail="Hold not found or already expired")
+    
+    return {"success": True, "hold_id": hold_id, "item_id": released[0], "quantity": released[1]}
+
+
+@router.get("/reservations")
+async def get_reservation_stats(
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Get the stock reservation ledger's size and flush counters"""
+    return reservation_ledger.stats()
+
+
+@router.post("/reservations/reconcile")
+async def reconcile_reservations(
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Recompute reserved_quantity from approved bookings and live holds"""
+    try:
+        if current_user.role not in ['Admin', 'Manager']:
+            raise HTTPException(status_code=403, detail="Only Admin or Manager can reconcile reservations")
+        
+        return reconcile_reserved_quantities()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error reconciling reservations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/low-stock")
 async def get_low_stock_items(
     current_user: dict = Depends(get_current_user)
@@ -340,63 +545,14 @@ async def bulk_stock_adjustment(
     adjustments: List[dict],
     reason: str,
     notes: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_active_user)
 ):
     """Perform bulk stock adjustments"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions for bulk adjustments")
+    
     try:
-        if current_user['role'] not in ['Admin', 'Manager']:
-            raise HTTPException(status_code=403, detail="Insufficient permissions for bulk adjustments")
-        
-        results = []
-        
-        for adjustment in adjustments:
-            item_id = adjustment.get('item_id')
-            new_quantity = adjustment.get('new_quantity')
-            
-            if not item_id or new_quantity is None:
-                results.append({"item_id": item_id, "error": "Missing item_id or new_quantity"})
-                continue
-            
-            # Get current quantity
-            current = db.execute_query(
-                "SELECT quantity FROM inventory_items WHERE id = ?",
-                (item_id,), fetch_one=True
-            )
-            
-            if not current:
-                results.append({"item_id": item_id, "error": "Item not found"})
-                continue
-            
-            quantity_diff = new_quantity - current['quantity']
-            
-            if quantity_diff != 0:
-                # Create stock movement
-                movement_id = db.create_stock_movement(
-                    item_id=item_id,
-                    movement_type='ADJUSTMENT',
-                    quantity=quantity_diff,
-                    user_id=current_user['id'],
-                    reference_type='bulk_adjustment',
-                    reason=reason,
-                    notes=notes
-                )
-                
-                results.append({
-                    "item_id": item_id, 
-                    "old_quantity": current['quantity'],
-                    "new_quantity": new_quantity,
-                    "adjustment": quantity_diff,
-                    "movement_id": movement_id,
-                    "success": True
-                })
-            else:
-                results.append({
-                    "item_id": item_id,
-                    "message": "No change required",
-                    "success": True
-                })
-        
-        return {"results": results, "total_processed": len(adjustments)}
+        return bulk_stock_adjustment_service(adjustments, reason, notes, current_user.id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -417,103 +573,163 @@ async def get_inventory_summary_enhanced_route(
 async def get_inventory_valuation(
     method: str = Query("AVERAGE", regex="^(FIFO|LIFO|AVERAGE|SPECIFIC)$"),
     as_of_date: Optional[date] = Query(None),
-    current_user: dict = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_active_user)
 ):
     """Get inventory valuation using specified method"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions for valuation reports")
+    
     try:
-        if current_user['role'] not in ['Admin', 'Manager']:
-            raise HTTPException(status_code=403, detail="Insufficient permissions for valuation reports")
-        
-        if not as_of_date:
-            as_of_date = date.today()
-        
-        # Calculate total valuation
-        total_valuation = 0
-        items_processed = 0
-        
-        # Get all active inventory items
-        items = db.execute_query("""
-            SELECT id, name_en, quantity, purchase_cost
-            FROM inventory_items 
-            WHERE is_active = 1 AND quantity > 0
-        """, fetch_all=True)
-        
-        detailed_items = []
-        
-        for item in items:
-            # Get stock movements with costs
-            movements = db.execute_query("""
-                SELECT quantity, unit_cost, created_at
-                FROM stock_movements
-                WHERE item_id = ? AND unit_cost IS NOT NULL 
-                AND movement_type = 'IN' AND date(created_at) <= ?
-                ORDER BY created_at
-            """, (item['id'], as_of_date), fetch_all=True)
-            
-            if not movements:
-                continue
-            
-            current_qty = item['quantity']
-            
-            if method == 'FIFO':
-                # First In, First Out
-                remaining_qty = current_qty
-                total_cost = 0
-                
-                for movement in movements:
-                    if remaining_qty <= 0:
-                        break
-                    
-                    qty_to_use = min(remaining_qty, movement['quantity'])
-                    total_cost += qty_to_use * movement['unit_cost']
-                    remaining_qty -= qty_to_use
-                
-                cost_per_unit = total_cost / current_qty if current_qty > 0 else 0
-            
-            elif method == 'LIFO':
-                # Last In, First Out
-                remaining_qty = current_qty
-                total_cost = 0
-                
-                for movement in reversed(movements):
-                    if remaining_qty <= 0:
-                        break
-                    
-                    qty_to_use = min(remaining_qty, movement['quantity'])
-                    total_cost += qty_to_use * movement['unit_cost']
-                    remaining_qty -= qty_to_use
-                
-                cost_per_unit = total_cost / current_qty if current_qty > 0 else 0
-            
-            else:  # AVERAGE
-                total_cost = sum(m['quantity'] * m['unit_cost'] for m in movements)
-                total_qty = sum(m['quantity'] for m in movements)
-                cost_per_unit = total_cost / total_qty if total_qty > 0 else 0
-            
-            item_total_value = cost_per_unit * current_qty
-            total_valuation += item_total_value
-            items_processed += 1
-            
-            detailed_items.append({
-                "item_id": item['id'],
-                "item_name": item['name_en'],
-                "quantity": current_qty,
-                "cost_per_unit": round(cost_per_unit, 2),
-                "total_value": round(item_total_value, 2)
-            })
+        valuation = get_inventory_valuation_service(method, as_of_date)
+        detailed_items = [
+            {
+                **item,
+                "cost_per_unit": round(item['cost_per_unit'], 2),
+                "total_value": round(item['total_value'], 2)
+            }
+            for item in valuation.pop("items")
+        ]
         
         return {
-            "method": method,
-            "as_of_date": as_of_date,
-            "total_valuation": round(total_valuation, 2),
-            "items_processed": items_processed,
-            "currency": "NZD",
+            **valuation,
+            "total_valuation": round(valuation['total_valuation'], 2),
             "detailed_items": sorted(detailed_items, key=lambda x: x['total_value'], reverse=True)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/valuation/periods")
+async def get_valuation_periods_route(
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Get closed valuation periods"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions for valuation reports")
+    
+    try:
+        return {"periods": get_valuation_periods()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/valuation/periods/{period}/close")
+async def close_valuation_period_route(
+    period: str = Path(..., regex=r"^\d{4}-(0[1-9]|1[0-2])$"),
+    method: str = Query("AVERAGE", regex="^(FIFO|LIFO|AVERAGE|SPECIFIC)$"),
+    replace: bool = Query(False),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Freeze the valuation of a finished month"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions for valuation reports")
+    
+    try:
+        result = close_valuation_period(period, method, current_user.id, replace)
+        if "error" in result:
+            raise HTTPException(status_code=400, detail=result["error"])
+        result.pop("items")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/valuation/jobs")
+async def start_valuation_job(
+    method: str = Query("AVERAGE", regex="^(FIFO|LIFO|AVERAGE|SPECIFIC)$"),
+    as_of_date: Optional[date] = Query(None),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Start a background valuation; returns at once with a job id"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions for valuation reports")
+    
+    try:
+        return valuation_jobs.submit(method, as_of_date, current_user.id).to_dict()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/valuation/jobs/{job_id}")
+async def get_valuation_job(
+    job_id: str,
+    include_items: bool = Query(False),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Get a valuation job's progress, and its result once complete"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions for valuation reports")
+    
+    job = valuation_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Valuation job not found")
+    return job.to_dict(include_items)
+
+
+@router.delete("/valuation/jobs/{job_id}")
+async def cancel_valuation_job(
+    job_id: str,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Cancel a queued or running valuation job"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions for valuation reports")
+    
+    job = valuation_jobs.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Valuation job not found")
+    return job.to_dict()
+
+
+@router.get("/valuation/layers")
+async def get_inventory_valuation_from_layers(
+    method: str = Query("AVERAGE", regex="^(FIFO|LIFO|AVERAGE|SPECIFIC)$"),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Get current inventory valuation from the incremental cost layers"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions for valuation reports")
+    
+    try:
+        valuation = get_cost_layer_valuation(method)
+        valuation['total_valuation'] = round(valuation['total_valuation'], 2)
+        return valuation
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/items/{item_id}/cost-layers")
+async def get_item_cost_layers_route(
+    item_id: int,
+    method: str = Query("AVERAGE", regex="^(FIFO|LIFO|AVERAGE|SPECIFIC)$"),
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Get an item's current cost and its open receipt layers"""
+    try:
+        return {
+            "cost": get_item_cost(item_id, method),
+            "layers": get_item_cost_layers(item_id)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/cost-layers/rebuild")
+async def rebuild_cost_layers_route(
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Rebuild every item's cost layers from movement history"""
+    if current_user.role != 'Admin':
+        raise HTTPException(status_code=403, detail="Only administrators can rebuild cost layers")
+    
+    try:
+        return rebuild_cost_layers(current_user.id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/barcode/{barcode}")
 async def get_item_by_barcode(
     barcode: str,
@@ -540,52 +756,126 @@ async def get_item_by_barcode(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _apply_stock_in(item_id: int, stock_data: dict, user_id: int):
+    """Add stock to an item and record the IN movement in one transaction"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Get current item
+        cursor.execute("SELECT * FROM inventory_items WHERE id = ?", (item_id,))
+        item = cursor.fetchone()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        
+        # Update quantity
+        new_quantity = item['quantity'] + stock_data.get('quantity', 0)
+        cursor.execute(
+            "UPDATE inventory_items SET quantity = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (new_quantity, item_id)
+        )
+        
+        # Record stock movement
+        cursor.execute("""
+            INSERT INTO stock_movements (
+                item_id, movement_type, quantity, to_location_id,
+                unit_cost, total_cost, user_id, reason, notes
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            item_id, 'IN', stock_data.get('quantity', 0), item['location_id'],
+            stock_data.get('unit_cost', 0), 
+            stock_data.get('unit_cost', 0) * stock_data.get('quantity', 0),
+            user_id, stock_data.get('reason', 'Stock In'), 
+            stock_data.get('notes', '')
+        ))
+        
+        conn.commit()
+        
+        publish_stock_levels([item_id], "stock_in")
+        return {
+            "success": True,
+            "message": "Stock added successfully",
+            "new_quantity": new_quantity
+        }
+
+
+def _apply_stock_out(item_id: int, stock_data: dict, user_id: int):
+    """Remove stock from an item and record the OUT movement in one transaction"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Get current item
+        cursor.execute("SELECT * FROM inventory_items WHERE id = ?", (item_id,))
+        item = cursor.fetchone()
+        if not item:
+            raise HTTPException(status_code=404, detail="Item not found")
+        
+        # Check if enough stock is free to promise; a hold taken for this
+        # stock-out counts towards it
+        current_quantity = item['quantity']
+        quantity_to_remove = stock_data.get('quantity', 0)
+        hold_id = stock_data.get('hold_id')
+        if hold_id:
+            hold = reservation_ledger.get_hold(hold_id)
+            if is_booking_hold(hold_id) or (hold and (hold['item_id'] != item_id or
+                                                      hold['user_id'] != user_id)):
+                raise HTTPException(status_code=403, detail="Hold does not belong to this stock-out")
+        available = reservation_ledger.available_to_promise(dict(item), exclude_hold_id=hold_id,
+                                                            user_id=user_id)
+        
+        if quantity_to_remove > available:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Insufficient stock. Available: {available}, Requested: {quantity_to_remove}"
+            )
+        
+        # Update quantity
+        new_quantity = current_quantity - quantity_to_remove
+        cursor.execute(
+            "UPDATE inventory_items SET quantity = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (new_quantity, item_id)
+        )
+        
+        # Record stock movement
+        cursor.execute("""
+            INSERT INTO stock_movements (
+                item_id, movement_type, quantity, from_location_id,
+                user_id, reason, notes
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            item_id, 'OUT', quantity_to_remove, item['location_id'],
+            user_id, stock_data.get('reason', 'Stock Out'), 
+            stock_data.get('notes', '')
+        ))
+        
+        conn.commit()
+        
+        if hold_id:
+            reservation_ledger.consume(hold_id, item_id, quantity_to_remove, user_id)
+        publish_stock_levels([item_id], "stock_out")
+        return {
+            "success": True,
+            "message": "Stock removed successfully",
+            "new_quantity": new_quantity
+        }
+
+
 @router.post("/items/{item_id}/stock-in")
 async def stock_in(
     item_id: int,
     stock_data: dict,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+    current_user: UserResponse = Depends(get_current_active_user)
 ):
-    """Add stock to an inventory item"""
+    """Add stock to an inventory item (retry-safe with an Idempotency-Key header)"""
     try:
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Get current item
-            cursor.execute("SELECT * FROM inventory_items WHERE id = ?", (item_id,))
-            item = cursor.fetchone()
-            if not item:
-                raise HTTPException(status_code=404, detail="Item not found")
-            
-            # Update quantity
-            new_quantity = item[9] + stock_data.get('quantity', 0)  # quantity is at index 9
-            cursor.execute(
-                "UPDATE inventory_items SET quantity = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (new_quantity, item_id)
-            )
-            
-            # Record stock movement
-            cursor.execute("""
-                INSERT INTO stock_movements (
-                    item_id, movement_type, quantity, to_location_id,
-                    unit_cost, total_cost, user_id, reason, notes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                item_id, 'IN', stock_data.get('quantity', 0), item[14],  # location_id at index 14
-                stock_data.get('unit_cost', 0), 
-                stock_data.get('unit_cost', 0) * stock_data.get('quantity', 0),
-                current_user['id'], stock_data.get('reason', 'Stock In'), 
-                stock_data.get('notes', '')
-            ))
-            
-            conn.commit()
-            
-            return {
-                "success": True,
-                "message": "Stock added successfully",
-                "new_quantity": new_quantity
-            }
-            
+        return run_idempotent(
+            idempotency_key, current_user.id, f"stock-in:{item_id}", stock_data,
+            lambda: _apply_stock_in(item_id, stock_data, current_user.id),
+            response
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in stock in: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -595,56 +885,19 @@ async def stock_in(
 async def stock_out(
     item_id: int,
     stock_data: dict,
-    current_user: dict = Depends(get_current_user)
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+    current_user: UserResponse = Depends(get_current_active_user)
 ):
-    """Remove stock from an inventory item"""
+    """Remove stock from an inventory item (retry-safe with an Idempotency-Key header)"""
     try:
-        with db.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Get current item
-            cursor.execute("SELECT * FROM inventory_items WHERE id = ?", (item_id,))
-            item = cursor.fetchone()
-            if not item:
-                raise HTTPException(status_code=404, detail="Item not found")
-            
-            # Check if enough stock available
-            current_quantity = item[9]  # quantity is at index 9
-            quantity_to_remove = stock_data.get('quantity', 0)
-            
-            if quantity_to_remove > current_quantity:
-                raise HTTPException(
-                    status_code=400, 
-                    detail=f"Insufficient stock. Available: {current_quantity}, Requested: {quantity_to_remove}"
-                )
-            
-            # Update quantity
-            new_quantity = current_quantity - quantity_to_remove
-            cursor.execute(
-                "UPDATE inventory_items SET quantity = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (new_quantity, item_id)
-            )
-            
-            # Record stock movement
-            cursor.execute("""
-                INSERT INTO stock_movements (
-                    item_id, movement_type, quantity, from_location_id,
-                    user_id, reason, notes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                item_id, 'OUT', quantity_to_remove, item[14],  # location_id at index 14
-                current_user['id'], stock_data.get('reason', 'Stock Out'), 
-                stock_data.get('notes', '')
-            ))
-            
-            conn.commit()
-            
-            return {
-                "success": True,
-                "message": "Stock removed successfully",
-                "new_quantity": new_quantity
-            }
-            
+        return run_idempotent(
+            idempotency_key, current_user.id, f"stock-out:{item_id}", stock_data,
+            lambda: _apply_stock_out(item_id, stock_data, current_user.id),
+            response
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in stock out: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Stock transfer routes for Kaiwhakarite Rawa
+Handles transfer documents moving stock between locations
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from ..auth import get_current_active_user, require_staff
+from ..models import UserResponse, StockTransferCreate, TransferStatus
+from ..services.transfer_service import (
+    create_transfer, approve_transfer, dispatch_transfer, receive_transfer,
+    cancel_transfer, get_transfers, get_transfer_by_id
+)
+
+router = APIRouter(prefix="/api/transfers", tags=["Stock Transfers"])
+
+
+def _require_manager(current_user: UserResponse):
+    """Only administrators and managers may approve or cancel transfers"""
+    if current_user.role not in ['Admin', 'Manager']:
+        raise HTTPException(status_code=403, detail="Insufficient permissions to approve transfers")
+
+
+def _transfer_result(result):
+    """Turn a service result into a response or an HTTP error"""
+    if result is None:
+        raise HTTPException(status_code=404, detail="Transfer not found")
+    if "error" in result:
+        detail = result if "lines" in result else result["error"]
+        raise HTTPException(status_code=400, detail=detail)
+    return result
+
+
+@router.post("", response_model=dict)
+async def create_transfer_route(
+    transfer_data: StockTransferCreate,
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Request a transfer of one or more items between locations"""
+    try:
+        return _transfer_result(create_transfer(transfer_data, current_user.id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("", response_model=dict)
+async def get_transfers_route(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Optional[TransferStatus] = Query(None),
+    location_id: Optional[int] = Query(None),
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Get transfer documents with filtering"""
+    try:
+        return get_transfers(skip, limit, status.value if status else None, location_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{transfer_id}", response_model=dict)
+async def get_transfer_route(
+    transfer_id: int,
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Get a transfer document with its lines"""
+    try:
+        return _transfer_result(get_transfer_by_id(transfer_id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{transfer_id}/approve", response_model=dict)
+async def approve_transfer_route(
+    transfer_id: int,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Approve a pending transfer"""
+    _require_manager(current_user)
+    
+    try:
+        return _transfer_result(approve_transfer(transfer_id, current_user.id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{transfer_id}/dispatch", response_model=dict)
+async def dispatch_transfer_route(
+    transfer_id: int,
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Dispatch an approved transfer from its source location"""
+    try:
+        return _transfer_result(dispatch_transfer(transfer_id, current_user.id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{transfer_id}/receive", response_model=dict)
+async def receive_transfer_route(
+    transfer_id: int,
+    current_user: UserResponse = Depends(require_staff)
+):
+    """Receive an in-transit transfer at its destination"""
+    try:
+        return _transfer_result(receive_transfer(transfer_id, current_user.id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{transfer_id}/cancel", response_model=dict)
+async def cancel_transfer_route(
+    transfer_id: int,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """Cancel a transfer that has not been dispatched"""
+    _require_manager(current_user)
+    
+    try:
+        return _transfer_result(cancel_transfer(transfer_id, current_user.id))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
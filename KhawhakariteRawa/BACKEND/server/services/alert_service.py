@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Stock alert service for Kaiwhakarite Rawa
+Evaluates the stock alert rules with set-based SQL, either for the items a
+write touched or for the whole inventory on a schedule
+"""
+
+import json
+import time
+import asyncio
+import logging
+from typing import Optional, List, Dict
+from ..database import db
+from ..config import settings
+from ..events import publish_event
+
+logger = logging.getLogger(__name__)
+
+
+# Each rule is (alert_type, threshold_value, current_value, message, condition);
+# {expiry_days} is the configured expiry warning window
+STOCK_ALERT_RULES = [
+    ("OUT_OF_STOCK", "0", "i.quantity",
+     "'Item ''' || i.name_en || ''' is out of stock'",
+     "i.reorder_level > 0 AND i.quantity = 0"),
+    ("LOW_STOCK", "i.reorder_level", "i.quantity",
+     "'Item ''' || i.name_en || ''' is below reorder level (' || i.quantity || ' <= ' || i.reorder_level || ')'",
+     "i.reorder_level > 0 AND i.quantity > 0 AND i.quantity <= i.reorder_level"),
+    ("OVERSTOCK", "i.max_stock_level", "i.quantity",
+     "'Item ''' || i.name_en || ''' exceeds maximum stock level (' || i.quantity || ' > ' || i.max_stock_level || ')'",
+     "i.max_stock_level > 0 AND i.quantity > i.max_stock_level"),
+    ("EXPIRY_WARNING", "{expiry_days}", "julianday(i.expiry_date) - julianday('now')",
+     "'Item ''' || i.name_en || ''' expires in ' || CAST(julianday(i.expiry_date) - julianday('now') AS INTEGER) || ' days'",
+     "i.expiry_date IS NOT NULL AND julianday(i.expiry_date) - julianday('now') <= {expiry_days}"),
+]
+
+
+def _build_alert_insert(scoped: bool) -> str:
+    """One INSERT OR IGNORE covering every rule, optionally scoped to an id list"""
+    expiry_days = int(settings.alerts.EXPIRY_WARNING_DAYS)
+    scope = "AND i.id IN (SELECT value FROM json_each(?))" if scoped else ""
+
+    selects = [
+        f"""SELECT i.id, '{alert_type}', {threshold}, {current}, {message}, 1
+            FROM inventory_items i
+            WHERE i.is_active = 1 {scope} AND {condition}"""
+        for alert_type, threshold, current, message, condition in STOCK_ALERT_RULES
+    ]
+
+    # The partial unique index on active (item_id, alert_type) pairs makes
+    # rows for already-alerted items no-ops
+    return f"""
+        INSERT OR IGNORE INTO stock_alerts
+        (item_id, alert_type, threshold_value, current_value, message, is_active)
+        {' UNION ALL '.join(selects)}
+        RETURNING id, item_id, alert_type, message
+    """.format(expiry_days=expiry_days)
+
+
+def evaluate_stock_alerts(cursor, item_ids: Optional[List[int]] = None) -> List[Dict]:
+    """Raise alerts for the given items (or every item) and return the new alerts"""
+    if item_ids is None:
+        cursor.execute(_build_alert_insert(scoped=False))
+    elif not item_ids:
+        return []
+    else:
+        # The id list travels as one JSON parameter so large batches stay
+        # within SQLite's bound-variable limit
+        ids_param = json.dumps(sorted(set(item_ids)))
+        cursor.execute(_build_alert_insert(scoped=True), (ids_param,) * len(STOCK_ALERT_RULES))
+
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def publish_alerts(alerts: List[Dict]):
+    """Publish newly raised alerts to the event bus"""
+    for alert in alerts:
+        publish_event("alert", action="created", alert_id=alert['id'], item_id=alert['item_id'],
+                      alert_type=alert['alert_type'], message=alert['message'])
+
+
+def scan_stock_alerts():
+    """Evaluate every alert rule across the whole inventory"""
+    started = time.perf_counter()
+
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        alerts = evaluate_stock_alerts(cursor)
+        conn.commit()
+
+    publish_alerts(alerts)
+
+    by_type: Dict[str, int] = {}
+    for alert in alerts:
+        by_type[alert['alert_type']] = by_type.get(alert['alert_type'], 0) + 1
+
+    return {
+        "alerts_created": len(alerts),
+        "by_type": by_type,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+async def run_alert_scanner():
+    """Background task: rescan all items every ALERT_SCAN_INTERVAL_SECONDS"""
+    interval = settings.alerts.SCAN_INTERVAL_SECONDS
+
+    while True:
+        try:
+            result = await asyncio.to_thread(scan_stock_alerts)
+            if result['alerts_created']:
+                logger.info(f"Alert scan raised {result['alerts_created']} alerts")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Alert scan failed: {e}")
+
+        await asyncio.sleep(interval)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Stock movement archive service for Kaiwhakarite Rawa
+Moves cold stock_movements rows into month-partitioned archive tables
+"""
+
+from datetime import date, timedelta
+from typing import Optional
+from ..database import db
+from ..config import settings
+
+
+# Column order shared by the hot table, every partition and the history view
+MOVEMENT_COLUMNS = [
+    'id', 'item_id', 'movement_type', 'quantity', 'from_location_id',
+    'to_location_id', 'reference_id', 'reference_type', 'unit_cost',
+    'total_cost', 'user_id', 'reason', 'notes', 'movement_date', 'created_at'
+]
+
+
+def get_archive_cutoff(horizon_days: Optional[int] = None) -> date:
+    """Get the first date that stays in the hot table"""
+    if horizon_days is None:
+        horizon_days = settings.archive.HOT_MOVEMENT_DAYS
+    return date.today() - timedelta(days=horizon_days)
+
+
+def get_movement_source(days_back: int) -> str:
+    """Get the relation that covers movements from the last days_back days"""
+    # The hot table is enough only if nothing in the window has been
+    # archived, whatever horizon the last archive run used
+    archived = db.execute_query(
+        "SELECT MAX(last_movement_at) as last_archived FROM stock_movement_partitions",
+        fetch_one=True
+    )
+    last_archived = archived['last_archived'] if archived else None
+    window_start = (date.today() - timedelta(days=days_back)).isoformat()
+
+    if last_archived is None or str(last_archived) < window_start:
+        return "stock_movements"
+    return settings.archive.HISTORY_VIEW
+
+
+def _partition_table_name(period: str) -> str:
+    """Map a YYYY-MM period to its archive table name"""
+    return settings.archive.PARTITION_PREFIX + period.replace('-', '_')
+
+
+def _next_period_start(period: str) -> str:
+    """Get the first day of the month after a YYYY-MM period"""
+    year, month = (int(part) for part in period.split('-'))
+    if month == 12:
+        return f"{year + 1}-01-01"
+    return f"{year}-{month + 1:02d}-01"
+
+
+def _ensure_partition(cursor, table_name: str):
+    """Create an archive partition with the same columns as stock_movements"""
+    columns = ", ".join(MOVEMENT_COLUMNS)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name} AS
+        SELECT {columns} FROM stock_movements WHERE 0
+    """)
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_{table_name}_item
+        ON {table_name}(item_id, created_at)
+    """)
+
+
+def _rebuild_history_view(cursor):
+    """Recreate the union view over the hot table and every partition"""
+    cursor.execute("SELECT table_name FROM stock_movement_partitions ORDER BY period")
+    partitions = [row[0] for row in cursor.fetchall()]
+
+    columns = ", ".join(MOVEMENT_COLUMNS)
+    selects = [f"SELECT {columns} FROM stock_movements"]
+    selects.extend(f"SELECT {columns} FROM {table}" for table in partitions)
+
+    view_name = settings.archive.HISTORY_VIEW
+    cursor.execute(f"DROP VIEW IF EXISTS {view_name}")
+    cursor.execute(
+        f"CREATE VIEW {view_name} AS " + " UNION ALL ".join(selects)
+    )
+
+
+def archive_stock_movements(horizon_days: Optional[int] = None, user_id: Optional[int] = None):
+    """Move movements older than the horizon into monthly archive partitions"""
+    cutoff = get_archive_cutoff(horizon_days).isoformat()
+
+    periods = db.execute_query("""
+        SELECT strftime('%Y-%m', created_at) as period, COUNT(*) as count
+        FROM stock_movements
+        WHERE created_at < ?
+        GROUP BY period
+        ORDER BY period
+    """, (cutoff,), fetch_all=True)
+
+    archived = []
+
+    # One transaction per month keeps each write lock short
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+
+        for row in periods:
+            period = row['period']
+            table_name = _partition_table_name(period)
+            period_start = f"{period}-01"
+            period_end = min(cutoff, _next_period_start(period))
+
+            _ensure_partition(cursor, table_name)
+
+            columns = ", ".join(MOVEMENT_COLUMNS)
+            cursor.execute(f"""
+                INSERT INTO {table_name} ({columns})
+                SELECT {columns} FROM stock_movements
+                WHERE created_at >= ? AND created_at < ?
+            """, (period_start, period_end))
+            moved = cursor.rowcount
+
+            cursor.execute("""
+                DELETE FROM stock_movements
+                WHERE created_at >= ? AND created_at < ?
+            """, (period_start, period_end))
+
+            cursor.execute(f"""
+                INSERT INTO stock_movement_partitions
+                    (period, table_name, row_count, first_movement_at, last_movement_at)
+                SELECT ?, ?, COUNT(*), MIN(created_at), MAX(created_at)
+                FROM {table_name} WHERE 1
+                ON CONFLICT(period) DO UPDATE SET
+                    row_count = excluded.row_count,
+                    first_movement_at = excluded.first_movement_at,
+                    last_movement_at = excluded.last_movement_at,
+                    archived_at = CURRENT_TIMESTAMP
+            """, (period, table_name))
+
+            _rebuild_history_view(cursor)
+            conn.commit()
+
+            archived.append({"period": period, "table_name": table_name, "rows_moved": moved})
+
+        if archived:
+            # Refresh planner statistics for the now much smaller hot table
+            cursor.execute("ANALYZE stock_movements")
+            conn.commit()
+
+    total_moved = sum(p['rows_moved'] for p in archived)
+
+    if archived:
+        db.log_audit(user_id, "ARCHIVE", "stock_movements", None, {}, {
+            "cutoff": cutoff,
+            "partitions": len(archived),
+            "rows_moved": total_moved
+        })
+
+    return {
+        "cutoff": cutoff,
+        "partitions": archived,
+        "rows_moved": total_moved
+    }
+
+
+def get_movement_partitions():
+    """Get archived partitions along with hot table size"""
+    partitions = db.execute_query("""
+        SELECT * FROM stock_movement_partitions ORDER BY period DESC
+    """, fetch_all=True)
+
+    hot = db.execute_query("""
+        SELECT COUNT(*) as count, MIN(created_at) as oldest
+        FROM stock_movements
+    """, fetch_one=True)
+
+    return {
+        "hot_rows": hot['count'],
+        "hot_oldest_movement": hot['oldest'],
+        "hot_movement_days": settings.archive.HOT_MOVEMENT_DAYS,
+        "archived_rows": sum(p['row_count'] for p in partitions),
+        "partitions": partitions
+    }
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Booking availability engine for Kaiwhakarite Rawa
+Keeps a per-item interval index of the bookings that hold units so
+"how many units are free between these dates" is a logarithmic lookup
+"""
+
+import json
+import threading
+from datetime import date
+from typing import Optional, Dict, List, Tuple
+from ..database import db
+from ..models import BookingStatus
+
+
+# Bookings in these states hold their units for start_date..end_date
+HOLDING_STATUSES = (
+    BookingStatus.APPROVED.value,
+    BookingStatus.ACTIVE.value,
+)
+
+# Checked-out units have left inventory_items.quantity. Active loans are
+# expected back, so they count towards capacity and hold their own dates;
+# overdue loans are not, so they are simply missing from the shelf.
+CHECKED_OUT_STATUS = BookingStatus.ACTIVE.value
+
+# Day ordinals index the trees; 2**20 days reaches past the year 2800
+_DAY_SPAN = 1 << 20
+
+
+def bookings_version(cursor) -> Optional[int]:
+    """Read the bookings change counter inside the caller's transaction"""
+    row = cursor.execute(
+        "SELECT version FROM table_versions WHERE table_name = 'bookings'"
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _parse_date(value) -> date:
+    """Read a DATE column value as a date"""
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class _MaxSegmentTree:
+    """Sparse segment tree over day ordinals with range add and range max"""
+    __slots__ = ("_max", "_tag")
+
+    def __init__(self):
+        # Missing nodes are 0. _tag is an add applied to a whole node's range
+        # and is never pushed down; _max includes the node's own tag.
+        self._max: Dict[int, int] = {}
+        self._tag: Dict[int, int] = {}
+
+    def add(self, lo: int, hi: int, delta: int, node: int = 1,
+            node_lo: int = 0, node_hi: int = _DAY_SPAN - 1):
+        """Add delta to every day in [lo, hi]"""
+        if hi < node_lo or node_hi < lo:
+            return
+        if lo <= node_lo and node_hi <= hi:
+            self._tag[node] = self._tag.get(node, 0) + delta
+            self._max[node] = self._max.get(node, 0) + delta
+            return
+
+        mid = (node_lo + node_hi) // 2
+        self.add(lo, hi, delta, node * 2, node_lo, mid)
+        self.add(lo, hi, delta, node * 2 + 1, mid + 1, node_hi)
+        self._max[node] = self._tag.get(node, 0) + max(
+            self._max.get(node * 2, 0), self._max.get(node * 2 + 1, 0)
+        )
+
+    def max(self, lo: int, hi: int, node: int = 1,
+            node_lo: int = 0, node_hi: int = _DAY_SPAN - 1) -> int:
+        """Largest total on any day in [lo, hi]"""
+        if hi < node_lo or node_hi < lo or node not in self._max:
+            return 0
+        if lo <= node_lo and node_hi <= hi:
+            return self._max[node]
+
+        mid = (node_lo + node_hi) // 2
+        return self._tag.get(node, 0) + max(
+            self.max(lo, hi, node * 2, node_lo, mid),
+            self.max(lo, hi, node * 2 + 1, mid + 1, node_hi)
+        )
+
+
+class AvailabilityEngine:
+    """Interval index of holding bookings, rebuilt from the bookings table"""
+
+    def __init__(self):
+        self._trees: Dict[int, _MaxSegmentTree] = {}
+        # booking_id -> (item_id, first_day, last_day, quantity)
+        self._holds: Dict[int, Tuple[int, int, int, int]] = {}
+        # booking_id -> (item_id, quantity) for loans currently checked out
+        self._checked_out: Dict[int, Tuple[int, int]] = {}
+        self._out_by_item: Dict[int, int] = {}
+        self._version: Optional[int] = None
+        self._lock = threading.RLock()
+
+    def _add_hold(self, booking: dict):
+        booking_id, item_id = booking['id'], booking['item_id']
+        quantity = booking['quantity_requested'] or 1
+
+        if booking['status'] == CHECKED_OUT_STATUS:
+            self._checked_out[booking_id] = (item_id, quantity)
+            self._out_by_item[item_id] = self._out_by_item.get(item_id, 0) + quantity
+
+        lo = _parse_date(booking['start_date']).toordinal()
+        hi = _parse_date(booking['end_date']).toordinal()
+        if hi < lo:
+            return
+        self._trees.setdefault(item_id, _MaxSegmentTree()).add(lo, hi, quantity)
+        self._holds[booking_id] = (item_id, lo, hi, quantity)
+
+    def _remove_hold(self, booking_id: int):
+        hold = self._holds.pop(booking_id, None)
+        if hold:
+            item_id, lo, hi, quantity = hold
+            self._trees[item_id].add(lo, hi, -quantity)
+
+        out = self._checked_out.pop(booking_id, None)
+        if out:
+            self._out_by_item[out[0]] -= out[1]
+
+    def load(self):
+        """Rebuild the index from bookings that hold units today or later"""
+        with self._lock:
+            version = db.get_table_versions('bookings').get('bookings')
+            # Checked-out loans are read whatever their end date, since
+            # their units are off the shelf until checked in
+            rows = db.execute_query("""
+                SELECT id, item_id, start_date, end_date, quantity_requested, status
+                FROM bookings
+                WHERE (status = ? AND end_date >= date('now')) OR status = ?
+            """, (BookingStatus.APPROVED.value, CHECKED_OUT_STATUS), fetch_all=True)
+
+            self._trees = {}
+            self._holds = {}
+            self._checked_out = {}
+            self._out_by_item = {}
+            for row in rows:
+                self._add_hold(row)
+            self._version = version
+
+        return {"holds": len(rows), "items": len(self._trees)}
+
+    def ensure_current(self, version: Optional[int] = None):
+        """Reload if bookings changed outside this process since the last load
+
+        Callers inside a write transaction pass the version they read there.
+        """
+        if version is None:
+            version = db.get_table_versions('bookings').get('bookings')
+        with self._lock:
+            if version != self._version:
+                self.load()
+
+    def sync_bookings(self, booking_ids: List[int], versions: Optional[Tuple[int, int]] = None):
+        """Apply bookings' current status and dates to the index after a write
+
+        versions is the bookings version at the start and end of the writer's
+        transaction. If the index was current at the start it is current at
+        the end, so this process's own writes don't force a reload.
+        """
+        if not booking_ids:
+            return
+
+        bookings = db.execute_query("""
+            SELECT id, item_id, start_date, end_date, quantity_requested, status
+            FROM bookings
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(list(booking_ids)),), fetch_all=True)
+
+        with self._lock:
+            for booking_id in booking_ids:
+                self._remove_hold(booking_id)
+            for booking in bookings:
+                if booking['status'] in HOLDING_STATUSES:
+                    self._add_hold(booking)
+            if versions and versions[0] == self._version:
+                self._version = versions[1]
+
+    def sync_booking(self, booking_id: int, versions: Optional[Tuple[int, int]] = None):
+        """Apply one booking's current status and dates to the index after a write"""
+        self.sync_bookings([booking_id], versions)
+
+    def try_hold(self, booking: dict, quantity_on_hand: int) -> int:
+        """Tentatively hold a booking's units if they are free; returns units available
+
+        The hold is placed before the booking is written, so a batch cannot
+        overbook against itself. sync_bookings() afterwards settles it either way.
+        """
+        with self._lock:
+            available = self.units_available(
+                booking['item_id'], quantity_on_hand, booking['start_date'], booking['end_date'],
+                exclude_booking_id=booking['id']
+            )
+            if available >= (booking['quantity_requested'] or 1):
+                self._remove_hold(booking['id'])
+                self._add_hold({**booking, "status": BookingStatus.APPROVED.value})
+            return available
+
+    def units_booked(self, item_id: int, start_date: date, end_date: date,
+                     exclude_booking_id: Optional[int] = None) -> int:
+        """Most units of an item held on any single day between the dates"""
+        with self._lock:
+            tree = self._trees.get(item_id)
+            if tree is None:
+                return 0
+
+            lo, hi = _parse_date(start_date).toordinal(), _parse_date(end_date).toordinal()
+            booked = tree.max(lo, hi)
+
+            # Re-validating an existing booking must not count its own hold
+            hold = self._holds.get(exclude_booking_id)
+            if hold:
+                tree.add(hold[1], hold[2], -hold[3])
+                booked = tree.max(lo, hi)
+                tree.add(hold[1], hold[2], hold[3])
+            return booked
+
+    def units_available(self, item_id: int, quantity: int, start_date: date, end_date: date,
+                        exclude_booking_id: Optional[int] = None) -> int:
+        """Units of an item free on every day between the dates, given its on-hand quantity"""
+        with self._lock:
+            capacity = quantity + self._out_by_item.get(item_id, 0)
+            booked = self.units_booked(item_id, start_date, end_date, exclude_booking_id)
+        return max(capacity - booked, 0)
+
+    def checked_out(self, item_id: int) -> int:
+        """Units of an item currently out on active loans"""
+        with self._lock:
+            return self._out_by_item.get(item_id, 0)
+
+    def stats(self) -> dict:
+        """Get index size for monitoring"""
+        with self._lock:
+            return {
+                "holds": len(self._holds),
+                "checked_out": len(self._checked_out),
+                "items": len(self._trees),
+                "version": self._version
+            }
+
+
+# Global availability engine instance
+availability_engine = AvailabilityEngine()
+
+
+def search_available_items(start_date: date, end_date: date, category_id: Optional[int] = None,
+                           location_id: Optional[int] = None, min_quantity: int = 1,
+                           skip: int = 0, limit: int = 100):
+    """Find every loanable item with at least min_quantity units free across the dates"""
+    if end_date < start_date:
+        return {"error": "end_date must be on or after start_date"}
+    
+    # One pass over the loanable items; booking overlap comes from the index
+    query = """
+        SELECT i.id, i.name_en, i.name_mi, i.sku, i.quantity, i.unit,
+               i.category_id, c.name_en as category_name,
+               i.location_id, l.name_en as location_name
+        FROM inventory_items i
+        LEFT JOIN categories c ON i.category_id = c.id
+        LEFT JOIN locations l ON i.location_id = l.id
+        WHERE i.is_active = 1 AND i.is_loanable = 1
+    """
+    params = []
+    
+    if category_id:
+        query += " AND i.category_id = ?"
+        params.append(category_id)
+    
+    if location_id:
+        query += " AND i.location_id = ?"
+        params.append(location_id)
+    
+    query += " ORDER BY i.name_en, i.id"
+    items = db.execute_query(query, tuple(params), fetch_all=True)
+    
+    availability_engine.ensure_current()
+    available_items = []
+    for item in items:
+        booked = availability_engine.units_booked(item['id'], start_date, end_date)
+        available = availability_engine.units_available(item['id'], item['quantity'], start_date, end_date)
+        if available >= min_quantity:
+            available_items.append({**item, "booked_quantity": booked, "available_quantity": available})
+    
+    return {
+        "items": available_items[skip:skip + limit],
+        "total": len(available_items),
+        "skip": skip,
+        "limit": limit,
+        "start_date": start_date,
+        "end_date": end_date
+    }
@@ -3,83 +3,188 @@
 Booking service for Kaiwhakarite Rawa
 """
 
+import json
+import time
+import base64
+import asyncio
+import logging
 from datetime import date
+from typing import Optional, List
 from fastapi import HTTPException
 from ..database import db
+from ..config import settings
+from ..events import publish_event
 from ..models import BookingCreate, UserResponse
+from .availability_service import availability_engine, bookings_version
+from .reservation_service import reservation_ledger, booking_hold_id
+from .inventory_service import create_stock_alerts_bulk, publish_stock_levels
+from .alert_service import publish_alerts
 
+logger = logging.getLogger(__name__)
 
-def get_user_bookings(current_user: UserResponse):
-    """Get bookings based on user role"""
-    if current_user.role in ['Admin', 'Manager', 'Kaimahi']:
-        # Staff can see all bookings
-        bookings = db.execute_query(
-            """SELECT b.*, i.name_en as item_name, u.first_name, u.last_name,
-                    approver.first_name as approver_first_name,
-                    approver.last_name as approver_last_name
-            FROM bookings b
-            JOIN inventory_items i ON b.item_id = i.id
-            JOIN users u ON b.user_id = u.id
-            LEFT JOIN users approver ON b.approved_by = approver.id
-            ORDER BY b.created_at DESC""",
-            fetch_all=True
-        )
-    else:
-        # Regular users can only see their own bookings
-        bookings = db.execute_query(
-            """SELECT b.*, i.name_en as item_name, u.first_name, u.last_name,
-                    approver.first_name as approver_first_name,
-                    approver.last_name as approver_last_name
-            FROM bookings b
-            JOIN inventory_items i ON b.item_id = i.id
-            JOIN users u ON b.user_id = u.id
-            LEFT JOIN users approver ON b.approved_by = approver.id
-            WHERE b.user_id = ?
-            ORDER BY b.created_at DESC""",
-            (current_user.id,),
-            fetch_all=True
-        )
+
+# Statuses whose items are out, or due out, today
+ACTIVE_NOW_STATUSES = ('Approved', 'Active', 'Overdue')
+
+
+def encode_booking_cursor(booking: dict) -> str:
+    """Opaque keyset cursor for the (created_at, id) listing order"""
+    raw = json.dumps([booking['created_at'], booking['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_booking_cursor(cursor: str):
+    """Inverse of encode_booking_cursor; raises ValueError for bad input"""
+    try:
+        created_at, booking_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(booking_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def get_user_bookings(current_user: UserResponse, status: Optional[str] = None,
+                      item_id: Optional[int] = None, whanau_group: Optional[str] = None,
+                      from_date: Optional[date] = None, to_date: Optional[date] = None,
+                      active_now: bool = False, cursor: Optional[str] = None, limit: int = 50):
+    """Get one page of bookings based on user role, newest first"""
+    query = """SELECT b.*, i.name_en as item_name, u.first_name, u.last_name,
+                approver.first_name as approver_first_name,
+                approver.last_name as approver_last_name
+        FROM bookings b
+        JOIN inventory_items i ON b.item_id = i.id
+        JOIN users u ON b.user_id = u.id
+        LEFT JOIN users approver ON b.approved_by = approver.id
+        WHERE 1 = 1"""
+    params = []
+    
+    # Regular users can only see their own bookings (user_id, created_at index)
+    if current_user.role not in ['Admin', 'Manager', 'Kaimahi']:
+        query += " AND b.user_id = ?"
+        params.append(current_user.id)
+    
+    if active_now:
+        # Fast path over the (status, start_date) index; returned, cancelled
+        # and declined history is never read
+        placeholders = ", ".join("?" for _ in ACTIVE_NOW_STATUSES)
+        query += f" AND b.status IN ({placeholders}) AND b.start_date <= date('now')"
+        params.extend(ACTIVE_NOW_STATUSES)
+    elif status:
+        query += " AND b.status = ?"
+        params.append(status)
+    
+    if item_id:
+        query += " AND b.item_id = ?"
+        params.append(item_id)
+    
+    if whanau_group:
+        query += " AND b.whanau_group = ?"
+        params.append(whanau_group)
+    
+    # Date filters select bookings overlapping from_date..to_date
+    if from_date:
+        query += " AND b.end_date >= ?"
+        params.append(from_date)
     
-    return bookings
+    if to_date:
+        query += " AND b.start_date <= ?"
+        params.append(to_date)
+    
+    if cursor:
+        created_at, booking_id = decode_booking_cursor(cursor)
+        query += " AND (b.created_at < ? OR (b.created_at = ? AND b.id < ?))"
+        params.extend([created_at, created_at, booking_id])
+    
+    # Fetch one extra row to know whether another page exists
+    query += " ORDER BY b.created_at DESC, b.id DESC LIMIT ?"
+    params.append(limit + 1)
+    
+    bookings = db.execute_query(query, tuple(params), fetch_all=True)
+    has_more = len(bookings) > limit
+    bookings = bookings[:limit]
+    
+    return {
+        "bookings": bookings,
+        "next_cursor": encode_booking_cursor(bookings[-1]) if has_more else None,
+        "limit": limit
+    }
 
 
 def create_booking(booking: BookingCreate, current_user: UserResponse):
     """Create a new booking"""
-    # Check if item exists and is loanable
-    item = db.execute_query(
-        "SELECT * FROM inventory_items WHERE id = ? AND is_loanable = 1",
-        (booking.item_id,),
-        fetch_one=True
-    )
-    
-    if not item:
-        raise HTTPException(
-            status_code=404, 
-            detail="Item not found or not available for booking"
-        )
+    if booking.end_date < booking.start_date:
+        raise HTTPException(status_code=400, detail="end_date must be on or after start_date")
     
-    # Check if sufficient quantity is available
-    if item['quantity'] < booking.quantity_requested:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Only {item['quantity']} items available"
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Hold the write lock from the availability check to the insert, so
+        # another worker can't book the same units in between
+        cursor.execute("BEGIN IMMEDIATE")
+        version_before = bookings_version(cursor)
+        
+        # Check if item exists and is loanable
+        item = cursor.execute(
+            "SELECT * FROM inventory_items WHERE id = ? AND is_loanable = 1",
+            (booking.item_id,)
+        ).fetchone()
+        
+        if not item:
+            raise HTTPException(
+                status_code=404, 
+                detail="Item not found or not available for booking"
+            )
+        item = dict(item)
+        
+        # Check if sufficient quantity is free on every day of the booking
+        availability_engine.ensure_current(version_before)
+        available = availability_engine.units_available(
+            booking.item_id, item['quantity'], booking.start_date, booking.end_date
         )
+        
+        # A booking that starts today also competes with live stock holds, and
+        # holds its own units until approval so concurrent requests can't take them
+        hold = None
+        if booking.start_date <= date.today():
+            hold = reservation_ledger.try_hold(item, booking.quantity_requested, capacity=available,
+                                               user_id=current_user.id)
+            if "error" in hold:
+                available, hold = hold['available_to_promise'], None
+        
+        if available < booking.quantity_requested:
+            raise HTTPException(
+                status_code=400, 
+                detail=f"Only {available} items available from {booking.start_date} to {booking.end_date}"
+            )
+        
+        # Create booking
+        try:
+            cursor.execute(
+                """INSERT INTO bookings 
+                   (item_id, user_id, kaupapa_name, kaupapa_description, whanau_group,
+                    quantity_requested, booking_date, start_date, end_date, notes)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (booking.item_id, current_user.id, booking.kaupapa_name,
+                 booking.kaupapa_description, booking.whanau_group,
+                 booking.quantity_requested, date.today(), booking.start_date,
+                 booking.end_date, booking.notes)
+            )
+            booking_id = cursor.lastrowid
+            versions = (version_before, bookings_version(cursor))
+            conn.commit()
+        except Exception:
+            if hold:
+                reservation_ledger.release(hold['hold_id'])
+            raise
     
-    # Create booking
-    booking_id = db.execute_query(
-        """INSERT INTO bookings 
-           (item_id, user_id, kaupapa_name, kaupapa_description, whanau_group,
-            quantity_requested, booking_date, start_date, end_date, notes)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        (booking.item_id, current_user.id, booking.kaupapa_name,
-         booking.kaupapa_description, booking.whanau_group,
-         booking.quantity_requested, date.today(), booking.start_date,
-         booking.end_date, booking.notes)
-    )
+    if hold:
+        reservation_ledger.rekey(hold['hold_id'], booking_hold_id(booking_id))
     
     # Log audit
     db.log_audit(current_user.id, "CREATE", "bookings", booking_id, {}, 
                 booking.dict())
+    availability_engine.sync_booking(booking_id, versions)
+    publish_event("booking", action="created", booking_id=booking_id,
+                  item_id=booking.item_id, status="Pending")
     
     # Get created booking
     created_booking = db.execute_query(
@@ -92,4 +197,330 @@ def create_booking(booking: BookingCreate, current_user: UserResponse):
         fetch_one=True
     )
     
-    return created_booking 
\ No newline at end of file
+    return created_booking 
+
+# Bulk action -> (statuses it applies to, resulting status)
+BOOKING_TRANSITIONS = {
+    'approve': (('Pending',), 'Approved'),
+    'check_out': (('Approved',), 'Active'),
+    'check_in': (('Active', 'Overdue'), 'Returned'),
+}
+
+
+def bulk_booking_action(action: str, booking_ids: List[int], user_id: int,
+                        return_condition: Optional[str] = None, notes: Optional[str] = None):
+    """Approve, check out or check in many bookings in one transaction"""
+    from_statuses, to_status = BOOKING_TRANSITIONS[action]
+    booking_ids = list(dict.fromkeys(booking_ids))
+    ids_param = json.dumps(booking_ids)
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Validate under the write lock, so another worker can't change the
+        # bookings or take their units between the checks and the transition
+        cursor.execute("BEGIN IMMEDIATE")
+        version_before = bookings_version(cursor)
+        
+        # One set-based read of every booking with its item's stock
+        rows = [dict(row) for row in cursor.execute("""
+            SELECT b.id, b.item_id, b.status, b.start_date, b.end_date, b.quantity_requested,
+                   i.quantity as on_hand, i.is_active as item_active, i.location_id
+            FROM bookings b
+            JOIN inventory_items i ON b.item_id = i.id
+            WHERE b.id IN (SELECT value FROM json_each(?))
+        """, (ids_param,)).fetchall()]
+        bookings = {row['id']: row for row in rows}
+        
+        if action == 'approve':
+            availability_engine.ensure_current(version_before)
+        
+        results = {}
+        accepted = []
+        on_hand = {row['item_id']: row['on_hand'] for row in rows}
+        
+        for booking_id in booking_ids:
+            booking = bookings.get(booking_id)
+            if not booking:
+                results[booking_id] = {"booking_id": booking_id, "success": False, "error": "Booking not found"}
+                continue
+        
+            quantity = booking['quantity_requested'] or 1
+            error = None
+        
+            if booking['status'] not in from_statuses:
+                error = f"Booking is {booking['status']}, expected {' or '.join(from_statuses)}"
+            elif action == 'approve':
+                if not booking['item_active']:
+                    error = "Item is inactive"
+                else:
+                    available = availability_engine.try_hold(booking, on_hand[booking['item_id']])
+                    if available < quantity:
+                        error = f"Only {available} items available from {booking['start_date']} to {booking['end_date']}"
+            elif action == 'check_out':
+                # Units must physically be on the shelf; earlier lines in the
+                # batch have already taken theirs
+                if str(booking['end_date']) < date.today().isoformat():
+                    error = "Booking period has already ended"
+                elif on_hand[booking['item_id']] < quantity:
+                    error = f"Insufficient stock. Available: {on_hand[booking['item_id']]}, Requested: {quantity}"
+                else:
+                    on_hand[booking['item_id']] -= quantity
+        
+            if error:
+                results[booking_id] = {"booking_id": booking_id, "success": False, "error": error}
+            else:
+                accepted.append(booking_id)
+                results[booking_id] = {
+                    "booking_id": booking_id,
+                    "item_id": booking['item_id'],
+                    "status": to_status,
+                    "success": True
+                }
+        
+        item_ids = sorted({bookings[booking_id]['item_id'] for booking_id in accepted})
+        alerts_created = 0
+        versions = None
+        
+        if accepted:
+            accepted_param = json.dumps(accepted)
+            
+            # Status transition, guarded so a concurrent change is not overwritten
+            placeholders = ", ".join("?" for _ in from_statuses)
+            cursor.execute(f"""
+                UPDATE bookings
+                SET status = ?,
+                    approved_by = CASE WHEN ? = 'approve' THEN ? ELSE approved_by END,
+                    approved_at = CASE WHEN ? = 'approve' THEN CURRENT_TIMESTAMP ELSE approved_at END,
+                    return_date = CASE WHEN ? = 'check_in' THEN date('now') ELSE return_date END,
+                    return_condition = CASE WHEN ? = 'check_in' THEN COALESCE(?, return_condition)
+                                            ELSE return_condition END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT value FROM json_each(?)) AND status IN ({placeholders})
+            """, (to_status, action, user_id, action, action, action, return_condition,
+                  accepted_param, *from_statuses))
+            
+            if cursor.rowcount != len(accepted):
+                conn.rollback()
+                availability_engine.sync_bookings(accepted)
+                return {"error": "Bookings changed while being processed; retry the request"}
+            
+            # Approved bookings reserve their units until they are checked out
+            if action in ('approve', 'check_out'):
+                cursor.execute("""
+                    UPDATE inventory_items
+                    SET reserved_quantity = MAX(COALESCE(reserved_quantity, 0) + d.delta, 0)
+                    FROM (
+                        SELECT item_id, SUM(quantity_requested) * ? as delta
+                        FROM bookings
+                        WHERE id IN (SELECT value FROM json_each(?))
+                        GROUP BY item_id
+                    ) d
+                    WHERE inventory_items.id = d.item_id
+                """, (1 if action == 'approve' else -1, accepted_param))
+            
+            # Loans leave and return to the shelf as booking movements
+            if action in ('check_out', 'check_in'):
+                movement_type = 'OUT' if action == 'check_out' else 'RETURN'
+                sign = -1 if action == 'check_out' else 1
+                cursor.execute("""
+                    INSERT INTO stock_movements (
+                        item_id, movement_type, quantity, from_location_id, to_location_id,
+                        reference_id, reference_type, user_id, reason, notes
+                    )
+                    SELECT b.item_id, ?, b.quantity_requested,
+                           CASE WHEN ? = 'OUT' THEN i.location_id END,
+                           CASE WHEN ? = 'RETURN' THEN i.location_id END,
+                           b.id, 'booking', ?, ?, ?
+                    FROM bookings b
+                    JOIN inventory_items i ON b.item_id = i.id
+                    WHERE b.id IN (SELECT value FROM json_each(?))
+                """, (movement_type, movement_type, movement_type, user_id,
+                      f"Booking {'check-out' if action == 'check_out' else 'check-in'}",
+                      notes, accepted_param))
+                
+                cursor.execute("""
+                    UPDATE inventory_items
+                    SET quantity = inventory_items.quantity + d.total * ?,
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM (
+                        SELECT item_id, SUM(quantity_requested) as total
+                        FROM bookings
+                        WHERE id IN (SELECT value FROM json_each(?))
+                        GROUP BY item_id
+                    ) d
+                    WHERE inventory_items.id = d.item_id
+                    AND (? > 0 OR inventory_items.quantity >= d.total)
+                """, (sign, accepted_param, sign))
+                
+                # Never let a check-out take an item below zero
+                if cursor.rowcount != len(item_ids):
+                    conn.rollback()
+                    availability_engine.sync_bookings(accepted)
+                    return {"error": "Not enough stock left to check out every booking; retry the request"}
+                
+                alerts_created = create_stock_alerts_bulk(cursor, item_ids)
+            
+            # Retire overdue alerts for items with nothing left overdue
+            if action == 'check_in':
+                cursor.execute("""
+                    UPDATE stock_alerts
+                    SET is_active = 0, acknowledged_at = CURRENT_TIMESTAMP
+                    WHERE alert_type = 'BOOKING_OVERDUE' AND is_active = 1
+                    AND item_id IN (SELECT value FROM json_each(?))
+                    AND NOT EXISTS (
+                        SELECT 1 FROM bookings b
+                        WHERE b.item_id = stock_alerts.item_id AND b.status = 'Overdue'
+                    )
+                """, (json.dumps(item_ids),))
+            
+            versions = (version_before, bookings_version(cursor))
+            conn.commit()
+    
+    if accepted:
+        db.log_audit(user_id, "UPDATE", "bookings", None, {}, {
+            "bulk_action": action,
+            "bookings": accepted,
+            "status": to_status
+        })
+        
+        for booking_id in accepted:
+            publish_event("booking", action=action, booking_id=booking_id,
+                          item_id=bookings[booking_id]['item_id'], status=to_status)
+        if action != 'approve':
+            publish_stock_levels(item_ids, f"booking_{action}", alerts_created)
+    
+    # Approved bookings now reserve through reserved_quantity instead of a hold
+    for booking_id in accepted:
+        reservation_ledger.release(booking_hold_id(booking_id))
+    
+    # Settle tentative holds, and apply check-outs and check-ins
+    availability_engine.sync_bookings(booking_ids if action == 'approve' else accepted, versions)
+    
+    return {
+        "action": action,
+        "results": [results[booking_id] for booking_id in booking_ids],
+        "total": len(booking_ids),
+        "succeeded": len(accepted),
+        "failed": len(booking_ids) - len(accepted)
+    }
+
+
+OVERDUE_JOB = 'overdue_bookings'
+
+
+def detect_overdue_bookings(full: bool = False):
+    """Mark active loans past their end date as Overdue and raise alerts"""
+    started = time.perf_counter()
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        version_before = bookings_version(cursor)
+        today = cursor.execute("SELECT date('now')").fetchone()[0]
+        
+        # Incremental runs only read loans whose end date passed since the
+        # previous run's cutoff. The planner would otherwise prefer the
+        # broader (status, start_date) index, so the partial index is pinned.
+        state = cursor.execute(
+            "SELECT last_cutoff FROM job_runs WHERE name = ?", (OVERDUE_JOB,)
+        ).fetchone()
+        since = None if full or not state else state['last_cutoff']
+        
+        query = """
+            UPDATE bookings INDEXED BY idx_bookings_open_end
+            SET status = 'Overdue', updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'Active' AND return_date IS NULL AND end_date < ?
+        """
+        params = [today]
+        if since:
+            query += " AND end_date >= ?"
+            params.append(since)
+        query += " RETURNING id, item_id, user_id, end_date, quantity_requested"
+        
+        overdue = [dict(row) for row in cursor.execute(query, params).fetchall()]
+        
+        # One active alert per item, counting every overdue unit of it
+        alerts = []
+        if overdue:
+            cursor.execute("""
+                INSERT OR IGNORE INTO stock_alerts
+                (item_id, alert_type, threshold_value, current_value, message, is_active)
+                SELECT i.id, 'BOOKING_OVERDUE', 0, o.units,
+                       o.units || ' unit(s) of ''' || i.name_en || ''' are overdue for return', 1
+                FROM (
+                    SELECT item_id, SUM(quantity_requested) as units
+                    FROM bookings
+                    WHERE status = 'Overdue' AND item_id IN (SELECT value FROM json_each(?))
+                    GROUP BY item_id
+                ) o
+                JOIN inventory_items i ON i.id = o.item_id
+                RETURNING id, item_id, alert_type, message
+            """, (json.dumps(sorted({row['item_id'] for row in overdue})),))
+            alerts = [dict(row) for row in cursor.fetchall()]
+        
+        result = {
+            "marked_overdue": len(overdue),
+            "alerts_created": len(alerts),
+            "since": since,
+            "cutoff": today
+        }
+        cursor.execute("""
+            INSERT INTO job_runs (name, last_cutoff, last_run_at, last_result)
+            VALUES (?, ?, CURRENT_TIMESTAMP, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                last_cutoff = excluded.last_cutoff,
+                last_run_at = excluded.last_run_at,
+                last_result = excluded.last_result
+        """, (OVERDUE_JOB, today, json.dumps(result)))
+        
+        versions = (version_before, bookings_version(cursor))
+        conn.commit()
+    
+    if overdue:
+        availability_engine.sync_bookings([row['id'] for row in overdue], versions)
+        db.log_audit(None, "UPDATE", "bookings", None, {}, {
+            "overdue": [row['id'] for row in overdue]
+        })
+        for row in overdue:
+            publish_event("booking", action="overdue", booking_id=row['id'],
+                          item_id=row['item_id'], status="Overdue")
+        publish_alerts(alerts)
+    
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def get_overdue_bookings(skip: int = 0, limit: int = 100):
+    """Get the overdue queue, longest overdue first"""
+    bookings = db.execute_query("""
+        SELECT b.*, i.name_en as item_name, i.sku, u.first_name, u.last_name, u.email,
+               CAST(julianday('now') - julianday(b.end_date) AS INTEGER) as days_overdue
+        FROM bookings b
+        JOIN inventory_items i ON b.item_id = i.id
+        JOIN users u ON b.user_id = u.id
+        WHERE b.status = 'Overdue'
+        ORDER BY b.end_date, b.id
+        LIMIT ? OFFSET ?
+    """, (limit, skip), fetch_all=True)
+    
+    total = db.execute_query(
+        "SELECT COUNT(*) as count FROM bookings WHERE status = 'Overdue'", fetch_one=True
+    )['count']
+    
+    return {"bookings": bookings, "total": total, "skip": skip, "limit": limit}
+
+
+async def run_overdue_detector():
+    """Background task: detect overdue bookings every BOOKING_OVERDUE_CHECK_INTERVAL_SECONDS"""
+    while True:
+        try:
+            result = await asyncio.to_thread(detect_overdue_bookings)
+            if result['marked_overdue']:
+                logger.info(f"Marked {result['marked_overdue']} bookings overdue")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Overdue detection failed: {e}")
+        
+        await asyncio.sleep(settings.bookings.OVERDUE_CHECK_INTERVAL_SECONDS)
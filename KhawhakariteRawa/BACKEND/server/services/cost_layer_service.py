@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Cost layer service for Kaiwhakarite Rawa
+Reads the trigger-maintained receipt layers and rebuilds them from history
+"""
+
+from itertools import groupby
+from typing import Optional
+from ..database import db
+from ..config import settings
+from ..models import MovementType, ValuationMethod
+
+
+# Summary columns holding the value and quantity covered under each method
+_LAYER_COLUMNS = {
+    ValuationMethod.FIFO.value: ("fifo_value", "fifo_quantity"),
+    ValuationMethod.LIFO.value: ("lifo_value", "lifo_quantity"),
+}
+
+
+def _average_value_sql():
+    """Value on hand at the average receipt cost, as calculate_item_valuation does"""
+    return "CASE WHEN s.received_quantity > 0 THEN s.received_cost / s.received_quantity * i.quantity ELSE 0 END"
+
+
+def _layer_value_sql(method: str):
+    """Value on hand at the unit cost of the layers still open under a method
+
+    Loans and transfers move stock without touching the layers, so the
+    layers give the unit cost and inventory_items.quantity the units.
+    """
+    value_column, quantity_column = _LAYER_COLUMNS[method]
+    return (f"CASE WHEN s.{quantity_column} > 0 "
+            f"THEN s.{value_column} / s.{quantity_column} * i.quantity "
+            f"ELSE {_average_value_sql()} END")
+
+
+def get_item_cost(item_id: int, method: str = 'AVERAGE'):
+    """Get an item's current cost from its summary row"""
+    row = db.execute_query("""
+        SELECT i.id as item_id, i.name_en as item_name, i.quantity, s.*
+        FROM inventory_items i
+        JOIN inventory_cost_summary s ON s.item_id = i.id
+        WHERE i.id = ?
+    """, (item_id,), fetch_one=True)
+    
+    if not row or row['received_quantity'] <= 0:
+        return None
+    
+    value_column, quantity_column = _LAYER_COLUMNS.get(method, (None, None))
+    if value_column and row[quantity_column] > 0:
+        cost_per_unit = row[value_column] / row[quantity_column]
+    else:
+        cost_per_unit = row['received_cost'] / row['received_quantity']
+    total_value = cost_per_unit * row['quantity']
+    
+    return {
+        "item_id": item_id,
+        "item_name": row['item_name'],
+        "method": method,
+        "quantity": row['quantity'],
+        "cost_per_unit": cost_per_unit,
+        "total_value": total_value
+    }
+
+
+def get_item_cost_layers(item_id: int):
+    """Get the receipt layers still holding stock for an item"""
+    return db.execute_query("""
+        SELECT id, movement_id, received_at, unit_cost, quantity,
+               fifo_remaining, lifo_remaining
+        FROM inventory_cost_layers
+        WHERE item_id = ? AND (fifo_remaining > 0 OR lifo_remaining > 0)
+        ORDER BY received_at, movement_id
+    """, (item_id,), fetch_all=True)
+
+
+def get_cost_layer_valuation(method: str = 'AVERAGE'):
+    """Total current valuation from the summary rows in one statement"""
+    if method in _LAYER_COLUMNS:
+        value_sql = _layer_value_sql(method)
+    else:
+        value_sql = _average_value_sql()
+    
+    totals = db.execute_query(f"""
+        SELECT COALESCE(SUM({value_sql}), 0) as total_valuation,
+               COUNT(*) as items_processed
+        FROM inventory_cost_summary s
+        JOIN inventory_items i ON s.item_id = i.id
+        WHERE i.is_active = 1 AND i.quantity > 0 AND s.received_quantity > 0
+    """, fetch_one=True)
+    
+    return {
+        "method": method,
+        "total_valuation": totals['total_valuation'],
+        "items_processed": totals['items_processed'],
+        "currency": "NZD"
+    }
+
+
+def _consume(layers, quantity: int, column: int, newest_first: bool):
+    """Draw quantity down from open layers in consumption order"""
+    order = reversed(layers) if newest_first else layers
+    for layer in order:
+        if quantity <= 0:
+            break
+        take = min(layer[column], quantity)
+        layer[column] -= take
+        quantity -= take
+
+
+def _replay_item(item_id: int, movements):
+    """Replay one item's movements with the trg_cost_layers_* rules"""
+    layers = []
+    received_quantity = received_cost = 0
+    has_receipts = False
+    
+    for movement in movements:
+        movement_type = movement['movement_type']
+        quantity = movement['quantity']
+        
+        if movement_type in (MovementType.IN.value, MovementType.RETURN.value) or \
+                (movement_type == MovementType.ADJUSTMENT.value and quantity > 0):
+            has_receipts = True
+            unit_cost = movement['unit_cost']
+            if movement_type == MovementType.IN.value and unit_cost is not None:
+                received_quantity += quantity
+                received_cost += quantity * unit_cost
+            if unit_cost is None and received_quantity > 0:
+                unit_cost = received_cost / received_quantity
+            if unit_cost is not None:
+                layers.append([
+                    item_id, movement['id'], movement['created_at'], unit_cost,
+                    quantity, quantity, quantity
+                ])
+        elif movement_type == MovementType.OUT.value or \
+                (movement_type == MovementType.ADJUSTMENT.value and quantity < 0):
+            _consume(layers, abs(quantity), 5, newest_first=True)
+            _consume(layers, abs(quantity), 6, newest_first=False)
+    
+    if not has_receipts:
+        return [], None
+    
+    summary = (
+        item_id, received_quantity, received_cost,
+        sum(layer[5] for layer in layers),
+        sum(layer[5] * layer[3] for layer in layers),
+        sum(layer[6] for layer in layers),
+        sum(layer[6] * layer[3] for layer in layers)
+    )
+    return layers, summary
+
+
+def rebuild_cost_layers(user_id: Optional[int] = None):
+    """Rebuild every cost layer by replaying movement history in order"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Hold the write lock from the history read to the rewrite, so no
+        # movement can land in between and be lost from the layers
+        cursor.execute("BEGIN IMMEDIATE")
+        movements = cursor.execute(f"""
+            SELECT id, item_id, movement_type, quantity, unit_cost, reference_type, created_at
+            FROM {settings.archive.HISTORY_VIEW}
+            WHERE COALESCE(reference_type, '') NOT IN ('stock_transfer', 'booking')
+            ORDER BY item_id, created_at, id
+        """).fetchall()
+        
+        layers = []
+        summaries = []
+        for item_id, item_movements in groupby(movements, key=lambda m: m['item_id']):
+            item_layers, summary = _replay_item(item_id, item_movements)
+            layers.extend(item_layers)
+            if summary:
+                summaries.append(summary)
+        
+        cursor.execute("DELETE FROM inventory_cost_layers")
+        cursor.execute("DELETE FROM inventory_cost_summary")
+        cursor.executemany("""
+            INSERT INTO inventory_cost_layers (
+                item_id, movement_id, received_at, unit_cost,
+                quantity, fifo_remaining, lifo_remaining
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, layers)
+        cursor.executemany("""
+            INSERT INTO inventory_cost_summary (
+                item_id, received_quantity, received_cost,
+                fifo_quantity, fifo_value, lifo_quantity, lifo_value
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, summaries)
+        conn.commit()
+    
+    db.log_audit(user_id, "UPDATE", "inventory_cost_layers", None, {}, {
+        "rebuild": True,
+        "layers": len(layers),
+        "items": len(summaries)
+    })
+    
+    return {
+        "movements_replayed": len(movements),
+        "layers": len(layers),
+        "items": len(summaries)
+    }
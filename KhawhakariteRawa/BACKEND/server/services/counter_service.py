@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Metric counter service for Kaiwhakarite Rawa
+Reads, verifies and rebuilds the trigger-maintained metric_counters table
+"""
+
+from typing import Optional, List
+from ..database import db, METRIC_COUNTERS
+
+
+# Counters that sum currency values are compared with a small tolerance
+VALUE_TOLERANCE = 0.005
+
+
+def get_counters():
+    """Get every metric counter"""
+    return db.get_counters(*METRIC_COUNTERS)
+
+
+def verify_counters(names: Optional[List[str]] = None):
+    """Recount counters from their source tables and report any drift"""
+    names = names or list(METRIC_COUNTERS)
+    unknown = [name for name in names if name not in METRIC_COUNTERS]
+    if unknown:
+        return {"error": f"Unknown counters: {', '.join(unknown)}"}
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Counted tables that are missing from this database have no counters
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        existing_tables = {row[0] for row in cursor.fetchall()}
+        
+        cursor.execute("SELECT name, value FROM metric_counters")
+        stored = {row['name']: row['value'] for row in cursor.fetchall()}
+        
+        results = []
+        for name in names:
+            if METRIC_COUNTERS[name][0] not in existing_tables:
+                continue
+            actual = cursor.execute(db.counter_rebuild_sql(name)).fetchone()[0]
+            counter = stored.get(name)
+            in_sync = counter is not None and abs(counter - actual) <= VALUE_TOLERANCE
+            results.append({
+                "name": name,
+                "counter": counter,
+                "actual": actual,
+                "in_sync": in_sync
+            })
+    
+    drifted = [result for result in results if not result['in_sync']]
+    return {
+        "checked": len(results),
+        "drifted": len(drifted),
+        "in_sync": not drifted,
+        "counters": results
+    }
+
+
+def rebuild_counters():
+    """Reinstall the counter triggers and recompute every counter from scratch"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Drop all counters so create_counter_triggers reseeds them, in the
+        # same transaction as the trigger rebuild so no write is missed
+        cursor.execute("DELETE FROM metric_counters")
+        db.create_counter_triggers(cursor, replace=True)
+        conn.commit()
+    
+    return verify_counters()
@@ -3,105 +3,109 @@
 Dashboard service for Kaiwhakarite Rawa
 """
 
+import threading
 from ..database import db
 
 
-def get_dashboard_statistics():
-    """Get dashboard statistics"""
-    # Get basic statistics
-    total_items_result = db.execute_query(
-        "SELECT COUNT(*) as count FROM inventory_items",
-        fetch_one=True
-    )
-    total_items = total_items_result['count'] if total_items_result else 0
-    
-    active_bookings_result = db.execute_query(
-        "SELECT COUNT(*) as count FROM bookings WHERE status = 'Active'",
-        fetch_one=True
-    )
-    active_bookings = (
-        active_bookings_result['count'] if active_bookings_result else 0
-    )
-    
-    pending_bookings_result = db.execute_query(
-        "SELECT COUNT(*) as count FROM bookings WHERE status = 'Pending'",
-        fetch_one=True
-    )
-    pending_bookings = (
-        pending_bookings_result['count'] if pending_bookings_result else 0
-    )
-    
-    maintenance_issues_result = db.execute_query(
-        "SELECT COUNT(*) as count FROM maintenance_records " +
-        "WHERE status = 'Pending'",
-        fetch_one=True
-    )
-    maintenance_issues = (
-        maintenance_issues_result['count'] if maintenance_issues_result else 0
-    )
+# Tables the dashboard payload is built from; a change to any of them
+# (tracked by the table_versions triggers) invalidates the cached payload
+DASHBOARD_TABLES = (
+    'inventory_items', 'bookings', 'maintenance_records',
+    'suppliers', 'categories', 'users'
+)
+
+# Dashboard fields read from metric_counters
+DASHBOARD_COUNTERS = {
+    'total_items': 'inventory_items.total',
+    'low_stock_items': 'inventory_items.quantity_le_5',
+    'active_bookings': 'bookings.active',
+    'pending_bookings': 'bookings.pending',
+    'maintenance_issues': 'maintenance_records.pending',
+    'total_suppliers': 'suppliers.total',
+}
+
+_cache_lock = threading.Lock()
+_cached_version = None
+_cached_statistics = None
+
+
+def _build_dashboard_statistics():
+    """Build the dashboard payload with three statements on one connection"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Scalar counts come from the trigger-maintained metric counters
+        cursor.execute(
+            f"SELECT name, value FROM metric_counters WHERE name IN ({', '.join('?' for _ in DASHBOARD_COUNTERS)})",
+            list(DASHBOARD_COUNTERS.values())
+        )
+        counter_values = {row['name']: row['value'] for row in cursor.fetchall()}
+        counts = {key: counter_values.get(name, 0) for key, name in DASHBOARD_COUNTERS.items()}
+        
+        # Get recent activities (last 10 bookings)
+        recent_bookings = cursor.execute("""
+            SELECT b.*, i.name_en as item_name, u.first_name, u.last_name
+            FROM bookings b
+            JOIN inventory_items i ON b.item_id = i.id
+            JOIN users u ON b.user_id = u.id
+            ORDER BY b.created_at DESC
+            LIMIT 10
+        """).fetchall()
+        
+        # All chart series in one pass, tagged by chart
+        chart_rows = cursor.execute("""
+            SELECT 'items_by_category' as chart, c.name_en as label, COUNT(i.id) as count
+            FROM categories c
+            LEFT JOIN inventory_items i ON c.id = i.category_id
+            GROUP BY c.id, c.name_en
+            UNION ALL
+            SELECT 'booking_status_distribution', status, COUNT(*)
+            FROM bookings
+            GROUP BY status
+            UNION ALL
+            SELECT 'items_by_condition', condition_status, COUNT(*)
+            FROM inventory_items
+            GROUP BY condition_status
+            ORDER BY chart, count DESC
+        """).fetchall()
     
-    # Get low stock items (quantity <= 5)
-    low_stock_items_result = db.execute_query(
-        "SELECT COUNT(*) as count FROM inventory_items WHERE quantity <= 5",
-        fetch_one=True
-    )
-    low_stock_items = low_stock_items_result['count'] if low_stock_items_result else 0
+    # Each chart keeps the key name its front-end widget expects
+    label_keys = {
+        'items_by_category': 'category',
+        'booking_status_distribution': 'status',
+        'items_by_condition': 'condition_status'
+    }
+    charts = {chart: [] for chart in label_keys}
+    for row in chart_rows:
+        charts[row['chart']].append({label_keys[row['chart']]: row['label'], "count": row['count']})
     
-    # Get total suppliers
-    total_suppliers_result = db.execute_query(
-        "SELECT COUNT(*) as count FROM suppliers",
-        fetch_one=True
-    )
-    total_suppliers = total_suppliers_result['count'] if total_suppliers_result else 0
+    return {
+        **counts,
+        "recent_bookings": [dict(row) for row in recent_bookings],
+        **charts
+    }
+
+
+def get_dashboard_statistics():
+    """Get dashboard statistics"""
+    global _cached_version, _cached_statistics
     
-    # Get recent activities (last 10 bookings)
-    recent_bookings = db.execute_query(
-        """SELECT b.*, i.name_en as item_name, u.first_name, u.last_name
-        FROM bookings b
-        JOIN inventory_items i ON b.item_id = i.id
-        JOIN users u ON b.user_id = u.id
-        ORDER BY b.created_at DESC
-        LIMIT 10""",
-        fetch_all=True
-    ) or []
+    version = db.get_table_versions(*DASHBOARD_TABLES)
     
-    # Get items by category for chart
-    items_by_category = db.execute_query(
-        """SELECT c.name_en as category, COUNT(i.id) as count
-        FROM categories c
-        LEFT JOIN inventory_items i ON c.id = i.category_id
-        GROUP BY c.id, c.name_en
-        ORDER BY count DESC""",
-        fetch_all=True
-    ) or []
+    with _cache_lock:
+        if _cached_statistics is not None and version == _cached_version:
+            return _cached_statistics
     
-    # Get booking status distribution
-    booking_status_distribution = db.execute_query(
-        """SELECT status, COUNT(*) as count
-        FROM bookings
-        GROUP BY status
-        ORDER BY count DESC""",
-        fetch_all=True
-    ) or []
+    statistics = _build_dashboard_statistics()
     
-    # Get items by condition
-    items_by_condition = db.execute_query(
-        """SELECT condition_status, COUNT(*) as count
-        FROM inventory_items
-        GROUP BY condition_status
-        ORDER BY count DESC""",
-        fetch_all=True
-    ) or []
+    with _cache_lock:
+        _cached_version = version
+        _cached_statistics = statistics
     
-    return {
-        "total_items": total_items,
-        "active_bookings": active_bookings,
-        "pending_bookings": pending_bookings,
-        "maintenance_issues": maintenance_issues,
-        "low_stock_items": low_stock_items,
-        "total_suppliers": total_suppliers,
-        "recent_bookings": recent_bookings,
-        "items_by_category": items_by_category,
-        "booking_status_distribution": booking_status_distribution,
-        "items_by_condition": items_by_condition
-    } 
\ No newline at end of file
+    return statistics
+
+
+def get_dashboard_counts():
+    """Get the dashboard's scalar counts straight from the metric counters"""
+    counters = db.get_counters(*DASHBOARD_COUNTERS.values())
+    return {key: counters[name] for key, name in DASHBOARD_COUNTERS.items()}
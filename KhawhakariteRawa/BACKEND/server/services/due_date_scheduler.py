@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Due-date scheduler for Kaiwhakarite Rawa
+Keeps upcoming expiry and maintenance deadlines in a min-heap and raises
+their alerts when they come due, instead of rescanning tables on a timer
+"""
+
+import json
+import time
+import heapq
+import asyncio
+import calendar
+import itertools
+import logging
+import threading
+from datetime import date, timedelta
+from typing import Optional, List, Dict, Tuple
+from ..database import db
+from ..config import settings
+from .alert_service import evaluate_stock_alerts, publish_alerts
+
+logger = logging.getLogger(__name__)
+
+
+EXPIRY = "expiry"
+MAINTENANCE = "maintenance"
+
+# Longest the loop sleeps without re-checking the heap
+MAX_SLEEP_SECONDS = 3600
+
+# Delay before deadlines whose alerts failed to write are tried again
+RETRY_SECONDS = 60
+
+
+def _parse_date(value) -> Optional[date]:
+    """Read a DATE/TIMESTAMP column value as a date"""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _fire_time(due: date, warning_days: int) -> float:
+    """Epoch seconds at which a deadline's warning window opens (UTC, like SQLite 'now')"""
+    opens = due - timedelta(days=warning_days)
+    return float(calendar.timegm(opens.timetuple()))
+
+
+class DueDateScheduler:
+    """Min-heap of (fire_at, kind, item_id) deadlines with lazy invalidation"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str, int]] = []
+        # Current deadline per (kind, item_id); heap entries that disagree are stale
+        self._current: Dict[Tuple[str, int], Tuple[float, date]] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.fired = 0
+
+    def schedule(self, kind: str, item_id: int, due: Optional[date]):
+        """Add, move or (with due=None) cancel the deadline for an item"""
+        key = (kind, item_id)
+
+        with self._lock:
+            if due is None:
+                self._current.pop(key, None)
+                return
+
+            warning_days = (settings.alerts.EXPIRY_WARNING_DAYS if kind == EXPIRY
+                            else settings.alerts.MAINTENANCE_WARNING_DAYS)
+            fire_at = _fire_time(due, warning_days)
+            if self._current.get(key) == (fire_at, due):
+                return
+
+            earliest = self._heap[0][0] if self._heap else None
+            self._current[key] = (fire_at, due)
+            heapq.heappush(self._heap, (fire_at, next(self._sequence), kind, item_id))
+
+        # Wake the loop if this deadline is now the earliest one
+        if self._loop is not None and (earliest is None or fire_at < earliest):
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def refresh_item(self, item_id: int):
+        """Re-read an item's expiry and next maintenance date after a write"""
+        row = db.execute_query("""
+            SELECT i.is_active, i.expiry_date,
+                   (SELECT m.next_maintenance_date FROM maintenance_records m
+                    WHERE m.item_id = i.id ORDER BY m.id DESC LIMIT 1) as next_maintenance_date
+            FROM inventory_items i
+            WHERE i.id = ?
+        """, (item_id,), fetch_one=True)
+
+        active = bool(row and row['is_active'])
+        self.schedule(EXPIRY, item_id, _parse_date(row['expiry_date']) if active else None)
+        self.schedule(MAINTENANCE, item_id,
+                      _parse_date(row['next_maintenance_date']) if active else None)
+
+    def load(self):
+        """Load every deadline from the indexed date columns"""
+        expiring = db.execute_query("""
+            SELECT id, expiry_date FROM inventory_items
+            WHERE expiry_date IS NOT NULL AND is_active = 1
+        """, fetch_all=True)
+
+        # Only an item's latest maintenance record sets its next due date
+        maintenance = db.execute_query("""
+            SELECT m.item_id, m.next_maintenance_date
+            FROM maintenance_records m
+            JOIN inventory_items i ON i.id = m.item_id AND i.is_active = 1
+            WHERE m.next_maintenance_date IS NOT NULL
+            AND m.id = (SELECT MAX(id) FROM maintenance_records WHERE item_id = m.item_id)
+        """, fetch_all=True)
+
+        for row in expiring:
+            self.schedule(EXPIRY, row['id'], _parse_date(row['expiry_date']))
+        for row in maintenance:
+            self.schedule(MAINTENANCE, row['item_id'], _parse_date(row['next_maintenance_date']))
+
+        return {"expiry": len(expiring), "maintenance": len(maintenance)}
+
+    def _pop_due(self, now: float) -> Dict[str, List[Tuple[int, date]]]:
+        """Pop every live deadline whose warning window has opened"""
+        due: Dict[str, List[Tuple[int, date]]] = {EXPIRY: [], MAINTENANCE: []}
+
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, _, kind, item_id = heapq.heappop(self._heap)
+                current = self._current.get((kind, item_id))
+                if current is None or current[0] != fire_at:
+                    continue
+                del self._current[(kind, item_id)]
+                due[kind].append((item_id, current[1]))
+
+        return due
+
+    def _requeue(self, due: Dict[str, List[Tuple[int, date]]], fire_at: float):
+        """Put popped deadlines back to fire again at fire_at
+
+        A deadline rescheduled since it was popped keeps its new time.
+        """
+        with self._lock:
+            for kind, entries in due.items():
+                for item_id, due_date in entries:
+                    key = (kind, item_id)
+                    if key in self._current:
+                        continue
+                    self._current[key] = (fire_at, due_date)
+                    heapq.heappush(self._heap, (fire_at, next(self._sequence), kind, item_id))
+
+    def _next_delay(self, now: float) -> float:
+        """Seconds until the earliest deadline, capped at MAX_SLEEP_SECONDS"""
+        with self._lock:
+            if not self._heap:
+                return MAX_SLEEP_SECONDS
+            return min(max(self._heap[0][0] - now, 0), MAX_SLEEP_SECONDS)
+
+    def fire(self, due: Dict[str, List[Tuple[int, date]]]) -> List[Dict]:
+        """Raise the alerts for a batch of due deadlines"""
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+
+            alerts = evaluate_stock_alerts(
+                cursor, [item_id for item_id, _ in due[EXPIRY]]
+            ) if due[EXPIRY] else []
+
+            if due[MAINTENANCE]:
+                pairs = json.dumps([[item_id, due_date.isoformat()]
+                                    for item_id, due_date in due[MAINTENANCE]])
+                cursor.execute("""
+                    INSERT OR IGNORE INTO stock_alerts
+                    (item_id, alert_type, threshold_value, current_value, message, is_active)
+                    SELECT i.id, 'MAINTENANCE_DUE', ?,
+                           julianday(d.value ->> 1) - julianday('now'),
+                           'Item ''' || i.name_en || ''' is due for maintenance on ' || (d.value ->> 1),
+                           1
+                    FROM json_each(?) d
+                    JOIN inventory_items i ON i.id = d.value ->> 0
+                    WHERE i.is_active = 1
+                    RETURNING id, item_id, alert_type, message
+                """, (settings.alerts.MAINTENANCE_WARNING_DAYS, pairs))
+                alerts += [dict(row) for row in cursor.fetchall()]
+
+            conn.commit()
+
+        self.fired += len(due[EXPIRY]) + len(due[MAINTENANCE])
+        publish_alerts(alerts)
+        return alerts
+
+    def upcoming(self, limit: int = 50) -> List[Dict]:
+        """Get the next deadlines in the order they will fire"""
+        with self._lock:
+            entries = heapq.nsmallest(limit, (
+                (fire_at, kind, item_id, due)
+                for (kind, item_id), (fire_at, due) in self._current.items()
+            ))
+
+        return [{
+            "kind": kind,
+            "item_id": item_id,
+            "due_date": due.isoformat(),
+            "fires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(fire_at))
+        } for fire_at, kind, item_id, due in entries]
+
+    def stats(self) -> dict:
+        """Get heap size for monitoring"""
+        with self._lock:
+            return {
+                "scheduled": len(self._current),
+                "heap_entries": len(self._heap),
+                "fired": self.fired
+            }
+
+    async def run(self):
+        """Background task: sleep until the earliest deadline, fire it, repeat"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+
+        loaded = await asyncio.to_thread(self.load)
+        logger.info(f"Scheduled {loaded['expiry']} expiry and "
+                    f"{loaded['maintenance']} maintenance deadlines")
+
+        try:
+            while True:
+                # Clear before reading the heap so a schedule() racing with
+                # this pass still wakes the next sleep
+                self._wakeup.clear()
+                now = time.time()
+                due = self._pop_due(now)
+
+                if due[EXPIRY] or due[MAINTENANCE]:
+                    try:
+                        await asyncio.to_thread(self.fire, due)
+                    except Exception as e:
+                        logger.error(f"Firing due dates failed, retrying in {RETRY_SECONDS}s: {e}")
+                        self._requeue(due, time.time() + RETRY_SECONDS)
+                    continue
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._next_delay(now))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._loop = None
+
+
+# Global due-date scheduler instance
+due_date_scheduler = DueDateScheduler()
@@ -8,6 +8,8 @@ import json
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime
 from ..database import db
+from ..config import settings
+from .inventory_service import create_stock_alerts_bulk, publish_stock_levels
 from ..models import (
     InventoryItemCreate, InventoryItemUpdate, StockMovementCreate,
     ProductVariantCreate, MovementType, ConditionStatus
@@ -165,6 +167,8 @@ def create_stock_movement_enhanced(movement: StockMovementCreate, user_id: int):
     if movement.unit_cost and movement.movement_type == MovementType.IN:
         db.update_inventory_valuation(movement.item_id, 'AVERAGE')
     
+    publish_stock_levels([movement.item_id], "stock_movement")
+    
     return {"movement_id": movement_id, "message": "Stock movement created successfully"}
 
 
@@ -172,20 +176,22 @@ def get_inventory_summary_enhanced():
     """Get comprehensive inventory summary"""
     summary = {}
     
-    # Basic counts
-    summary['total_items'] = db.execute_query(
-        "SELECT COUNT(*) as count FROM inventory_items WHERE is_active = 1",
-        fetch_one=True
-    )['count']
-    
-    summary['total_value'] = db.execute_query(
-        "SELECT SUM(current_value) as total FROM inventory_items WHERE is_active = 1",
-        fetch_one=True
-    )['total'] or 0
-    
-    summary['low_stock_items'] = len(db.get_low_stock_items('reorder_level'))
-    summary['out_of_stock_items'] = len(db.get_low_stock_items('out_of_stock'))
-    summary['expiring_items'] = len(db.get_expiring_items())
+    # Basic counts from the trigger-maintained metric counters
+    counters = db.get_counters(
+        'inventory_items.active', 'inventory_items.active_value',
+        'inventory_items.low_stock', 'inventory_items.out_of_stock'
+    )
+    summary['total_items'] = counters['inventory_items.active']
+    summary['total_value'] = counters['inventory_items.active_value']
+    summary['low_stock_items'] = counters['inventory_items.low_stock']
+    summary['out_of_stock_items'] = counters['inventory_items.out_of_stock']
+    
+    # Expiry depends on the current date, so it is counted on demand
+    summary['expiring_items'] = db.execute_query("""
+        SELECT COUNT(*) as count FROM inventory_items
+        WHERE is_active = 1 AND expiry_date IS NOT NULL
+          AND julianday(expiry_date) - julianday('now') BETWEEN 0 AND 30
+    """, fetch_one=True)['count']
     
     # By category
     summary['by_category'] = db.execute_query("""
@@ -209,4 +215,180 @@ def get_inventory_summary_enhanced():
         ORDER BY count DESC
     """, fetch_all=True)
     
-    return summary 
\ No newline at end of file
+    return summary
+
+
+# Signed effect of each movement type on an item's on-hand quantity
+_QUANTITY_SIGN = {
+    MovementType.IN: 1,
+    MovementType.RETURN: 1,
+    MovementType.OUT: -1,
+    MovementType.TRANSFER: 0,
+    MovementType.ADJUSTMENT: 1,
+}
+
+
+def refresh_average_valuations(cursor, item_ids: List[int]):
+    """Recompute AVERAGE cost current_value for the given items in one statement"""
+    if not item_ids:
+        return
+    
+    placeholders = ", ".join("?" for _ in item_ids)
+    cursor.execute(f"""
+        UPDATE inventory_items
+        SET current_value = quantity * COALESCE((
+            SELECT SUM(sm.quantity * sm.unit_cost) / SUM(sm.quantity)
+            FROM {settings.archive.HISTORY_VIEW} sm
+            WHERE sm.item_id = inventory_items.id
+            AND sm.movement_type = 'IN' AND sm.unit_cost IS NOT NULL
+        ), 0)
+        WHERE id IN ({placeholders})
+    """, tuple(item_ids))
+
+
+def _validate_movement_line(movement: StockMovementCreate, item: Optional[Dict], on_hand: int):
+    """Check one batch line against the running quantity; returns an error or None"""
+    if not item:
+        return "Item not found or inactive"
+    
+    if movement.movement_type == MovementType.ADJUSTMENT:
+        if movement.quantity == 0:
+            return "Adjustment quantity must not be zero"
+        if on_hand + movement.quantity < 0:
+            return f"Adjustment would make stock negative. Available: {on_hand}"
+        return None
+    
+    if movement.quantity <= 0:
+        return "Quantity must be greater than zero"
+    
+    if movement.movement_type in [MovementType.OUT, MovementType.TRANSFER]:
+        if on_hand < movement.quantity:
+            return f"Insufficient stock. Available: {on_hand}, Requested: {movement.quantity}"
+    
+    return None
+
+
+def create_stock_movements_batch(movements: List[StockMovementCreate], user_id: int,
+                                 all_or_nothing: bool = False):
+    """Validate and apply many stock movements in one transaction"""
+    item_ids = sorted({m.item_id for m in movements})
+    placeholders = ", ".join("?" for _ in item_ids)
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Take the write lock before reading, so the quantities validated
+        # here are the ones written back
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        # One set-based read validates every referenced item
+        cursor.execute(f"""
+            SELECT id, quantity, location_id
+            FROM inventory_items
+            WHERE id IN ({placeholders}) AND is_active = 1
+        """, tuple(item_ids))
+        items = {row['id']: dict(row) for row in cursor.fetchall()}
+        
+        # Walk the lines in order so repeated items see earlier lines' effects
+        on_hand = {item_id: item['quantity'] for item_id, item in items.items()}
+        locations = {item_id: item['location_id'] for item_id, item in items.items()}
+        results = []
+        valid_lines = []
+        
+        for line, movement in enumerate(movements):
+            item = items.get(movement.item_id)
+            error = _validate_movement_line(movement, item, on_hand.get(movement.item_id, 0))
+            
+            if error:
+                results.append({
+                    "line": line,
+                    "item_id": movement.item_id,
+                    "success": False,
+                    "error": error
+                })
+                continue
+            
+            # Stock leaves from wherever the item is before this line moves it
+            from_location_id = movement.from_location_id or locations[movement.item_id]
+            
+            on_hand[movement.item_id] += _QUANTITY_SIGN[movement.movement_type] * movement.quantity
+            if movement.movement_type == MovementType.TRANSFER and movement.to_location_id:
+                locations[movement.item_id] = movement.to_location_id
+            
+            valid_lines.append((line, movement, from_location_id))
+            results.append({
+                "line": line,
+                "item_id": movement.item_id,
+                "movement_type": movement.movement_type,
+                "success": True,
+                "new_quantity": on_hand[movement.item_id]
+            })
+        
+        failed = len(movements) - len(valid_lines)
+        
+        if all_or_nothing and failed:
+            conn.rollback()
+            for result in results:
+                if result['success']:
+                    result.update(success=False, error="Batch rejected: other lines failed validation")
+                    del result['new_quantity']
+            return {
+                "results": results,
+                "total": len(movements),
+                "applied": 0,
+                "failed": len(movements)
+            }
+        
+        touched = sorted({movement.item_id for _, movement, _ in valid_lines})
+        
+        for line, movement, from_location_id in valid_lines:
+            total_cost = movement.total_cost
+            if total_cost is None and movement.unit_cost is not None:
+                total_cost = movement.unit_cost * abs(movement.quantity)
+            
+            cursor.execute("""
+                INSERT INTO stock_movements (
+                    item_id, movement_type, quantity, from_location_id, to_location_id,
+                    reference_id, reference_type, unit_cost, total_cost, user_id, reason, notes
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                movement.item_id, movement.movement_type.value, movement.quantity,
+                from_location_id, movement.to_location_id, movement.reference_id,
+                movement.reference_type, movement.unit_cost, total_cost, user_id,
+                movement.reason, movement.notes
+            ))
+            results[line]['movement_id'] = cursor.lastrowid
+        
+        # One write per distinct item for the final quantity and location
+        cursor.executemany("""
+            UPDATE inventory_items
+            SET quantity = ?, location_id = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, [(on_hand[item_id], locations[item_id], item_id) for item_id in touched])
+        
+        costed = sorted({
+            movement.item_id for _, movement, _ in valid_lines
+            if movement.movement_type == MovementType.IN and movement.unit_cost
+        })
+        refresh_average_valuations(cursor, costed)
+        
+        # Alerts are evaluated once for every touched item
+        alerts_created = create_stock_alerts_bulk(cursor, touched)
+        
+        conn.commit()
+    
+    publish_stock_levels(touched, "movement_batch", alerts_created)
+    
+    if valid_lines:
+        db.log_audit(user_id, "CREATE", "stock_movements", None, {}, {
+            "batch_lines": len(valid_lines),
+            "items": touched
+        })
+    
+    return {
+        "results": results,
+        "total": len(movements),
+        "applied": len(valid_lines),
+        "failed": failed,
+        "items_affected": len(touched)
+    }
@@ -7,6 +7,9 @@ Handles financial transactions, inventory valuation, and cost tracking
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime, timedelta
 from ..database import db
+from ..config import settings
+from .archive_service import get_movement_source
+from .valuation_service import value_inventory, get_inventory_valuation
 from ..models import (
     FinancialTransactionCreate, TransactionType, ValuationMethod
 )
@@ -139,120 +142,22 @@ def update_transaction_status(transaction_id: int, status: str, user_id: int):
 
 def calculate_inventory_valuation(method: str = 'AVERAGE', as_of_date: Optional[date] = None):
     """Calculate total inventory valuation using specified method"""
-    if not as_of_date:
-        as_of_date = date.today()
-    
-    total_valuation = 0
-    items_processed = 0
-    
-    # Get all active inventory items
-    items = db.execute_query("""
-        SELECT id, name_en, quantity, purchase_cost
-        FROM inventory_items 
-        WHERE is_active = 1 AND quantity > 0
-    """, fetch_all=True)
-    
-    for item in items:
-        item_valuation = calculate_item_valuation(item['id'], method, as_of_date)
-        if item_valuation:
-            total_valuation += item_valuation['total_value']
-            items_processed += 1
-    
-    return {
-        "method": method,
-        "as_of_date": as_of_date,
-        "total_valuation": total_valuation,
-        "items_processed": items_processed,
-        "currency": "NZD"
-    }
+    valuation = get_inventory_valuation(method, as_of_date, write_back=True)
+    valuation.pop("items")
+    return valuation
 
 
 def calculate_item_valuation(item_id: int, method: str = 'AVERAGE', as_of_date: Optional[date] = None):
     """Calculate valuation for a specific item"""
-    if not as_of_date:
-        as_of_date = date.today()
-    
-    # Get current quantity
-    item = db.execute_query(
-        "SELECT quantity, name_en FROM inventory_items WHERE id = ?",
-        (item_id,), fetch_one=True
-    )
+    valuation = value_inventory(method, as_of_date, item_ids=[item_id], write_back=True)
     
-    if not item or item['quantity'] <= 0:
+    if not valuation['items']:
         return None
     
-    # Get stock movements with costs
-    movements = db.execute_query("""
-        SELECT quantity, unit_cost, created_at
-        FROM stock_movements
-        WHERE item_id = ? AND unit_cost IS NOT NULL 
-        AND movement_type = 'IN' AND date(created_at) <= ?
-        ORDER BY created_at
-    """, (item_id, as_of_date), fetch_all=True)
-    
-    if not movements:
-        return None
-    
-    current_qty = item['quantity']
-    
-    if method == 'FIFO':
-        # First In, First Out
-        remaining_qty = current_qty
-        total_cost = 0
-        
-        for movement in movements:
-            if remaining_qty <= 0:
-                break
-            
-            qty_to_use = min(remaining_qty, movement['quantity'])
-            total_cost += qty_to_use * movement['unit_cost']
-            remaining_qty -= qty_to_use
-        
-        cost_per_unit = total_cost / current_qty if current_qty > 0 else 0
-    
-    elif method == 'LIFO':
-        # Last In, First Out
-        remaining_qty = current_qty
-        total_cost = 0
-        
-        for movement in reversed(movements):
-            if remaining_qty <= 0:
-                break
-            
-            qty_to_use = min(remaining_qty, movement['quantity'])
-            total_cost += qty_to_use * movement['unit_cost']
-            remaining_qty -= qty_to_use
-        
-        cost_per_unit = total_cost / current_qty if current_qty > 0 else 0
-    
-    else:  # AVERAGE
-        total_cost = sum(m['quantity'] * m['unit_cost'] for m in movements)
-        total_qty = sum(m['quantity'] for m in movements)
-        cost_per_unit = total_cost / total_qty if total_qty > 0 else 0
-    
-    total_value = cost_per_unit * current_qty
-    
-    # Update inventory valuation record
-    db.execute_query("""
-        INSERT INTO inventory_valuations 
-        (item_id, valuation_method, cost_per_unit, quantity, total_value, valuation_date)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (item_id, method, cost_per_unit, current_qty, total_value, as_of_date))
-    
-    # Update current value in inventory_items
-    db.execute_query(
-        "UPDATE inventory_items SET current_value = ? WHERE id = ?",
-        (total_value, item_id)
-    )
-    
     return {
-        "item_id": item_id,
-        "item_name": item['name_en'],
+        **valuation['items'][0],
         "method": method,
-        "quantity": current_qty,
-        "cost_per_unit": cost_per_unit,
-        "total_value": total_value,
-        "valuation_date": as_of_date
+        "valuation_date": valuation['as_of_date']
     }
 
 
@@ -343,17 +248,18 @@ def get_cost_analysis(item_id: Optional[int] = None, category_id: Optional[int]
                     days_back: int = 365):
     """Get cost analysis for items or categories"""
     date_from = date.today() - timedelta(days=days_back)
+    movements_source = get_movement_source(days_back)
     
     if item_id:
         # Analysis for specific item
-        analysis = db.execute_query("""
+        analysis = db.execute_query(f"""
             SELECT i.id, i.name_en, i.current_value,
                 COUNT(sm.id) as movement_count,
                 SUM(CASE WHEN sm.movement_type = 'IN' THEN sm.total_cost ELSE 0 END) as total_cost_in,
                 SUM(CASE WHEN sm.movement_type = 'OUT' THEN sm.total_cost ELSE 0 END) as total_cost_out,
                 AVG(CASE WHEN sm.movement_type = 'IN' THEN sm.unit_cost ELSE NULL END) as avg_unit_cost
             FROM inventory_items i
-            LEFT JOIN stock_movements sm ON i.id = sm.item_id 
+            LEFT JOIN {movements_source} sm ON i.id = sm.item_id 
                 AND sm.created_at >= ?
                 AND sm.total_cost IS NOT NULL
             WHERE i.id = ?
@@ -361,10 +267,10 @@ def get_cost_analysis(item_id: Optional[int] = None, category_id: Optional[int]
         """, (date_from, item_id), fetch_one=True)
         
         # Get cost trend
-        cost_trend = db.execute_query("""
+        cost_trend = db.execute_query(f"""
             SELECT DATE(sm.created_at) as date,
                 AVG(sm.unit_cost) as avg_cost
-            FROM stock_movements sm
+            FROM {movements_source} sm
             WHERE sm.item_id = ? AND sm.movement_type = 'IN'
             AND sm.created_at >= ? AND sm.unit_cost IS NOT NULL
             GROUP BY DATE(sm.created_at)
@@ -378,7 +284,7 @@ def get_cost_analysis(item_id: Optional[int] = None, category_id: Optional[int]
     
     elif category_id:
         # Analysis for category
-        analysis = db.execute_query("""
+        analysis = db.execute_query(f"""
             SELECT c.name_en as category_name,
                 COUNT(i.id) as item_count,
                 SUM(i.current_value) as total_value,
@@ -386,7 +292,7 @@ def get_cost_analysis(item_id: Optional[int] = None, category_id: Optional[int]
                 SUM(sm.total_cost) as total_cost
             FROM categories c
             JOIN inventory_items i ON c.id = i.category_id
-            LEFT JOIN stock_movements sm ON i.id = sm.item_id 
+            LEFT JOIN {movements_source} sm ON i.id = sm.item_id 
                 AND sm.created_at >= ?
                 AND sm.total_cost IS NOT NULL
             WHERE c.id = ?
@@ -397,28 +303,28 @@ def get_cost_analysis(item_id: Optional[int] = None, category_id: Optional[int]
     
     else:
         # Overall cost analysis
-        analysis = db.execute_query("""
+        analysis = db.execute_query(f"""
             SELECT 'Overall' as scope,
                 COUNT(DISTINCT i.id) as item_count,
                 SUM(i.current_value) as total_inventory_value,
                 SUM(CASE WHEN sm.movement_type = 'IN' THEN sm.total_cost ELSE 0 END) as total_cost_in,
                 SUM(CASE WHEN sm.movement_type = 'OUT' THEN sm.total_cost ELSE 0 END) as total_cost_out
             FROM inventory_items i
-            LEFT JOIN stock_movements sm ON i.id = sm.item_id 
+            LEFT JOIN {movements_source} sm ON i.id = sm.item_id 
                 AND sm.created_at >= ?
                 AND sm.total_cost IS NOT NULL
             WHERE i.is_active = 1
         """, (date_from,), fetch_one=True)
         
         # By category breakdown
-        by_category = db.execute_query("""
+        by_category = db.execute_query(f"""
             SELECT c.name_en as category,
                 COUNT(i.id) as item_count,
                 SUM(i.current_value) as total_value,
                 SUM(CASE WHEN sm.movement_type = 'IN' THEN sm.total_cost ELSE 0 END) as cost_in
             FROM categories c
             JOIN inventory_items i ON c.id = i.category_id
-            LEFT JOIN stock_movements sm ON i.id = sm.item_id 
+            LEFT JOIN {movements_source} sm ON i.id = sm.item_id 
                 AND sm.created_at >= ?
                 AND sm.total_cost IS NOT NULL
             WHERE i.is_active = 1
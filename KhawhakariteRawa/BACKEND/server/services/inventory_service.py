@@ -5,9 +5,15 @@ Supports comprehensive inventory management features
 """
 
 import json
+import time
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime
 from ..database import db
+from ..events import publish_event
+from .archive_service import get_movement_source
+from .alert_service import evaluate_stock_alerts, publish_alerts
+from .due_date_scheduler import due_date_scheduler
+from .sequence_service import next_sku
 from ..models import (
     InventoryItemCreate, InventoryItemUpdate, StockMovementCreate,
     ProductVariantCreate, MovementType, ConditionStatus
@@ -222,12 +228,8 @@ def create_inventory_item(item: InventoryItemCreate, user_id: int):
             if category:
                 category_code = category['name_en'][:3].upper()
         
-        # Get next sequence number
-        last_item = db.execute_query(
-            "SELECT MAX(id) as max_id FROM inventory_items", fetch_one=True
-        )
-        next_id = (last_item['max_id'] or 0) + 1
-        sku = f"{category_code}-{next_id:04d}"
+        # Get next sequence number for the category code
+        sku = next_sku(category_code)
     
     # Create inventory item
     item_id = db.execute_query(
@@ -273,6 +275,7 @@ def create_inventory_item(item: InventoryItemCreate, user_id: int):
     
     # Check for low stock alert
     check_and_create_stock_alerts(item_id)
+    due_date_scheduler.refresh_item(item_id)
     
     # Get created item with all details
     return get_inventory_item_by_id(item_id)
@@ -334,6 +337,8 @@ def update_inventory_item(item_id: int, item_update: InventoryItemUpdate, user_i
     
     # Check for alerts
     check_and_create_stock_alerts(item_id)
+    if {'expiry_date', 'is_active'} & item_update.dict(exclude_unset=True).keys():
+        due_date_scheduler.refresh_item(item_id)
     
     return get_inventory_item_by_id(item_id)
 
@@ -357,6 +362,7 @@ def delete_inventory_item(item_id: int, user_id: int):
     
     # Log audit
     db.log_audit(user_id, "DELETE", "inventory_items", item_id, {}, {"is_active": False})
+    due_date_scheduler.refresh_item(item_id)
     
     return {"message": "Item successfully deactivated"}
 
@@ -406,6 +412,7 @@ def create_stock_movement(movement: StockMovementCreate, user_id: int):
     
     # Check for alerts
     check_and_create_stock_alerts(movement.item_id)
+    publish_stock_levels([movement.item_id], "stock_movement")
     
     return {"movement_id": movement_id, "message": "Stock movement created successfully"}
 
@@ -413,10 +420,10 @@ def create_stock_movement(movement: StockMovementCreate, user_id: int):
 def get_stock_movements(item_id: Optional[int] = None, days_back: int = 90, 
                        movement_type: Optional[str] = None, limit: int = 100):
     """Get stock movement history with filtering"""
-    query = """
+    query = f"""
         SELECT sm.*, i.name_en as item_name, u.first_name || ' ' || u.last_name as user_name,
                fl.name_en as from_location, tl.name_en as to_location
-        FROM stock_movements sm
+        FROM {get_movement_source(days_back)} sm
         JOIN inventory_items i ON sm.item_id = i.id
         JOIN users u ON sm.user_id = u.id
         LEFT JOIN locations fl ON sm.from_location_id = fl.id
@@ -491,71 +498,12 @@ def get_expiring_items(days_ahead: int = 30):
 
 def check_and_create_stock_alerts(item_id: int):
     """Check inventory levels and create alerts if needed"""
-    item = db.execute_query(
-        "SELECT * FROM inventory_items WHERE id = ?",
-        (item_id,), fetch_one=True
-    )
-    
-    if not item:
-        return
-    
-    alerts_to_create = []
-    
-    # Check low stock
-    if item['reorder_level'] > 0 and item['quantity'] <= item['reorder_level']:
-        if item['quantity'] == 0:
-            alerts_to_create.append({
-                'alert_type': 'OUT_OF_STOCK',
-                'threshold_value': 0,
-                'current_value': item['quantity'],
-                'message': f"Item '{item['name_en']}' is out of stock"
-            })
-        else:
-            alerts_to_create.append({
-                'alert_type': 'LOW_STOCK',
-                'threshold_value': item['reorder_level'],
-                'current_value': item['quantity'],
-                'message': f"Item '{item['name_en']}' is below reorder level ({item['quantity']} <= {item['reorder_level']})"
-            })
-    
-    # Check overstock
-    if item['max_stock_level'] > 0 and item['quantity'] > item['max_stock_level']:
-        alerts_to_create.append({
-            'alert_type': 'OVERSTOCK',
-            'threshold_value': item['max_stock_level'],
-            'current_value': item['quantity'],
-            'message': f"Item '{item['name_en']}' exceeds maximum stock level ({item['quantity']} > {item['max_stock_level']})"
-        })
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        alerts = evaluate_stock_alerts(cursor, [item_id])
+        conn.commit()
     
-    # Check expiry
-    if item['expiry_date']:
-        days_until_expiry = db.execute_query("""
-            SELECT (julianday(?) - julianday('now')) as days
-        """, (item['expiry_date'],), fetch_one=True)['days']
-        
-        if days_until_expiry <= 30:  # 30 days warning
-            alerts_to_create.append({
-                'alert_type': 'EXPIRY_WARNING',
-                'threshold_value': 30,
-                'current_value': days_until_expiry,
-                'message': f"Item '{item['name_en']}' expires in {int(days_until_expiry)} days"
-            })
-    
-    # Create alerts
-    for alert_data in alerts_to_create:
-        # Check if similar alert already exists and is active
-        existing = db.execute_query("""
-            SELECT id FROM stock_alerts 
-            WHERE item_id = ? AND alert_type = ? AND is_active = 1
-        """, (item_id, alert_data['alert_type']), fetch_one=True)
-        
-        if not existing:
-            db.execute_query("""
-                INSERT INTO stock_alerts 
-                (item_id, alert_type, threshold_value, current_value, message, is_active)
-                VALUES (?, ?, ?, ?, ?, 1)
-            """, (item_id, alert_data['alert_type'], alert_data['threshold_value'],
-                  alert_data['current_value'], alert_data['message']))
+    publish_alerts(alerts)
 
 
 def get_active_stock_alerts():
@@ -577,80 +525,185 @@ def acknowledge_stock_alert(alert_id: int, user_id: int):
         SET is_active = 0, acknowledged_by = ?, acknowledged_at = CURRENT_TIMESTAMP
         WHERE id = ?
     """, (user_id, alert_id))
+    publish_event("alert", action="acknowledged", alert_id=alert_id)
     
     return {"message": "Alert acknowledged successfully"}
 
 
-def bulk_stock_adjustment(adjustments: List[Dict], reason: str, notes: str, user_id: int):
-    """Perform bulk stock adjustments"""
-    results = []
+def publish_stock_levels(item_ids: List[int], source: str, alerts_created: int = 0):
+    """Publish the committed on-hand quantities of changed items to the event bus"""
+    if not item_ids:
+        return
+    
+    items = db.execute_query("""
+        SELECT i.id as item_id, i.quantity
+        FROM inventory_items i
+        WHERE i.id IN (SELECT value FROM json_each(?))
+    """, (json.dumps(sorted(set(item_ids))),), fetch_all=True)
+    publish_event("stock", source=source, items=items)
+    
+    # Set-based alert rules only report a count, so clients refetch alerts
+    if alerts_created:
+        publish_event("alert", action="created", item_ids=sorted(set(item_ids)),
+                      count=alerts_created)
+
+
+def create_stock_alerts_bulk(cursor, item_ids: List[int]):
+    """Evaluate stock alert rules for many items with set-based statements"""
+    return len(evaluate_stock_alerts(cursor, item_ids))
+
+
+def _is_whole_number(value) -> bool:
+    """Whole numbers only; bool is an int subclass and is rejected"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def bulk_stock_adjustment(adjustments: List[Dict], reason: str, notes: Optional[str], user_id: int):
+    """Perform bulk stock adjustments with set-based statements"""
+    started = time.perf_counter()
+    results = [None] * len(adjustments)
+    staged = []
+    seen = set()
     
-    for adjustment in adjustments:
+    # Reject malformed lines before touching the database
+    for line, adjustment in enumerate(adjustments):
         item_id = adjustment.get('item_id')
         new_quantity = adjustment.get('new_quantity')
         
-        # Get current quantity
-        current = db.execute_query(
-            "SELECT quantity FROM inventory_items WHERE id = ?",
-            (item_id,), fetch_one=True
+        if not item_id or new_quantity is None:
+            results[line] = {"item_id": item_id, "error": "Missing item_id or new_quantity"}
+        elif not _is_whole_number(item_id) or not _is_whole_number(new_quantity):
+            results[line] = {"item_id": item_id, "error": "item_id and new_quantity must be whole numbers"}
+        elif new_quantity < 0:
+            results[line] = {"item_id": item_id, "error": "new_quantity cannot be negative"}
+        elif item_id in seen:
+            results[line] = {"item_id": item_id, "error": "Duplicate item_id in adjustment"}
+        else:
+            seen.add(item_id)
+            staged.append((line, item_id, new_quantity))
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Take the write lock before reading so the diff matches what is applied
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        # Load the adjustments into a temp table and diff them in one join
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS bulk_adjustments (
+                line INTEGER PRIMARY KEY,
+                item_id INTEGER NOT NULL UNIQUE,
+                new_quantity INTEGER NOT NULL
+            )
+        """)
+        cursor.execute("DELETE FROM temp.bulk_adjustments")
+        cursor.executemany(
+            "INSERT INTO temp.bulk_adjustments (line, item_id, new_quantity) VALUES (?, ?, ?)",
+            staged
         )
         
-        if not current:
-            results.append({"item_id": item_id, "error": "Item not found"})
-            continue
+        diff = cursor.execute("""
+            SELECT b.line, b.item_id, b.new_quantity, i.quantity as old_quantity
+            FROM temp.bulk_adjustments b
+            LEFT JOIN inventory_items i ON i.id = b.item_id AND i.is_active = 1
+        """).fetchall()
         
-        quantity_diff = new_quantity - current['quantity']
+        last_movement_id = cursor.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM stock_movements"
+        ).fetchone()[0]
         
-        if quantity_diff != 0:
-            # Create stock movement
-            db.create_stock_movement(
-                item_id=item_id,
-                movement_type=MovementType.ADJUSTMENT,
-                quantity=quantity_diff,
-                user_id=user_id,
-                reference_type='bulk_adjustment',
-                reason=reason,
-                notes=notes
+        # Apply every change with one INSERT...SELECT and one UPDATE...FROM
+        cursor.execute("""
+            INSERT INTO stock_movements (
+                item_id, movement_type, quantity, from_location_id,
+                reference_type, user_id, reason, notes
             )
-            
-            results.append({
-                "item_id": item_id, 
-                "old_quantity": current['quantity'],
-                "new_quantity": new_quantity,
-                "adjustment": quantity_diff,
+            SELECT b.item_id, ?, b.new_quantity - i.quantity, i.location_id,
+                   'bulk_adjustment', ?, ?, ?
+            FROM temp.bulk_adjustments b
+            JOIN inventory_items i ON i.id = b.item_id
+            WHERE i.is_active = 1 AND b.new_quantity != i.quantity
+            ORDER BY b.line
+        """, (MovementType.ADJUSTMENT.value, user_id, reason, notes))
+        
+        cursor.execute("""
+            UPDATE inventory_items
+            SET quantity = b.new_quantity, updated_at = CURRENT_TIMESTAMP
+            FROM temp.bulk_adjustments b
+            WHERE b.item_id = inventory_items.id AND inventory_items.is_active = 1
+            AND b.new_quantity != inventory_items.quantity
+        """)
+        
+        movement_ids = dict(cursor.execute("""
+            SELECT item_id, id FROM stock_movements
+            WHERE id > ? AND reference_type = 'bulk_adjustment'
+        """, (last_movement_id,)).fetchall())
+        
+        # Alerts are evaluated once for the whole batch
+        changed = [row['item_id'] for row in diff
+                   if row['old_quantity'] is not None and row['old_quantity'] != row['new_quantity']]
+        alerts_created = create_stock_alerts_bulk(cursor, changed)
+        
+        cursor.execute("DELETE FROM temp.bulk_adjustments")
+        conn.commit()
+    
+    for row in diff:
+        if row['old_quantity'] is None:
+            results[row['line']] = {"item_id": row['item_id'], "error": "Item not found"}
+        elif row['old_quantity'] == row['new_quantity']:
+            results[row['line']] = {
+                "item_id": row['item_id'],
+                "message": "No change required",
                 "success": True
-            })
-            
-            # Check alerts
-            check_and_create_stock_alerts(item_id)
+            }
         else:
-            results.append({
-                "item_id": item_id,
-                "message": "No change required",
+            results[row['line']] = {
+                "item_id": row['item_id'],
+                "old_quantity": row['old_quantity'],
+                "new_quantity": row['new_quantity'],
+                "adjustment": row['new_quantity'] - row['old_quantity'],
+                "movement_id": movement_ids.get(row['item_id']),
                 "success": True
-            })
+            }
+    
+    if changed:
+        db.log_audit(user_id, "UPDATE", "inventory_items", None, {}, {
+            "bulk_adjustment": len(changed),
+            "reason": reason
+        })
+        publish_stock_levels(changed, "bulk_adjustment", alerts_created)
     
-    return {"results": results, "total_processed": len(adjustments)}
+    elapsed = time.perf_counter() - started
+    return {
+        "results": results,
+        "total_processed": len(adjustments),
+        "adjusted": len(changed),
+        "alerts_created": alerts_created,
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "rows_per_second": round(len(adjustments) / elapsed, 1) if elapsed > 0 else None
+    }
 
 
 def get_inventory_summary():
     """Get comprehensive inventory summary"""
     summary = {}
     
-    # Basic counts
-    summary['total_items'] = db.execute_query(
-        "SELECT COUNT(*) as count FROM inventory_items WHERE is_active = 1",
-        fetch_one=True
-    )['count']
-    
-    summary['total_value'] = db.execute_query(
-        "SELECT SUM(current_value) as total FROM inventory_items WHERE is_active = 1",
-        fetch_one=True
-    )['total'] or 0
-    
-    summary['low_stock_items'] = len(get_low_stock_items())
-    summary['out_of_stock_items'] = len(get_out_of_stock_items())
-    summary['expiring_items'] = len(get_expiring_items())
+    # Basic counts from the trigger-maintained metric counters
+    counters = db.get_counters(
+        'inventory_items.active', 'inventory_items.active_value',
+        'inventory_items.low_stock', 'inventory_items.out_of_stock'
+    )
+    summary['total_items'] = counters['inventory_items.active']
+    summary['total_value'] = counters['inventory_items.active_value']
+    summary['low_stock_items'] = counters['inventory_items.low_stock']
+    summary['out_of_stock_items'] = counters['inventory_items.out_of_stock']
+    
+    # Expiry depends on the current date, so it is counted on demand
+    summary['expiring_items'] = db.execute_query("""
+        SELECT COUNT(*) as count FROM inventory_items
+        WHERE is_active = 1 AND expiry_date IS NOT NULL
+          AND julianday(expiry_date) - julianday('now') BETWEEN 0 AND 30
+    """, fetch_one=True)['count']
     
     # By category
     summary['by_category'] = db.execute_query("""
@@ -5,8 +5,10 @@ Handles purchase orders, goods receiving, and supplier management
 """
 
 from typing import Optional, List
-from datetime import date, datetime
+from datetime import date
 from ..database import db
+from .due_date_scheduler import due_date_scheduler
+from .sequence_service import next_document_number
 from ..models import (
     PurchaseOrderCreate, PurchaseOrderUpdate, PurchaseOrderStatus,
     MovementType
@@ -14,26 +16,8 @@ from ..models import (
 
 
 def generate_po_number():
-    """Generate a unique purchase order number"""
-    # Get the latest PO number
-    latest_po = db.execute_query(
-        "SELECT po_number FROM purchase_orders ORDER BY id DESC LIMIT 1",
-        fetch_one=True
-    )
-    
-    if latest_po and latest_po['po_number']:
-        # Extract number from format PO-YYYY-NNNN
-        try:
-            last_number = int(latest_po['po_number'].split('-')[-1])
-            next_number = last_number + 1
-        except:
-            next_number = 1
-    else:
-        next_number = 1
-    
-    # Format: PO-YYYY-NNNN
-    current_year = datetime.now().year
-    return f"PO-{current_year}-{next_number:04d}"
+    """Generate a unique purchase order number (PO-YYYY-NNNN)"""
+    return next_document_number("PO")
 
 
 def create_purchase_order(po_data: PurchaseOrderCreate, user_id: int):
@@ -266,7 +250,7 @@ def create_goods_received_note(po_id: int, received_items: List[dict], user_id:
         return {"error": "Purchase order not found or not confirmed"}
     
     # Generate GRN number
-    grn_number = f"GRN-{datetime.now().strftime('%Y%m%d')}-{po_id:04d}"
+    grn_number = next_document_number("GRN")
     
     # Create GRN
     grn_id = db.execute_query(
@@ -346,6 +330,8 @@ def create_goods_received_note(po_id: int, received_items: List[dict], user_id:
                     f"UPDATE inventory_items SET {', '.join(update_fields)} WHERE id = ?",
                     tuple(update_params)
                 )
+                if expiry_date:
+                    due_date_scheduler.refresh_item(po_item['item_id'])
             
             # Update inventory valuation
             db.update_inventory_valuation(po_item['item_id'], 'AVERAGE')
@@ -423,21 +409,13 @@ def get_purchase_order_summary():
     """Get purchase order summary statistics"""
     summary = {}
     
-    # Basic counts
-    summary['total_orders'] = db.execute_query(
-        "SELECT COUNT(*) as count FROM purchase_orders",
-        fetch_one=True
-    )['count']
-    
-    summary['pending_orders'] = db.execute_query(
-        "SELECT COUNT(*) as count FROM purchase_orders WHERE status IN ('DRAFT', 'SENT', 'CONFIRMED')",
-        fetch_one=True
-    )['count']
-    
-    summary['total_value'] = db.execute_query(
-        "SELECT SUM(total_amount) as total FROM purchase_orders WHERE status != 'CANCELLED'",
-        fetch_one=True
-    )['total'] or 0
+    # Basic counts from the trigger-maintained metric counters
+    counters = db.get_counters(
+        'purchase_orders.total', 'purchase_orders.pending', 'purchase_orders.value'
+    )
+    summary['total_orders'] = counters['purchase_orders.total']
+    summary['pending_orders'] = counters['purchase_orders.pending']
+    summary['total_value'] = counters['purchase_orders.value']
     
     # By status
     summary['by_status'] = db.execute_query("""
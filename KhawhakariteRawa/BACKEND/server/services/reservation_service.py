@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Stock reservation ledger for Kaiwhakarite Rawa
+Keeps short-lived holds on stock in memory and writes their totals behind
+to inventory_items.reserved_quantity, so available-to-promise is a
+constant-time read on top of the item row a caller already has
+"""
+
+import json
+import time
+import uuid
+import heapq
+import asyncio
+import logging
+import threading
+from typing import Optional, Dict, List, Tuple
+from ..database import db
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+BOOKING_HOLD_PREFIX = "booking:"
+
+
+def booking_hold_id(booking_id: int) -> str:
+    """Ledger key for the hold a new booking places on today's stock"""
+    return f"{BOOKING_HOLD_PREFIX}{booking_id}"
+
+
+def is_booking_hold(hold_id: str) -> bool:
+    """True for holds owned by a booking rather than a stock-out"""
+    return hold_id.startswith(BOOKING_HOLD_PREFIX)
+
+
+class ReservationLedger:
+    """TTL holds per item, flushed write-behind into reserved_quantity"""
+
+    def __init__(self):
+        # hold_id -> (item_id, quantity, expires_at, user_id)
+        self._holds: Dict[str, Tuple[int, int, float, Optional[int]]] = {}
+        # Live held units per item, and how many of them reserved_quantity
+        # already includes; the difference is what the next flush writes
+        self._held: Dict[int, int] = {}
+        self._persisted: Dict[int, int] = {}
+        self._dirty: set = set()
+        # (expires_at, hold_id) min-heap; entries for released holds are stale
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.RLock()
+        self.evicted = 0
+        self.flushes = 0
+
+    def _adjust(self, item_id: int, delta: int):
+        self._held[item_id] = self._held.get(item_id, 0) + delta
+        if not self._held[item_id]:
+            del self._held[item_id]
+        self._dirty.add(item_id)
+
+    def _evict(self, now: float):
+        """Drop every hold whose TTL has passed"""
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, hold_id = heapq.heappop(self._expiry)
+            hold = self._holds.get(hold_id)
+            if hold is None or hold[2] != expires_at:
+                continue
+            del self._holds[hold_id]
+            self._adjust(hold[0], -hold[1])
+            self.evicted += 1
+
+    def _unflushed(self, item_id: int) -> int:
+        return self._held.get(item_id, 0) - self._persisted.get(item_id, 0)
+
+    def available_to_promise(self, item: dict, exclude_hold_id: Optional[str] = None,
+                             user_id: Optional[int] = None) -> int:
+        """Units of an item free to promise now: quantity - reserved, net of live holds
+
+        item is an inventory_items row; its reserved_quantity already covers
+        approved bookings and every flushed hold, so only this process's
+        unflushed changes are applied on top of it. exclude_hold_id only
+        counts if that hold is on this item and, given user_id, is theirs.
+        """
+        with self._lock:
+            self._evict(time.time())
+            available = (item['quantity'] - (item['reserved_quantity'] or 0)
+                         - self._unflushed(item['id']))
+
+            available += self._own_hold(item['id'], exclude_hold_id, user_id)
+        return max(available, 0)
+
+    def _own_hold(self, item_id: int, hold_id: Optional[str], user_id: Optional[int] = None) -> int:
+        hold = self._holds.get(hold_id)
+        if not hold or hold[0] != item_id or (user_id is not None and hold[3] != user_id):
+            return 0
+        return hold[1]
+
+    def units_held(self, item_id: int, exclude_hold_id: Optional[str] = None) -> int:
+        """Units of an item under live holds in this process"""
+        with self._lock:
+            self._evict(time.time())
+            return self._held.get(item_id, 0) - self._own_hold(item_id, exclude_hold_id)
+
+    def try_hold(self, item: dict, quantity: int, ttl_seconds: Optional[int] = None,
+                 hold_id: Optional[str] = None, capacity: Optional[int] = None,
+                 user_id: Optional[int] = None) -> dict:
+        """Hold units of an item if enough are free to promise
+
+        capacity replaces quantity - reserved for callers with their own,
+        date-aware figure for units free before holds; live holds still
+        come off it.
+        """
+        ttl = ttl_seconds or settings.reservations.HOLD_TTL_SECONDS
+
+        with self._lock:
+            if capacity is None:
+                available = self.available_to_promise(item, exclude_hold_id=hold_id)
+            else:
+                available = max(capacity - self.units_held(item['id'], exclude_hold_id=hold_id), 0)
+            if available < quantity:
+                return {"error": f"Only {available} units available to promise",
+                        "available_to_promise": available}
+
+            if hold_id not in self._holds and len(self._holds) >= settings.reservations.MAX_HOLDS:
+                return {"error": "Too many open stock holds; try again shortly",
+                        "available_to_promise": available}
+
+            hold_id = hold_id or uuid.uuid4().hex
+            self.release(hold_id)
+            expires_at = time.time() + ttl
+            self._holds[hold_id] = (item['id'], quantity, expires_at, user_id)
+            heapq.heappush(self._expiry, (expires_at, hold_id))
+            self._adjust(item['id'], quantity)
+
+        return {
+            "hold_id": hold_id,
+            "item_id": item['id'],
+            "quantity": quantity,
+            "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(expires_at)),
+            "available_to_promise": available - quantity
+        }
+
+    def rekey(self, hold_id: str, new_hold_id: str):
+        """Move a hold to a new key once the record it guards has an id"""
+        with self._lock:
+            hold = self._holds.pop(hold_id, None)
+            if hold:
+                self._holds[new_hold_id] = hold
+                heapq.heappush(self._expiry, (hold[2], new_hold_id))
+
+    def release(self, hold_id: str) -> Optional[Tuple[int, int]]:
+        """Release a hold early; returns its (item_id, quantity) if it was live"""
+        with self._lock:
+            hold = self._holds.pop(hold_id, None)
+            if hold is None:
+                return None
+            self._adjust(hold[0], -hold[1])
+            return hold[0], hold[1]
+
+    def consume(self, hold_id: str, item_id: int, quantity: int, user_id: Optional[int] = None) -> int:
+        """Take units out of a hold once they have left stock; returns units taken
+
+        Only a hold on item_id (and, given user_id, theirs) is touched; any
+        units the stock-out did not use stay held.
+        """
+        with self._lock:
+            hold = self._holds.get(hold_id)
+            taken = min(self._own_hold(item_id, hold_id, user_id), max(quantity, 0))
+            if not taken:
+                return 0
+            if taken == hold[1]:
+                del self._holds[hold_id]
+            else:
+                self._holds[hold_id] = (hold[0], hold[1] - taken, hold[2], hold[3])
+            self._adjust(item_id, -taken)
+            return taken
+
+    def get_hold(self, hold_id: str) -> Optional[dict]:
+        """Get a live hold"""
+        with self._lock:
+            self._evict(time.time())
+            hold = self._holds.get(hold_id)
+        if hold is None:
+            return None
+        return {"hold_id": hold_id, "item_id": hold[0], "quantity": hold[1], "user_id": hold[3]}
+
+    def flush(self) -> int:
+        """Write held totals that changed since the last flush into reserved_quantity"""
+        with self._lock:
+            self._evict(time.time())
+            deltas = {item_id: self._unflushed(item_id) for item_id in self._dirty}
+            deltas = {item_id: delta for item_id, delta in deltas.items() if delta}
+            self._dirty = set()
+        if not deltas:
+            return 0
+
+        try:
+            with db.get_connection() as conn:
+                conn.execute("""
+                    UPDATE inventory_items
+                    SET reserved_quantity = MAX(COALESCE(reserved_quantity, 0) + (d.value ->> 1), 0)
+                    FROM json_each(?) d
+                    WHERE inventory_items.id = d.value ->> 0
+                """, (json.dumps([[item_id, delta] for item_id, delta in deltas.items()]),))
+                conn.commit()
+        except Exception:
+            with self._lock:
+                self._dirty.update(deltas)
+            raise
+
+        # Until this point readers still apply the deltas themselves, so a
+        # row read mid-flush can only under-promise, never over-promise
+        with self._lock:
+            for item_id, delta in deltas.items():
+                self._persisted[item_id] = self._persisted.get(item_id, 0) + delta
+                if not self._persisted[item_id]:
+                    del self._persisted[item_id]
+
+        self.flushes += 1
+        return len(deltas)
+
+    def release_all(self) -> int:
+        """Drop every hold and flush, so a stopping process leaves no reservations behind"""
+        with self._lock:
+            for item_id, quantity in list(self._held.items()):
+                self._adjust(item_id, -quantity)
+            self._holds = {}
+            self._expiry = []
+        return self.flush()
+
+    def stats(self) -> dict:
+        """Get ledger size for monitoring"""
+        with self._lock:
+            self._evict(time.time())
+            return {
+                "holds": len(self._holds),
+                "items_held": len(self._held),
+                "units_held": sum(self._held.values()),
+                "unflushed_items": len(self._dirty),
+                "evicted": self.evicted,
+                "flushes": self.flushes
+            }
+
+    async def run(self):
+        """Background task: evict expired holds and flush every RESERVATION_FLUSH_SECONDS"""
+        interval = settings.reservations.FLUSH_SECONDS
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                logger.error(f"Reservation flush failed: {e}")
+
+
+# Global reservation ledger instance
+reservation_ledger = ReservationLedger()
+
+
+def reconcile_reserved_quantities():
+    """Recompute reserved_quantity from approved bookings plus this process's holds
+
+    Repairs reservations left behind by a process that stopped without
+    flushing its release. Holds flushed by other worker processes are
+    dropped too, so run it when no other worker is holding stock.
+    """
+    reservation_ledger.flush()
+
+    with reservation_ledger._lock:
+        holds = json.dumps([[item_id, quantity]
+                            for item_id, quantity in reservation_ledger._persisted.items()])
+
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE inventory_items
+                SET reserved_quantity = COALESCE((
+                        SELECT SUM(b.quantity_requested) FROM bookings b
+                        WHERE b.item_id = inventory_items.id AND b.status = 'Approved'
+                    ), 0) + COALESCE((
+                        SELECT h.value ->> 1 FROM json_each(?) h
+                        WHERE h.value ->> 0 = inventory_items.id
+                    ), 0)
+                WHERE COALESCE(reserved_quantity, 0) != COALESCE((
+                        SELECT SUM(b.quantity_requested) FROM bookings b
+                        WHERE b.item_id = inventory_items.id AND b.status = 'Approved'
+                    ), 0) + COALESCE((
+                        SELECT h.value ->> 1 FROM json_each(?) h
+                        WHERE h.value ->> 0 = inventory_items.id
+                    ), 0)
+                RETURNING id
+            """, (holds, holds))
+            corrected = [row['id'] for row in cursor.fetchall()]
+            conn.commit()
+
+    return {"items_corrected": len(corrected), "item_ids": corrected}
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Document sequence service for Kaiwhakarite Rawa
+Allocates document numbers from named counters in document_sequences,
+handing each process a block of numbers at a time
+"""
+
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from ..database import db
+from ..config import settings
+
+
+# Document prefix -> (table, column) holding the numbers already issued,
+# used to start a new counter above them
+DOCUMENT_SEQUENCES = {
+    "PO": ("purchase_orders", "po_number"),
+    "GRN": ("goods_received_notes", "grn_number"),
+    "TRF": ("transfer_documents", "document_number"),
+}
+
+SKU_SOURCE = ("inventory_items", "sku")
+
+
+def allocate_sequence_value(cursor, name: str, count: int = 1) -> int:
+    """Take the next count values of a named sequence inside the caller's transaction
+
+    Returns the first value taken; the counter must already exist.
+    """
+    # Concurrent writers are serialised by SQLite's write lock
+    row = cursor.execute("""
+        UPDATE document_sequences
+        SET next_value = next_value + ?, updated_at = CURRENT_TIMESTAMP
+        WHERE name = ?
+        RETURNING next_value - ?
+    """, (count, name, count)).fetchone()
+    return row[0] if row else None
+
+
+def _seed_sequence(cursor, name: str, source: Optional[Tuple[str, str]], number_prefix: str):
+    """Create a counter starting above the highest number already issued with its prefix"""
+    start = 1
+    table_exists = source and cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (source[0],)
+    ).fetchone()
+
+    if table_exists:
+        table, column = source
+        # Only all-digit suffixes count, so other formats sharing the
+        # prefix are ignored
+        cursor.execute(f"""
+            SELECT COALESCE(MAX(CAST(substr({column}, ?) AS INTEGER)), 0) + 1
+            FROM {table}
+            WHERE substr({column}, 1, ?) = ?
+            AND substr({column}, ?) != '' AND substr({column}, ?) NOT GLOB '*[^0-9]*'
+        """, (len(number_prefix) + 1, len(number_prefix), number_prefix,
+              len(number_prefix) + 1, len(number_prefix) + 1))
+        start = cursor.fetchone()[0]
+
+    cursor.execute("""
+        INSERT INTO document_sequences (name, next_value) VALUES (?, ?)
+        ON CONFLICT(name) DO NOTHING
+    """, (name, start))
+
+
+class SequenceAllocator:
+    """Per-process blocks of sequence values, so most numbers cost no database write
+
+    Numbers are unique across processes but not gapless: a block left
+    partly unused when a process stops is never handed out again.
+    """
+
+    def __init__(self, block_size: int):
+        self.block_size = max(block_size, 1)
+        # name -> [next value, end of block (exclusive)]
+        self._blocks: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.blocks_reserved = 0
+
+    def _reserve_block(self, name: str, source: Optional[Tuple[str, str]],
+                       number_prefix: str) -> int:
+        """Take a block from the counter in its own short transaction"""
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            # Take the write lock first so seeding and reserving can't interleave
+            cursor.execute("BEGIN IMMEDIATE")
+            start = allocate_sequence_value(cursor, name, self.block_size)
+            if start is None:
+                _seed_sequence(cursor, name, source, number_prefix)
+                start = allocate_sequence_value(cursor, name, self.block_size)
+            conn.commit()
+
+        self.blocks_reserved += 1
+        return start
+
+    def next_value(self, name: str, source: Optional[Tuple[str, str]] = None,
+                   number_prefix: str = "") -> int:
+        """Issue the next value of a sequence
+
+        Call it before opening a write transaction: refilling the block
+        needs SQLite's write lock on a separate connection.
+        """
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                start = self._reserve_block(name, source, number_prefix)
+                block = self._blocks[name] = [start, start + self.block_size]
+
+            value = block[0]
+            block[0] += 1
+            self.issued += 1
+            return value
+
+    def stats(self) -> dict:
+        """Get block usage for monitoring"""
+        with self._lock:
+            return {
+                "block_size": self.block_size,
+                "issued": self.issued,
+                "blocks_reserved": self.blocks_reserved,
+                "sequences": {name: {"next_value": block[0], "block_end": block[1]}
+                              for name, block in self._blocks.items()}
+            }
+
+
+# Global sequence allocator instance
+sequence_allocator = SequenceAllocator(block_size=settings.sequences.BLOCK_SIZE)
+
+
+def format_document_number(prefix: str, value: int, year: Optional[int] = None) -> str:
+    """Format a document number as PREFIX-YYYY-NNNN"""
+    return f"{prefix}-{year or datetime.now().year}-{value:04d}"
+
+
+def next_document_number(prefix: str) -> str:
+    """Issue the next PREFIX-YYYY-NNNN number; numbering restarts each year"""
+    year = datetime.now().year
+    name = f"{prefix}-{year}"
+    value = sequence_allocator.next_value(name, DOCUMENT_SEQUENCES.get(prefix), f"{name}-")
+    return format_document_number(prefix, value, year)
+
+
+def next_sku(category_code: str) -> str:
+    """Issue the next generated SKU for a category code, as CODE-NNNN"""
+    value = sequence_allocator.next_value(f"SKU-{category_code}", SKU_SOURCE, f"{category_code}-")
+    return f"{category_code}-{value:04d}"
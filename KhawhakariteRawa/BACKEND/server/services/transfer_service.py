@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Stock transfer service for Kaiwhakarite Rawa
+Moves stock between locations through request, approve, dispatch and receive
+"""
+
+from typing import Optional, List, Dict
+from ..database import db
+from ..models import StockTransferCreate, TransferStatus, MovementType
+from .inventory_service import create_stock_alerts_bulk, publish_stock_levels
+from .sequence_service import next_document_number
+
+
+TRANSFER_SEQUENCE = "TRF"
+
+
+def _get_transfer_lines(cursor, document_id: int) -> List[Dict]:
+    """Get the lines of a transfer document joined to current stock"""
+    return cursor.execute("""
+        SELECT st.id, st.item_id, st.quantity, i.name_en as item_name,
+               i.quantity as on_hand, i.location_id as item_location_id
+        FROM stock_transfers st
+        JOIN inventory_items i ON st.item_id = i.id
+        WHERE st.document_id = ?
+        ORDER BY st.id
+    """, (document_id,)).fetchall()
+
+
+def _set_status(cursor, document_id: int, from_status: TransferStatus, to_status: TransferStatus,
+                user_id: int, user_field: Optional[str], timestamp_field: str,
+                stamp_lines: bool = False):
+    """Move a document and its lines between states; False if another request got there first"""
+    stamps = f"{timestamp_field} = CURRENT_TIMESTAMP"
+    params = [to_status.value]
+    if user_field:
+        stamps += f", {user_field} = ?"
+        params.append(user_id)
+    
+    # The status guard in the WHERE clause makes each transition happen once
+    cursor.execute(f"""
+        UPDATE transfer_documents
+        SET status = ?, {stamps}, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND status = ?
+    """, (*params, document_id, from_status.value))
+    
+    if cursor.rowcount == 0:
+        return False
+    
+    cursor.execute(f"""
+        UPDATE stock_transfers
+        SET status = ?{", " + stamps if stamp_lines else ""}, updated_at = CURRENT_TIMESTAMP
+        WHERE document_id = ?
+    """, (*(params if stamp_lines else params[:1]), document_id))
+    return True
+
+
+def _post_movements(cursor, document: Dict, movement_type: MovementType, user_id: int):
+    """Post one movement per transfer line with a single INSERT...SELECT"""
+    cursor.execute("""
+        INSERT INTO stock_movements (
+            item_id, movement_type, quantity, from_location_id, to_location_id,
+            reference_id, reference_type, user_id, reason, notes
+        )
+        SELECT st.item_id, ?, st.quantity, ?, ?, ?, 'stock_transfer', ?, ?, ?
+        FROM stock_transfers st
+        WHERE st.document_id = ?
+        ORDER BY st.id
+    """, (movement_type.value, document['from_location_id'], document['to_location_id'],
+          document['id'], user_id, document['reason'],
+          f"Transfer {document['document_number']}", document['id']))
+
+
+def create_transfer(transfer_data: StockTransferCreate, user_id: int):
+    """Request a transfer document covering one or more items"""
+    if transfer_data.from_location_id == transfer_data.to_location_id:
+        return {"error": "Source and destination locations must differ"}
+    
+    locations = db.execute_query(
+        "SELECT id FROM locations WHERE id IN (?, ?)",
+        (transfer_data.from_location_id, transfer_data.to_location_id), fetch_all=True
+    )
+    if len(locations) != 2:
+        return {"error": "Location not found"}
+    
+    # Validate every line against one read of the referenced items
+    item_ids = [line.item_id for line in transfer_data.items]
+    if len(set(item_ids)) != len(item_ids):
+        return {"error": "Each item may appear only once per transfer"}
+    
+    placeholders = ", ".join("?" for _ in item_ids)
+    items = {
+        row['id']: row for row in db.execute_query(f"""
+            SELECT id, name_en, quantity, location_id
+            FROM inventory_items
+            WHERE id IN ({placeholders}) AND is_active = 1
+        """, tuple(item_ids), fetch_all=True)
+    }
+    
+    line_errors = []
+    for line in transfer_data.items:
+        item = items.get(line.item_id)
+        if not item:
+            line_errors.append({"item_id": line.item_id, "error": "Item not found or inactive"})
+        elif item['location_id'] != transfer_data.from_location_id:
+            line_errors.append({"item_id": line.item_id, "error": "Item is not held at the source location"})
+        elif item['quantity'] < line.quantity:
+            line_errors.append({
+                "item_id": line.item_id,
+                "error": f"Insufficient stock. Available: {item['quantity']}, Requested: {line.quantity}"
+            })
+    
+    if line_errors:
+        return {"error": "Transfer has invalid lines", "lines": line_errors}
+    
+    document_number = next_document_number(TRANSFER_SEQUENCE)
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            INSERT INTO transfer_documents (
+                document_number, from_location_id, to_location_id, status,
+                transfer_date, requested_by, reason, notes
+            ) VALUES (?, ?, ?, ?, COALESCE(?, date('now')), ?, ?, ?)
+        """, (document_number, transfer_data.from_location_id, transfer_data.to_location_id,
+              TransferStatus.PENDING.value, transfer_data.transfer_date, user_id,
+              transfer_data.reason, transfer_data.notes))
+        document_id = cursor.lastrowid
+        
+        cursor.executemany("""
+            INSERT INTO stock_transfers (
+                transfer_number, document_id, item_id, from_location_id, to_location_id,
+                quantity, transfer_date, status, requested_by, reason, notes
+            ) VALUES (?, ?, ?, ?, ?, ?, COALESCE(?, date('now')), ?, ?, ?, ?)
+        """, [
+            (f"{document_number}/{number:03d}", document_id, line.item_id,
+             transfer_data.from_location_id, transfer_data.to_location_id, line.quantity,
+             transfer_data.transfer_date, TransferStatus.PENDING.value, user_id,
+             transfer_data.reason, line.notes)
+            for number, line in enumerate(transfer_data.items, start=1)
+        ])
+        
+        conn.commit()
+    
+    db.log_audit(user_id, "CREATE", "transfer_documents", document_id, {}, transfer_data.dict())
+    
+    return get_transfer_by_id(document_id)
+
+
+def approve_transfer(document_id: int, user_id: int):
+    """Approve a pending transfer"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        if not _set_status(cursor, document_id, TransferStatus.PENDING, TransferStatus.APPROVED,
+                           user_id, "approved_by", "approved_at", stamp_lines=True):
+            return {"error": "Transfer not found or not pending"}
+        
+        conn.commit()
+    
+    db.log_audit(user_id, "UPDATE", "transfer_documents", document_id, {},
+                 {"status": TransferStatus.APPROVED.value})
+    return get_transfer_by_id(document_id)
+
+
+def dispatch_transfer(document_id: int, user_id: int):
+    """Dispatch an approved transfer, posting the OUT movements for every line"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Take the write lock before checking stock, so nothing can move it
+        # between the check and the decrement
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        document = cursor.execute(
+            "SELECT * FROM transfer_documents WHERE id = ?", (document_id,)
+        ).fetchone()
+        if not document or document['status'] != TransferStatus.APPROVED.value:
+            return {"error": "Transfer not found or not approved"}
+        
+        # Stock may have moved since the request, so re-check it now
+        short = [
+            {"item_id": line['item_id'],
+             "error": f"Insufficient stock. Available: {line['on_hand']}, Requested: {line['quantity']}"}
+            for line in _get_transfer_lines(cursor, document_id)
+            if line['on_hand'] < line['quantity']
+        ]
+        if short:
+            return {"error": "Transfer has lines without enough stock", "lines": short}
+        
+        if not _set_status(cursor, document_id, TransferStatus.APPROVED, TransferStatus.IN_TRANSIT,
+                           user_id, "dispatched_by", "dispatched_at"):
+            return {"error": "Transfer not found or not approved"}
+        
+        _post_movements(cursor, document, MovementType.OUT, user_id)
+        
+        cursor.execute("""
+            UPDATE inventory_items
+            SET quantity = inventory_items.quantity - st.quantity, updated_at = CURRENT_TIMESTAMP
+            FROM stock_transfers st
+            WHERE st.document_id = ? AND st.item_id = inventory_items.id
+        """, (document_id,))
+        
+        item_ids = [line['item_id'] for line in _get_transfer_lines(cursor, document_id)]
+        conn.commit()
+    
+    publish_stock_levels(item_ids, "transfer_dispatch")
+    db.log_audit(user_id, "UPDATE", "transfer_documents", document_id, {},
+                 {"status": TransferStatus.IN_TRANSIT.value})
+    return get_transfer_by_id(document_id)
+
+
+def receive_transfer(document_id: int, user_id: int):
+    """Receive an in-transit transfer, posting the IN movements for every line"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        document = cursor.execute(
+            "SELECT * FROM transfer_documents WHERE id = ?", (document_id,)
+        ).fetchone()
+        if not document or document['status'] != TransferStatus.IN_TRANSIT.value:
+            return {"error": "Transfer not found or not in transit"}
+        
+        if not _set_status(cursor, document_id, TransferStatus.IN_TRANSIT, TransferStatus.RECEIVED,
+                           user_id, "received_by", "completed_at", stamp_lines=True):
+            return {"error": "Transfer not found or not in transit"}
+        
+        _post_movements(cursor, document, MovementType.IN, user_id)
+        
+        # Items track a single location, so an item follows the transfer only
+        # when its whole stock was dispatched; partial transfers stay put
+        cursor.execute("""
+            UPDATE inventory_items
+            SET quantity = inventory_items.quantity + st.quantity,
+                location_id = CASE WHEN inventory_items.quantity = 0
+                                   THEN st.to_location_id ELSE inventory_items.location_id END,
+                updated_at = CURRENT_TIMESTAMP
+            FROM stock_transfers st
+            WHERE st.document_id = ? AND st.item_id = inventory_items.id
+        """, (document_id,))
+        
+        item_ids = [line['item_id'] for line in _get_transfer_lines(cursor, document_id)]
+        alerts_created = create_stock_alerts_bulk(cursor, item_ids)
+        
+        conn.commit()
+    
+    publish_stock_levels(item_ids, "transfer_receive", alerts_created)
+    db.log_audit(user_id, "UPDATE", "transfer_documents", document_id, {},
+                 {"status": TransferStatus.RECEIVED.value})
+    return get_transfer_by_id(document_id)
+
+
+def cancel_transfer(document_id: int, user_id: int):
+    """Cancel a transfer that has not been dispatched"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        for from_status in (TransferStatus.PENDING, TransferStatus.APPROVED):
+            if _set_status(cursor, document_id, from_status, TransferStatus.CANCELLED,
+                           user_id, None, "completed_at"):
+                break
+        else:
+            return {"error": "Transfer not found or already dispatched"}
+        
+        conn.commit()
+    
+    db.log_audit(user_id, "UPDATE", "transfer_documents", document_id, {},
+                 {"status": TransferStatus.CANCELLED.value})
+    return get_transfer_by_id(document_id)
+
+
+def get_transfers(skip: int = 0, limit: int = 100, status: Optional[str] = None,
+                  location_id: Optional[int] = None):
+    """Get transfer documents with filtering"""
+    query = """
+        SELECT td.*, fl.name_en as from_location_name, tl.name_en as to_location_name,
+               u.first_name || ' ' || u.last_name as requested_by_name,
+               (SELECT COUNT(*) FROM stock_transfers st WHERE st.document_id = td.id) as line_count,
+               (SELECT SUM(st.quantity) FROM stock_transfers st WHERE st.document_id = td.id) as total_quantity
+        FROM transfer_documents td
+        JOIN locations fl ON td.from_location_id = fl.id
+        JOIN locations tl ON td.to_location_id = tl.id
+        JOIN users u ON td.requested_by = u.id
+        WHERE 1=1
+    """
+    params = []
+    
+    if status:
+        query += " AND td.status = ?"
+        params.append(status)
+    
+    if location_id:
+        query += " AND (td.from_location_id = ? OR td.to_location_id = ?)"
+        params.extend([location_id, location_id])
+    
+    query += " ORDER BY td.created_at DESC, td.id DESC LIMIT ? OFFSET ?"
+    params.extend([limit, skip])
+    
+    return {
+        "transfers": db.execute_query(query, tuple(params), fetch_all=True),
+        "skip": skip,
+        "limit": limit
+    }
+
+
+def get_transfer_by_id(document_id: int):
+    """Get a transfer document with its lines"""
+    document = db.execute_query("""
+        SELECT td.*, fl.name_en as from_location_name, tl.name_en as to_location_name
+        FROM transfer_documents td
+        JOIN locations fl ON td.from_location_id = fl.id
+        JOIN locations tl ON td.to_location_id = tl.id
+        WHERE td.id = ?
+    """, (document_id,), fetch_one=True)
+    
+    if not document:
+        return None
+    
+    lines = db.execute_query("""
+        SELECT st.*, i.name_en as item_name, i.sku
+        FROM stock_transfers st
+        JOIN inventory_items i ON st.item_id = i.id
+        WHERE st.document_id = ?
+        ORDER BY st.id
+    """, (document_id,), fetch_all=True)
+    
+    return {**document, "items": lines}
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Background valuation jobs for Kaiwhakarite Rawa
+Runs full valuations in a process pool, partitioned by item id range,
+with progress, cancellation and results cached per data version
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Optional, List
+
+from ..database import db
+from ..config import settings
+from .valuation_service import value_inventory, is_closed_period_end, get_inventory_valuation
+
+logger = logging.getLogger(__name__)
+
+# Tables whose changes invalidate a cached valuation
+VALUATION_TABLES = ('inventory_items', 'stock_movements')
+
+
+def _value_partition(method: str, as_of_date: date, item_ids: List[int]):
+    """Value one partition of items in a worker process"""
+    return value_inventory(method, as_of_date, item_ids=item_ids)['items']
+
+
+class ValuationJob:
+    """A valuation run split into partitions"""
+
+    def __init__(self, method: str, as_of_date: date, data_version: tuple, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.as_of_date = as_of_date
+        self.data_version = data_version
+        self.user_id = user_id
+        self.status = "queued"
+        self.partitions_total = 0
+        self.partitions_done = 0
+        self.items_processed = 0
+        self.result = None
+        self.error = None
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at = None
+        self.futures = []
+        self.cancelled = threading.Event()
+
+    def to_dict(self, include_items: bool = False) -> dict:
+        """Job status for the progress endpoint"""
+        progress = (self.partitions_done / self.partitions_total) if self.partitions_total else \
+            (1.0 if self.status == "completed" else 0.0)
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "method": self.method,
+            "as_of_date": self.as_of_date,
+            "progress": round(progress, 4),
+            "partitions_total": self.partitions_total,
+            "partitions_done": self.partitions_done,
+            "items_processed": self.items_processed,
+            "cached": self.cached,
+            "error": self.error
+        }
+        if self.result is not None:
+            result = dict(self.result)
+            if not include_items:
+                result.pop("items", None)
+            data["result"] = result
+        return data
+
+
+class ValuationJobManager:
+    """Owns the worker pool, the job table and the result cache"""
+
+    def __init__(self, workers: int, partition_size: int, cache_size: int, retention_seconds: int):
+        self.workers = workers or os.cpu_count() or 1
+        self.partition_size = partition_size
+        self.cache_size = cache_size
+        self.retention_seconds = retention_seconds
+        self._pool = None
+        self._jobs = {}
+        self._cache: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Start the worker pool on first use"""
+        if self._pool is None:
+            # Spawned workers do not inherit the server's threads or locks
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _data_version(self) -> tuple:
+        """Version of the data a valuation is computed from"""
+        versions = db.get_table_versions(*VALUATION_TABLES)
+        return tuple(versions.get(table, 0) for table in VALUATION_TABLES)
+
+    def _prune(self, now: float):
+        """Forget finished jobs past the retention window"""
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at and now - job.finished_at > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, method: str, as_of_date: Optional[date], user_id: int) -> ValuationJob:
+        """Start a valuation job, or reuse a cached result or a matching running job"""
+        as_of_date = as_of_date or date.today()
+        data_version = self._data_version()
+        key = (method, as_of_date.isoformat(), data_version)
+        job = ValuationJob(method, as_of_date, data_version, user_id)
+
+        with self._lock:
+            self._prune(time.time())
+
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                job.status = "completed"
+                job.result = cached
+                job.items_processed = cached['items_processed']
+                job.cached = True
+                job.finished_at = time.time()
+                self._jobs[job.id] = job
+                return job
+
+            for running in self._jobs.values():
+                if running.status in ("queued", "running") and \
+                        (running.method, running.as_of_date.isoformat(), running.data_version) == key:
+                    return running
+
+            self._jobs[job.id] = job
+
+        threading.Thread(target=self._run, args=(job, key), daemon=True).start()
+        return job
+
+    def _run(self, job: ValuationJob, key: tuple):
+        """Fan partitions out to the pool and merge their results"""
+        if job.cancelled.is_set():
+            job.finished_at = time.time()
+            return
+        
+        try:
+            job.status = "running"
+
+            # Past month-ends are served from their frozen snapshot once closed
+            if is_closed_period_end(job.as_of_date):
+                result = get_inventory_valuation(job.method, job.as_of_date)
+            else:
+                result = self._run_partitions(job)
+
+            if job.cancelled.is_set():
+                job.status = "cancelled"
+                return
+
+            job.result = result
+            job.items_processed = result['items_processed']
+            job.status = "completed"
+
+            with self._lock:
+                self._cache[key] = result
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        except Exception as e:
+            logger.exception("Valuation job %s failed", job.id)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+
+    def _run_partitions(self, job: ValuationJob) -> dict:
+        """Value the catalogue as contiguous item id ranges across worker processes"""
+        # Every item that could have had stock on as_of_date; whether it
+        # did is left to the valuation itself
+        item_ids = [row['id'] for row in db.execute_query(f"""
+            SELECT i.id FROM inventory_items i
+            WHERE i.is_active = 1 AND EXISTS (
+                SELECT 1 FROM {settings.archive.HISTORY_VIEW} sm
+                WHERE sm.item_id = i.id AND sm.movement_type = 'IN'
+                AND sm.unit_cost IS NOT NULL AND sm.created_at < ?
+            )
+            ORDER BY i.id
+        """, ((job.as_of_date + timedelta(days=1)).isoformat(),), fetch_all=True)]
+
+        partitions = [
+            item_ids[start:start + self.partition_size]
+            for start in range(0, len(item_ids), self.partition_size)
+        ]
+        job.partitions_total = len(partitions)
+
+        pool = self._get_pool()
+        job.futures = [
+            pool.submit(_value_partition, job.method, job.as_of_date, partition)
+            for partition in partitions
+        ]
+
+        items = []
+        for future in as_completed(job.futures):
+            if job.cancelled.is_set():
+                break
+            partition_items = future.result()
+            items.extend(partition_items)
+            job.partitions_done += 1
+            job.items_processed += len(partition_items)
+
+        return {
+            "method": job.method,
+            "as_of_date": job.as_of_date,
+            "total_valuation": sum(item['total_value'] for item in items),
+            "items_processed": len(items),
+            "currency": "NZD",
+            "items": sorted(items, key=lambda item: item['item_id']),
+            "source": "live"
+        }
+
+    def get(self, job_id: str) -> Optional[ValuationJob]:
+        """Look up a job by id"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ValuationJob]:
+        """Cancel a job; partitions already running finish but are discarded"""
+        job = self.get(job_id)
+        if job and job.status in ("queued", "running"):
+            job.cancelled.set()
+            for future in job.futures:
+                future.cancel()
+            job.status = "cancelled"
+        return job
+
+    def shutdown(self):
+        """Stop the worker pool"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global valuation job manager instance
+valuation_jobs = ValuationJobManager(
+    workers=settings.valuation.JOB_WORKERS,
+    partition_size=settings.valuation.PARTITION_SIZE,
+    cache_size=settings.valuation.RESULT_CACHE_SIZE,
+    retention_seconds=settings.valuation.JOB_RETENTION_SECONDS
+)
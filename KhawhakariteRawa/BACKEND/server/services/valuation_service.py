@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Inventory valuation engine for Kaiwhakarite Rawa
+Values every item at once from a single ordered read of costed receipts
+"""
+
+import json
+from typing import Optional, List
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ..database import db
+from ..config import settings
+from ..models import ValuationMethod
+
+
+def _load_receipts(conn, method: str, as_of_date: date, item_ids: Optional[List[int]]):
+    """Read every costed IN movement for items in stock on as_of_date, ordered for the method"""
+    # LIFO consumes the newest receipts first, so it reads them newest first
+    direction = "DESC" if method == ValuationMethod.LIFO.value else "ASC"
+    
+    # Raw created_at compared with the start of the next day keeps the
+    # created_at indexes usable
+    next_day = (as_of_date + timedelta(days=1)).isoformat()
+    item_filter = ""
+    item_params = []
+    if item_ids is not None:
+        # Bound as a plain list so SQLite can push it into each arm of the
+        # history view; a json_each subquery would stop that
+        item_params = list(item_ids)
+        item_filter = f" AND item_id IN ({', '.join('?' for _ in item_params)})"
+    
+    # Stock on as_of_date is today's quantity with every later movement
+    # reversed, so opening balances that predate the movement log still count
+    query = f"""
+        WITH later AS (
+            SELECT item_id, SUM(CASE movement_type
+                                    WHEN 'OUT' THEN -quantity
+                                    WHEN 'TRANSFER' THEN 0
+                                    ELSE quantity END) as net
+            FROM {settings.archive.HISTORY_VIEW}
+            WHERE created_at >= ?{item_filter}
+            GROUP BY item_id
+        )
+        SELECT sm.item_id, i.name_en as item_name,
+               i.quantity - COALESCE(later.net, 0) as on_hand,
+               sm.quantity, sm.unit_cost
+        FROM {settings.archive.HISTORY_VIEW} sm
+        JOIN inventory_items i ON sm.item_id = i.id
+        LEFT JOIN later ON later.item_id = sm.item_id
+        WHERE i.is_active = 1 AND i.quantity - COALESCE(later.net, 0) > 0
+        AND sm.movement_type = 'IN' AND sm.unit_cost IS NOT NULL
+        AND sm.created_at < ?{item_filter.replace("item_id", "sm.item_id", 1)}
+    """
+    params = [next_day, *item_params, next_day, *item_params]
+    
+    query += f" ORDER BY sm.item_id, sm.created_at {direction}, sm.id {direction}"
+    
+    return pd.read_sql_query(query, conn, params=params)
+
+
+def _value_receipts(receipts: pd.DataFrame, method: str) -> pd.DataFrame:
+    """Compute cost_per_unit and total_value per item with group operations"""
+    by_item = receipts.groupby('item_id', sort=False)
+    
+    if method in (ValuationMethod.FIFO.value, ValuationMethod.LIFO.value):
+        # Each receipt layer covers the on-hand units left after the layers
+        # ahead of it in consumption order
+        consumed_before = by_item['quantity'].cumsum() - receipts['quantity']
+        used = (receipts['on_hand'] - consumed_before).clip(lower=0)
+        used = np.minimum(used, receipts['quantity'])
+        receipts = receipts.assign(cost=used * receipts['unit_cost'])
+        
+        items = receipts.groupby('item_id', sort=False).agg(
+            item_name=('item_name', 'first'),
+            quantity=('on_hand', 'first'),
+            total_value=('cost', 'sum')
+        )
+        items['cost_per_unit'] = items['total_value'] / items['quantity']
+    else:
+        # AVERAGE (and SPECIFIC, which has no lot tracking to draw on)
+        receipts = receipts.assign(cost=receipts['quantity'] * receipts['unit_cost'])
+        items = receipts.groupby('item_id', sort=False).agg(
+            item_name=('item_name', 'first'),
+            quantity=('on_hand', 'first'),
+            received=('quantity', 'sum'),
+            received_cost=('cost', 'sum')
+        )
+        items['cost_per_unit'] = (items['received_cost'] / items['received']).where(
+            items['received'] > 0, 0.0
+        )
+        items['total_value'] = items['cost_per_unit'] * items['quantity']
+    
+    return items[['item_name', 'quantity', 'cost_per_unit', 'total_value']]
+
+
+def _write_valuations(cursor, items: pd.DataFrame, method: str, as_of_date: date):
+    """Record valuations and current_value for every item in two statements"""
+    payload = json.dumps([
+        [item_id, cost_per_unit, quantity, total_value]
+        for item_id, cost_per_unit, quantity, total_value in zip(
+            items.index.tolist(), items['cost_per_unit'].tolist(),
+            items['quantity'].tolist(), items['total_value'].tolist()
+        )
+    ])
+    
+    cursor.execute("""
+        INSERT INTO inventory_valuations
+        (item_id, valuation_method, cost_per_unit, quantity, total_value, valuation_date)
+        SELECT json_extract(value, '$[0]'), ?, json_extract(value, '$[1]'),
+               json_extract(value, '$[2]'), json_extract(value, '$[3]'), ?
+        FROM json_each(?)
+    """, (method, as_of_date.isoformat(), payload))
+    
+    cursor.execute("""
+        UPDATE inventory_items
+        SET current_value = v.total_value
+        FROM (
+            SELECT json_extract(value, '$[0]') as item_id, json_extract(value, '$[3]') as total_value
+            FROM json_each(?)
+        ) v
+        WHERE v.item_id = inventory_items.id
+    """, (payload,))
+
+
+def value_inventory(method: str = 'AVERAGE', as_of_date: Optional[date] = None,
+                    item_ids: Optional[List[int]] = None, write_back: bool = False):
+    """Value inventory with FIFO, LIFO or AVERAGE cost; returns per-item rows and totals"""
+    if not as_of_date:
+        as_of_date = date.today()
+    
+    with db.get_connection() as conn:
+        receipts = _load_receipts(conn, method, as_of_date, item_ids)
+        
+        if receipts.empty:
+            items = pd.DataFrame(columns=['item_name', 'quantity', 'cost_per_unit', 'total_value'])
+        else:
+            items = _value_receipts(receipts, method)
+        
+        if write_back and not items.empty:
+            _write_valuations(conn.cursor(), items, method, as_of_date)
+            conn.commit()
+    
+    return {
+        "method": method,
+        "as_of_date": as_of_date,
+        "total_valuation": float(items['total_value'].sum()),
+        "items_processed": len(items),
+        "currency": "NZD",
+        "items": [
+            {
+                "item_id": item_id,
+                "item_name": item_name,
+                "quantity": quantity,
+                "cost_per_unit": cost_per_unit,
+                "total_value": total_value
+            }
+            for item_id, item_name, quantity, cost_per_unit, total_value in zip(
+                items.index.tolist(), items['item_name'].tolist(), items['quantity'].tolist(),
+                items['cost_per_unit'].tolist(), items['total_value'].tolist()
+            )
+        ]
+    }
+
+
+def _month_end(day: date) -> date:
+    """Last day of the month containing day"""
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def is_closed_period_end(as_of_date: date) -> bool:
+    """True for the last day of a month that has already finished"""
+    return as_of_date == _month_end(as_of_date) and as_of_date < date.today().replace(day=1)
+
+
+def _read_snapshot(period: str, method: str):
+    """Get a frozen period valuation, or None if the period was never closed"""
+    header = db.execute_query("""
+        SELECT * FROM valuation_periods WHERE period = ? AND method = ?
+    """, (period, method), fetch_one=True)
+    
+    if not header:
+        return None
+    
+    items = db.execute_query("""
+        SELECT item_id, item_name, quantity, cost_per_unit, total_value
+        FROM valuation_snapshots
+        WHERE period = ? AND method = ?
+        ORDER BY item_id
+    """, (period, method), fetch_all=True)
+    
+    return {
+        "method": method,
+        "as_of_date": date.fromisoformat(header['period_end']),
+        "total_valuation": header['total_valuation'],
+        "items_processed": header['items_processed'],
+        "currency": "NZD",
+        "items": items,
+        "source": "snapshot",
+        "closed_at": header['closed_at']
+    }
+
+
+def close_valuation_period(period: str, method: str = 'AVERAGE', user_id: Optional[int] = None,
+                           replace: bool = False):
+    """Freeze a finished month's valuation so later reports read it instead of history"""
+    period_end = _month_end(date.fromisoformat(f"{period}-01"))
+    
+    if not is_closed_period_end(period_end):
+        return {"error": f"Period {period} is still open"}
+    
+    if not replace:
+        existing = _read_snapshot(period, method)
+        if existing:
+            return existing
+    
+    valuation = value_inventory(method, period_end)
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM valuation_snapshots WHERE period = ? AND method = ?", (period, method)
+        )
+        cursor.execute("""
+            INSERT OR REPLACE INTO valuation_periods
+            (period, method, period_end, total_valuation, items_processed, closed_by)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (period, method, period_end.isoformat(), valuation['total_valuation'],
+              valuation['items_processed'], user_id))
+        cursor.executemany("""
+            INSERT INTO valuation_snapshots
+            (period, method, item_id, item_name, quantity, cost_per_unit, total_value)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (period, method, item['item_id'], item['item_name'], item['quantity'],
+             item['cost_per_unit'], item['total_value'])
+            for item in valuation['items']
+        ])
+        conn.commit()
+    
+    db.log_audit(user_id, "CREATE", "valuation_periods", None, {}, {
+        "period": period,
+        "method": method,
+        "total_valuation": valuation['total_valuation']
+    })
+    
+    return _read_snapshot(period, method)
+
+
+def get_valuation_periods():
+    """Get every closed valuation period"""
+    return db.execute_query("""
+        SELECT vp.*, u.first_name || ' ' || u.last_name as closed_by_name
+        FROM valuation_periods vp
+        LEFT JOIN users u ON vp.closed_by = u.id
+        ORDER BY vp.period DESC, vp.method
+    """, fetch_all=True)
+
+
+def get_inventory_valuation(method: str = 'AVERAGE', as_of_date: Optional[date] = None,
+                            write_back: bool = False):
+    """Serve closed month-ends from frozen snapshots and value everything else live
+    
+    Reading never closes a period; only close_valuation_period freezes one.
+    """
+    if as_of_date and is_closed_period_end(as_of_date):
+        snapshot = _read_snapshot(as_of_date.strftime("%Y-%m"), method)
+        if snapshot is not None:
+            return snapshot
+    
+    valuation = value_inventory(method, as_of_date, write_back=write_back)
+    valuation['source'] = "live"
+    return valuation
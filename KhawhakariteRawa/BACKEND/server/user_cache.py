@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Authenticated user cache for Kaiwhakarite Rawa
+Keeps recently seen users in memory so token checks don't read the users table
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .config import settings
+from .database import db
+from .models import UserResponse
+
+
+class UserCache:
+    """Bounded LRU of UserResponse objects keyed by token subject, with TTL eviction
+
+    Writes made through this process invalidate their entries directly. Writes
+    from anywhere else (other workers, fix_user_roles.py) bump the users table
+    version, which is polled at most every version_check_seconds and drops
+    the whole cache when it moves.
+    """
+
+    def __init__(self, ttl_seconds: int, max_users: int, version_check_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.version_check_seconds = version_check_seconds
+        self._entries: "OrderedDict[str, Tuple[UserResponse, float]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_users > 0
+
+    def _check_version(self, now: float):
+        """Drop everything if the users table changed since the last check"""
+        if now - self._version_checked_at < self.version_check_seconds:
+            return
+
+        version = db.get_table_versions('users').get('users')
+        with self._lock:
+            if version != self._version:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._version = version
+            self._version_checked_at = now
+
+    def get(self, subject: str) -> Optional[UserResponse]:
+        """Get a cached user, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        now = time.monotonic()
+        self._check_version(now)
+
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[subject]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, subject: str, user: UserResponse):
+        """Cache a user read from the database"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[subject] = (user, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, subject: str):
+        """Forget one user after their role, status or password changed"""
+        with self._lock:
+            if self._entries.pop(subject, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Forget every user"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Get hit rates for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_users": self.max_users,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+# Global user cache instance
+user_cache = UserCache(
+    ttl_seconds=settings.user_cache.TTL_SECONDS,
+    max_users=settings.user_cache.MAX_USERS,
+    version_check_seconds=settings.user_cache.VERSION_CHECK_SECONDS
+)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for the booking availability index
+Checks the segment tree and the engine against a plain per-day count
+"""
+
+import sys
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from server.database import Database
+from server.services import availability_service
+from server.services.availability_service import _MaxSegmentTree, AvailabilityEngine
+
+# Holds are only loaded for bookings that end today or later
+START = date.today() + timedelta(days=1)
+
+
+def _day(offset):
+    return START + timedelta(days=offset)
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """Fresh database (with only the seeded admin, user 1) used by the engine"""
+    database = Database(str(tmp_path / "bookings.db"))
+    database.execute_query("INSERT INTO inventory_items (id, name_en, quantity) VALUES (5, 'Waka ama', 6)")
+    monkeypatch.setattr(availability_service, "db", database)
+    return database
+
+
+def _book(database, booking_id, first_day, last_day, quantity, status="Approved"):
+    database.execute_query("""
+        INSERT INTO bookings (id, item_id, user_id, kaupapa_name, booking_date,
+                              start_date, end_date, quantity_requested, status)
+        VALUES (?, 5, 1, 'Wānanga', date('now'), ?, ?, ?, ?)
+    """, (booking_id, _day(first_day).isoformat(), _day(last_day).isoformat(), quantity, status))
+
+
+def test_segment_tree_matches_brute_force():
+    """Random range adds and removals agree with a per-day array"""
+    rng = random.Random(7)
+    base = START.toordinal()
+    days = [0] * 120
+    tree = _MaxSegmentTree()
+    added = []
+
+    for _ in range(300):
+        if added and rng.random() < 0.3:
+            lo, hi, delta = added.pop(rng.randrange(len(added)))
+            delta = -delta
+        else:
+            lo = rng.randrange(len(days))
+            hi = rng.randrange(lo, len(days))
+            delta = rng.randint(1, 5)
+            added.append((lo, hi, delta))
+
+        tree.add(base + lo, base + hi, delta)
+        for day in range(lo, hi + 1):
+            days[day] += delta
+
+        qlo = rng.randrange(len(days))
+        qhi = rng.randrange(qlo, len(days))
+        assert tree.max(base + qlo, base + qhi) == max(days[qlo:qhi + 1])
+
+
+def test_segment_tree_outside_holds_is_zero():
+    """Days with no hold report nothing booked"""
+    base = START.toordinal()
+    tree = _MaxSegmentTree()
+    tree.add(base + 10, base + 12, 3)
+
+    assert tree.max(base, base + 9) == 0
+    assert tree.max(base + 13, base + 40) == 0
+    assert tree.max(base + 12, base + 13) == 3
+
+
+def test_overlapping_holds_take_the_busiest_day(scratch_db):
+    """Overlapping bookings add up only on the days they share"""
+    _book(scratch_db, 1, 0, 4, 2)
+    _book(scratch_db, 2, 3, 8, 3)
+    _book(scratch_db, 3, 10, 12, 1)
+    _book(scratch_db, 4, 0, 12, 9, status="Pending")
+    engine = AvailabilityEngine()
+    engine.load()
+
+    assert engine.units_booked(5, _day(0), _day(2)) == 2
+    assert engine.units_booked(5, _day(3), _day(4)) == 5
+    assert engine.units_booked(5, _day(0), _day(12)) == 5
+    assert engine.units_booked(5, _day(5), _day(12)) == 3
+    assert engine.units_booked(5, _day(9), _day(9)) == 0
+    assert engine.units_available(5, 6, _day(0), _day(12)) == 1
+    assert engine.units_available(5, 4, _day(0), _day(12)) == 0
+
+
+def test_excluded_hold_is_not_counted_and_is_restored(scratch_db):
+    """Re-validating a booking ignores its own hold without dropping it"""
+    _book(scratch_db, 1, 0, 4, 2)
+    _book(scratch_db, 2, 3, 8, 3)
+    engine = AvailabilityEngine()
+    engine.load()
+
+    assert engine.units_booked(5, _day(0), _day(8), exclude_booking_id=2) == 2
+    assert engine.units_booked(5, _day(0), _day(8), exclude_booking_id=1) == 3
+    assert engine.units_available(5, 5, _day(0), _day(8), exclude_booking_id=2) == 3
+    assert engine.units_booked(5, _day(0), _day(8)) == 5
+
+
+def test_checked_out_units_count_towards_capacity(scratch_db):
+    """Active loans are off the shelf but still hold their own dates"""
+    _book(scratch_db, 1, 0, 4, 2, status="Active")
+    engine = AvailabilityEngine()
+    engine.load()
+
+    assert engine.checked_out(5) == 2
+    assert engine.units_available(5, 3, _day(0), _day(4)) == 3
+    assert engine.units_available(5, 3, _day(5), _day(9)) == 5
+
+    scratch_db.execute_query("UPDATE bookings SET status = 'Returned' WHERE id = 1")
+    engine.sync_booking(1)
+    assert engine.checked_out(5) == 0
+    assert engine.units_booked(5, _day(0), _day(4)) == 0
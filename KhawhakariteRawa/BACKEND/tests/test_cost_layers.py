@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for FIFO/LIFO cost layers
+Checks the trigger-maintained layers against a rebuild from history
+"""
+
+import sys
+import random
+from pathlib import Path
+
+import pytest
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from server.database import Database
+from server.services import cost_layer_service
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """Fresh database (with only the seeded admin, user 1) used by the cost layer service"""
+    database = Database(str(tmp_path / "layers.db"))
+    monkeypatch.setattr(cost_layer_service, "db", database)
+    return database
+
+
+def _add_item(database, item_id):
+    database.execute_query(
+        "INSERT INTO inventory_items (id, name_en, quantity) VALUES (?, ?, 0)",
+        (item_id, f"Item {item_id}")
+    )
+
+
+def _move(database, item_id, movement_type, quantity, unit_cost=None, reference_type=None):
+    """Record a movement and keep the item's quantity in step, as the services do"""
+    database.execute_query("""
+        INSERT INTO stock_movements (item_id, movement_type, quantity, unit_cost, reference_type, user_id)
+        VALUES (?, ?, ?, ?, ?, 1)
+    """, (item_id, movement_type, quantity, unit_cost, reference_type))
+    signed = -abs(quantity) if movement_type == 'OUT' else quantity
+    database.execute_query(
+        "UPDATE inventory_items SET quantity = quantity + ? WHERE id = ?", (signed, item_id)
+    )
+
+
+def _snapshot(database):
+    layers = database.execute_query("""
+        SELECT item_id, movement_id, unit_cost, quantity, fifo_remaining, lifo_remaining
+        FROM inventory_cost_layers ORDER BY movement_id
+    """, fetch_all=True)
+    summaries = database.execute_query("""
+        SELECT item_id, received_quantity, received_cost,
+               fifo_quantity, fifo_value, lifo_quantity, lifo_value
+        FROM inventory_cost_summary ORDER BY item_id
+    """, fetch_all=True)
+    return layers, summaries
+
+
+def _assert_same(left, right):
+    assert len(left) == len(right)
+    for a, b in zip(left, right):
+        assert a.keys() == b.keys()
+        for key in a:
+            assert a[key] == pytest.approx(b[key]), key
+
+
+def test_fifo_and_lifo_price_from_opposite_ends(scratch_db):
+    """FIFO prices stock on hand from the earliest receipts, LIFO from the latest"""
+    _add_item(scratch_db, 1)
+    _move(scratch_db, 1, 'IN', 10, 5.0)
+    _move(scratch_db, 1, 'IN', 10, 7.0)
+    _move(scratch_db, 1, 'OUT', 12)
+
+    fifo = cost_layer_service.get_item_cost(1, 'FIFO')
+    lifo = cost_layer_service.get_item_cost(1, 'LIFO')
+    average = cost_layer_service.get_item_cost(1, 'AVERAGE')
+    assert fifo['cost_per_unit'] == pytest.approx(5.0)
+    assert fifo['total_value'] == pytest.approx(40.0)
+    assert lifo['cost_per_unit'] == pytest.approx(7.0)
+    assert lifo['total_value'] == pytest.approx(56.0)
+    assert average['total_value'] == pytest.approx(48.0)
+
+
+def test_loans_and_transfers_leave_layers_alone(scratch_db):
+    """Stock out on loan is still valued at its layer cost, on the units on hand"""
+    _add_item(scratch_db, 1)
+    _move(scratch_db, 1, 'IN', 10, 5.0)
+    _move(scratch_db, 1, 'OUT', 4, reference_type='booking')
+    _move(scratch_db, 1, 'OUT', 2, reference_type='stock_transfer')
+
+    layers, _ = _snapshot(scratch_db)
+    assert [(layer['fifo_remaining'], layer['lifo_remaining']) for layer in layers] == [(10, 10)]
+
+    for method in ('FIFO', 'LIFO', 'AVERAGE'):
+        cost = cost_layer_service.get_item_cost(1, method)
+        assert cost['cost_per_unit'] == pytest.approx(5.0)
+        assert cost['total_value'] == pytest.approx(20.0)
+        valuation = cost_layer_service.get_cost_layer_valuation(method)
+        assert valuation['total_valuation'] == pytest.approx(20.0)
+
+
+def test_rebuild_matches_trigger_layers(scratch_db):
+    """Replaying history gives the same layers and summaries as the triggers"""
+    rng = random.Random(11)
+    for item_id in (1, 2, 3):
+        _add_item(scratch_db, item_id)
+
+    on_hand = {1: 0, 2: 0, 3: 0}
+    for _ in range(200):
+        item_id = rng.choice((1, 2, 3))
+        roll = rng.random()
+        if roll < 0.35 or on_hand[item_id] == 0:
+            quantity = rng.randint(1, 20)
+            _move(scratch_db, item_id, 'IN', quantity, round(rng.uniform(1, 50), 2))
+            on_hand[item_id] += quantity
+        elif roll < 0.65:
+            quantity = rng.randint(1, on_hand[item_id])
+            _move(scratch_db, item_id, 'OUT', quantity)
+            on_hand[item_id] -= quantity
+        elif roll < 0.75:
+            quantity = rng.randint(1, 5)
+            _move(scratch_db, item_id, 'RETURN', quantity)
+            on_hand[item_id] += quantity
+        elif roll < 0.85:
+            quantity = rng.randint(-on_hand[item_id], 5) or 1
+            _move(scratch_db, item_id, 'ADJUSTMENT', quantity)
+            on_hand[item_id] += quantity
+        else:
+            quantity = rng.randint(1, on_hand[item_id])
+            _move(scratch_db, item_id, 'OUT', quantity, reference_type=rng.choice(('booking', 'stock_transfer')))
+
+    from_triggers = _snapshot(scratch_db)
+    valuations = {method: cost_layer_service.get_cost_layer_valuation(method)['total_valuation']
+                  for method in ('FIFO', 'LIFO', 'AVERAGE')}
+
+    result = cost_layer_service.rebuild_cost_layers(user_id=1)
+    assert result['items'] == 3
+
+    from_rebuild = _snapshot(scratch_db)
+    _assert_same(from_triggers[0], from_rebuild[0])
+    _assert_same(from_triggers[1], from_rebuild[1])
+    for method, total in valuations.items():
+        assert cost_layer_service.get_cost_layer_valuation(method)['total_valuation'] == pytest.approx(total)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for the stock reservation ledger
+Runs holds against a scratch database with a controllable clock
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add the backend directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from server.database import Database
+from server.services import reservation_service
+from server.services.reservation_service import ReservationLedger
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.time() that the test moves forward by hand"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(reservation_service.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """Empty database with one item of 10 units, used by the ledger's flush"""
+    database = Database(str(tmp_path / "ledger.db"))
+    database.execute_query(
+        "INSERT INTO inventory_items (id, name_en, quantity, reserved_quantity) VALUES (1, 'Kete', 10, 0)"
+    )
+    monkeypatch.setattr(reservation_service, "db", database)
+    return database
+
+
+def _item(database):
+    return database.execute_query(
+        "SELECT id, quantity, reserved_quantity FROM inventory_items WHERE id = 1", fetch_one=True
+    )
+
+
+def test_holds_expire_after_their_ttl(clock):
+    """Expired holds stop counting and are dropped on the next read"""
+    ledger = ReservationLedger()
+    item = {"id": 1, "quantity": 10, "reserved_quantity": 0}
+
+    short = ledger.try_hold(item, 3, ttl_seconds=60)
+    ledger.try_hold(item, 4, ttl_seconds=600)
+    assert ledger.available_to_promise(item) == 3
+    assert ledger.try_hold(item, 4, ttl_seconds=60)["error"]
+
+    clock[0] += 61
+    assert ledger.get_hold(short["hold_id"]) is None
+    assert ledger.available_to_promise(item) == 6
+    assert ledger.evicted == 1
+
+    clock[0] += 600
+    assert ledger.available_to_promise(item) == 10
+    assert ledger.stats()["holds"] == 0
+
+
+def test_rehold_replaces_the_previous_expiry(clock):
+    """Holding again under the same id resets the TTL without double counting"""
+    ledger = ReservationLedger()
+    item = {"id": 1, "quantity": 10, "reserved_quantity": 0}
+
+    hold = ledger.try_hold(item, 5, ttl_seconds=60)
+    clock[0] += 50
+    ledger.try_hold(item, 6, ttl_seconds=60, hold_id=hold["hold_id"])
+    assert ledger.units_held(1) == 6
+
+    # The first expiry's stale heap entry must not evict the renewed hold
+    clock[0] += 20
+    assert ledger.units_held(1) == 6
+    clock[0] += 50
+    assert ledger.units_held(1) == 0
+
+
+def test_rekey_keeps_quantity_and_expiry(clock):
+    """A rekeyed hold answers to its new id only and still expires on time"""
+    ledger = ReservationLedger()
+    item = {"id": 1, "quantity": 10, "reserved_quantity": 0}
+
+    hold = ledger.try_hold(item, 4, ttl_seconds=60)
+    ledger.rekey(hold["hold_id"], "booking:42")
+
+    assert ledger.get_hold(hold["hold_id"]) is None
+    assert ledger.get_hold("booking:42")["quantity"] == 4
+    assert ledger.units_held(1) == 4
+
+    clock[0] += 61
+    assert ledger.get_hold("booking:42") is None
+    assert ledger.units_held(1) == 0
+    assert ledger.evicted == 1
+
+
+def test_partial_consume_leaves_the_rest_held(clock):
+    """Consuming part of a hold keeps the remainder; wrong item or owner takes nothing"""
+    ledger = ReservationLedger()
+    item = {"id": 1, "quantity": 10, "reserved_quantity": 0}
+
+    hold_id = ledger.try_hold(item, 5, ttl_seconds=60, user_id=7)["hold_id"]
+
+    assert ledger.consume(hold_id, 2, 5, user_id=7) == 0
+    assert ledger.consume(hold_id, 1, 5, user_id=8) == 0
+    assert ledger.consume(hold_id, 1, 2, user_id=7) == 2
+    assert ledger.get_hold(hold_id)["quantity"] == 3
+    assert ledger.units_held(1) == 3
+
+    assert ledger.consume(hold_id, 1, 10, user_id=7) == 3
+    assert ledger.get_hold(hold_id) is None
+    assert ledger.units_held(1) == 0
+
+
+def test_flush_writes_only_the_net_change(clock, scratch_db):
+    """reserved_quantity tracks live holds across flushes and evictions"""
+    ledger = ReservationLedger()
+
+    ledger.try_hold(_item(scratch_db), 3, ttl_seconds=60)
+    ledger.try_hold(_item(scratch_db), 2, ttl_seconds=600)
+    assert ledger.flush() == 1
+    assert _item(scratch_db)["reserved_quantity"] == 5
+    # Flushed holds are already in the row, so they are not applied twice
+    assert ledger.available_to_promise(_item(scratch_db)) == 5
+
+    # A hold placed and evicted between flushes nets out to no write
+    ledger.try_hold(_item(scratch_db), 4, ttl_seconds=10)
+    clock[0] += 11
+    assert ledger.flush() == 0
+    assert _item(scratch_db)["reserved_quantity"] == 5
+
+    # An eviction of a flushed hold is written back as a negative delta
+    clock[0] += 50
+    assert ledger.flush() == 1
+    assert _item(scratch_db)["reserved_quantity"] == 2
+    assert ledger.available_to_promise(_item(scratch_db)) == 8
+
+    assert ledger.release_all() == 1
+    assert _item(scratch_db)["reserved_quantity"] == 0